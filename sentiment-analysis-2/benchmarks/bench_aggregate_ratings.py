@@ -0,0 +1,61 @@
+"""Benchmark the rating aggregation engine against the per-review dict loop.
+
+Run from the project root:
+
+    python benchmarks/bench_aggregate_ratings.py
+"""
+import os
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+from src.functions.aggregate_ratings import bucketed_rating_matrix, rating_matrix, summarize_matrix
+
+STEP_COUNT = 12
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+LOOP_LIMIT = 1_000_000  # The dict loop is too slow to time beyond this
+
+
+def dict_loop(step_codes, ratings, journey_steps):
+    """Per-review tally into nested OrderedDicts, as count_ratings_by_step used to do"""
+    counts = OrderedDict((step, OrderedDict()) for step in journey_steps)
+    for code, score in zip(step_codes.tolist(), ratings.tolist()):
+        step = journey_steps[code]
+        if step in journey_steps:
+            counts[step][score] = counts[step].get(score, 0) + 1
+    return counts
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    rng = np.random.default_rng(0)
+    journey_steps = [f"Step {i}" for i in range(STEP_COUNT)]
+
+    print(f"{'reviews':>12} {'matrix':>10} {'summary':>10} {'monthly':>10} {'dict loop':>10}")
+    for size in SIZES:
+        step_codes = rng.integers(0, STEP_COUNT, size, dtype=np.int16)
+        ratings = rng.integers(1, 6, size, dtype=np.uint8)
+        days = rng.integers(19000, 20500, size, dtype=np.int32)
+
+        matrix_time = timed(rating_matrix, step_codes, ratings, STEP_COUNT)
+        summary_time = timed(summarize_matrix, rating_matrix(step_codes, ratings, STEP_COUNT))
+        monthly_time = timed(bucketed_rating_matrix, step_codes, ratings, days, STEP_COUNT, 'month')
+        loop_time = timed(dict_loop, step_codes, ratings, journey_steps) if size <= LOOP_LIMIT else None
+
+        loop_text = f"{loop_time * 1000:9.1f}ms" if loop_time is not None else f"{'-':>10}"
+        print(f"{size:>12,} {matrix_time * 1000:9.1f}ms {summary_time * 1000:9.2f}ms "
+              f"{monthly_time * 1000:9.1f}ms {loop_text}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark cold-start time of the pipeline entry point and its stages.
+
+Each target is imported in a fresh interpreter several times and the median
+wall time is reported, along with whether openai or plotly got loaded.
+Results are appended to startup_history.jsonl next to this file, or to the
+file given with --history, so startup regressions show up across commits.
+The default history file is ignored by git.
+
+Run from the project root:
+
+    python benchmarks/bench_startup.py [--max-ms 400] [--history PATH]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_history.jsonl')
+RUNS = 7
+HEAVY_MODULES = ('openai', 'plotly')
+
+# Statements timed in a fresh interpreter, run from src/ like main.py
+TARGETS = {
+    'python': 'pass',
+    'main': 'import main',
+    'main --help': 'import sys, main; sys.argv = ["main.py", "--help"]; main.build_parser().format_help()',
+    'count_ratings_by_step': 'import functions.count_ratings_by_step',
+    'generate_graph': 'import functions.generate_graph',
+    'summarize_review': 'import functions.summarize_review'
+}
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(elapsed, *[name for name in {heavy!r} if name in sys.modules])
+"""
+
+
+def time_target(statement: str):
+    """Get the median wall and import times of a statement and the heavy modules it loaded"""
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'benchmark'))
+    walls, imports = [], []
+    loaded = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+            cwd=SRC_DIR, env=env, capture_output=True, text=True, check=True
+        ).stdout.split()
+        walls.append(time.perf_counter() - start)
+        imports.append(float(output[0]))
+        loaded = output[1:]
+    return statistics.median(walls), statistics.median(imports), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-ms', type=float,
+                        help="exit with an error if importing main takes longer than this")
+    parser.add_argument('--history', default=HISTORY_PATH, metavar='PATH',
+                        help="JSON Lines file results are appended to (default: %(default)s)")
+    parser.add_argument('--no-record', action='store_true', help="do not append results to the history file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'target':>24} {'wall':>10} {'import':>10}  heavy modules")
+    for name, statement in TARGETS.items():
+        wall, imported, loaded = time_target(statement)
+        results[name] = {'wallMs': round(wall * 1000, 1), 'importMs': round(imported * 1000, 1), 'loaded': loaded}
+        print(f"{name:>24} {wall * 1000:8.1f}ms {imported * 1000:8.1f}ms  {', '.join(loaded) or '-'}")
+
+    if not args.no_record:
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'recordedAt': datetime.now().isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'results': results
+            }) + '\n')
+
+    if args.max_ms is not None and results['main']['importMs'] > args.max_ms:
+        sys.exit(f"Importing main took {results['main']['importMs']}ms, over the {args.max_ms}ms budget")
+
+
+if __name__ == '__main__':
+    main()
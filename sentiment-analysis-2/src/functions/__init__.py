@@ -1,13 +1,20 @@
-from .initialize_directories import initialize_directories
-from .pre_process_raw_data import pre_process_raw_data
-from .determine_journey_steps import extract_sample_reviews, analyze_journey_steps
-from .summarize_review import summarize_review
-
-__all__ = [
-    'initialize_directories',
-    'pre_process_raw_data',
-    'extract_sample_reviews',
-    'analyze_journey_steps',
-    'summarize_review'
-    'generate_graph'
-]
\ No newline at end of file
+from importlib import import_module
+
+# Stage functions are imported on first access, so importing one module of
+# the package does not load every stage and its dependencies
+_EXPORTS = {
+    'initialize_directories': '.initialize_directories',
+    'pre_process_raw_data': '.pre_process_raw_data',
+    'extract_sample_reviews': '.determine_journey_steps',
+    'analyze_journey_steps': '.determine_journey_steps',
+    'summarize_review': '.summarize_review',
+    'generate_graph': '.generate_graph'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(_EXPORTS[name], __name__), name)
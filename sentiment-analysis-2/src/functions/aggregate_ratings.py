@@ -0,0 +1,113 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .review_store import MISSING_DATE
+
+# Constants
+RATING_SCORES = np.arange(1, 6)
+NEUTRAL_RATING = 3
+BUCKET_UNITS = {'day': 'D', 'week': 'W', 'month': 'M', 'year': 'Y'}
+
+
+def rating_matrix(step_codes: np.ndarray, ratings: np.ndarray, step_count: int) -> np.ndarray:
+    """Count reviews into a steps x ratings matrix in one bincount pass.
+
+    Reviews with a step code outside the journey or a rating outside 1-5
+    are ignored.
+    """
+    step_codes = np.asarray(step_codes, dtype=np.int64)
+    ratings = np.asarray(ratings, dtype=np.int64)
+    valid = (step_codes >= 0) & (step_codes < step_count) & (ratings >= 1) & (ratings <= len(RATING_SCORES))
+
+    cells = step_codes[valid] * len(RATING_SCORES) + (ratings[valid] - 1)
+    counts = np.bincount(cells, minlength=step_count * len(RATING_SCORES))
+    return counts.reshape(step_count, len(RATING_SCORES))
+
+
+def bucketed_rating_matrix(step_codes: np.ndarray, ratings: np.ndarray, days: np.ndarray,
+                           step_count: int, bucket: str = 'month') -> Tuple[List[str], np.ndarray]:
+    """Count reviews into a periods x steps x ratings array.
+
+    days are day numbers since 1970-01-01. Undated reviews are left out.
+    Returns the labels of every period from the first to the last review,
+    including empty ones, and the counts.
+    """
+    if bucket not in BUCKET_UNITS:
+        raise ValueError(f"Unknown time bucket: {bucket}")
+
+    days = np.asarray(days, dtype=np.int64)
+    dated = days != MISSING_DATE
+    if not dated.any():
+        return [], np.zeros((0, step_count, len(RATING_SCORES)), dtype=np.int64)
+
+    # Period numbers are contiguous, so offsets from the first period are
+    # codes without sorting
+    unit = f'datetime64[{BUCKET_UNITS[bucket]}]'
+    periods = days[dated].astype('datetime64[D]').astype(unit).astype(np.int64)
+    first, last = periods.min(), periods.max()
+    labels = np.arange(first, last + 1).astype(unit)
+    period_codes = periods - first
+
+    # Fold the period into the step code so one bincount covers every period
+    codes = np.asarray(step_codes, dtype=np.int64)[dated]
+    in_journey = (codes >= 0) & (codes < step_count)
+    combined = np.where(in_journey, period_codes * step_count + codes, -1)
+
+    counts = rating_matrix(combined, np.asarray(ratings)[dated], len(labels) * step_count)
+    return [str(label) for label in labels], counts.reshape(len(labels), step_count, len(RATING_SCORES))
+
+
+def summarize_matrix(matrix: np.ndarray) -> Dict[str, np.ndarray]:
+    """Derive totals, mean ratings and normalized -1 to 1 scores per step"""
+    totals = matrix.sum(axis=-1)
+    weighted = matrix @ RATING_SCORES
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(totals > 0, weighted / np.maximum(totals, 1), 0.0)
+
+    # Scores are rounded to one decimal before and after normalizing. Python's
+    # round() is used since np.round can differ from it on ties.
+    normalized = np.array(
+        [round((round(mean, 1) - NEUTRAL_RATING) / 2, 1) if total else 0.0
+         for mean, total in zip(means.ravel().tolist(), totals.ravel().tolist())],
+        dtype=np.float64
+    ).reshape(means.shape)
+
+    return {
+        'totals': totals,
+        'means': means,
+        'normalized': normalized
+    }
+
+
+def matrix_from_ratings(journey_data: Dict) -> Tuple[List[str], np.ndarray]:
+    """Build a steps x ratings matrix from saved ratings-by-step counts"""
+    steps = list(journey_data.keys())
+    matrix = np.zeros((len(steps), len(RATING_SCORES)), dtype=np.int64)
+
+    for code, step in enumerate(steps):
+        for score, count in journey_data[step].items():
+            if 1 <= int(score) <= len(RATING_SCORES):
+                matrix[code, int(score) - 1] = count
+
+    return steps, matrix
+
+
+def aggregate_store(store, bucket: Optional[str] = None) -> Dict:
+    """Aggregate a review store into a rating matrix and its derived statistics"""
+    step_count = len(store.journey_steps)
+    matrix = rating_matrix(store.steps, store.ratings, step_count)
+
+    result = {
+        'steps': store.journey_steps,
+        'counts': matrix,
+        **summarize_matrix(matrix)
+    }
+
+    if bucket:
+        labels, bucketed = bucketed_rating_matrix(store.steps, store.ratings, store.dates, step_count, bucket)
+        result['periods'] = labels
+        result['periodCounts'] = bucketed
+
+    return result
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from types import SimpleNamespace
+from itertools import chain, islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .instrumentation import get_metrics
+from .request_scheduler import get_scheduler
+from .workspace import Workspace, get_workspace
+
+# Constants
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+MAX_REQUESTS_PER_BATCH = 50_000  # Batch API limit on requests in one input file
+POLL_INTERVAL = 60  # Seconds between batch status checks
+BATCH_BACKENDS = ("openai", "local")
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+RESUMABLE_STATUSES = {"validating", "in_progress", "finalizing", "completed"}
+RESULT_GROUP_SIZE = 500  # Results handed on at a time while a finished batch's output is read
+
+
+def get_batch_job_dir(workspace: Optional[Workspace] = None) -> str:
+    """Get directory holding batch input files and job records"""
+    return get_workspace(workspace).directory('batch-jobs')
+
+
+def build_batch_request(custom_id: str, body: Dict) -> Dict:
+    """Wrap a chat completion request body as one line of a batch input file"""
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def write_batch_input(job_dir: str, requests: List[Dict]) -> str:
+    """Write batch requests to a JSONL file named after its content hash.
+
+    Identical request sets map to the same file, so an interrupted run can
+    find the batch it already submitted instead of paying for it twice.
+    """
+    temp_path = os.path.join(job_dir, f'batch_input_{uuid.uuid4().hex}.tmp')
+    digest = hashlib.sha256()
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for request in requests:
+            line = json.dumps(request, ensure_ascii=False) + '\n'
+            digest.update(line.encode('utf-8'))
+            f.write(line)
+
+    input_path = os.path.join(job_dir, f'batch_input_{digest.hexdigest()[:16]}.jsonl')
+    os.replace(temp_path, input_path)
+    return input_path
+
+
+def job_record_path(input_path: str) -> str:
+    return input_path[:-len('.jsonl')] + '.job.json'
+
+
+def submit_batch(client, input_path: str) -> str:
+    """Upload an input file and create a batch, reusing a live batch for the same file"""
+    record_path = job_record_path(input_path)
+    if os.path.exists(record_path):
+        with open(record_path, 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        batch = get_scheduler().call_with_retries(client.batches.retrieve, record['batchId'])
+        if batch.status in RESUMABLE_STATUSES:
+            print(f"Reusing submitted batch {batch.id} ({batch.status})")
+            return batch.id
+
+    # Creating is not retried, a retry after a lost response could submit and pay for the batch twice
+    with open(input_path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=COMPLETION_WINDOW
+    )
+
+    with open(record_path, 'w', encoding='utf-8') as f:
+        json.dump({"batchId": batch.id, "inputFileId": input_file.id}, f, indent=2)
+    print(f"Submitted batch {batch.id} from {os.path.basename(input_path)}")
+    return batch.id
+
+
+def wait_for_batch(client, batch_id: str, poll_interval: float = POLL_INTERVAL,
+                   timeout: Optional[float] = None):
+    """Poll a batch until it reaches a terminal status and return it.
+    
+    Polls that fail transiently are retried with the scheduler's backoff, so
+    a brief outage does not abandon a batch that is still running.
+    """
+    started = time.monotonic()
+    while True:
+        batch = get_scheduler().call_with_retries(client.batches.retrieve, batch_id)
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+
+        counts = getattr(batch, 'request_counts', None)
+        if counts is not None:
+            print(f"Batch {batch_id} {batch.status}: {counts.completed + counts.failed}/{counts.total} requests done")
+        else:
+            print(f"Batch {batch_id} {batch.status}")
+
+        if timeout is not None and time.monotonic() - started >= timeout:
+            raise TimeoutError(f"Batch {batch_id} did not finish within {timeout} seconds")
+        time.sleep(poll_interval)
+
+
+def read_batch_file(client, file_id: Optional[str]) -> Iterator[Dict]:
+    """Download a batch output or error file and parse its result lines one at a time"""
+    if not file_id:
+        return
+    content = get_scheduler().call_with_retries(client.files.content, file_id).text
+    for line in content.splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_batch_results(client, batch) -> Iterator[Tuple[str, object]]:
+    """Yield each custom_id of a finished batch with its response body or an exception"""
+    for line in chain(read_batch_file(client, batch.output_file_id), read_batch_file(client, batch.error_file_id)):
+        response = line.get('response') or {}
+        if response.get('status_code') == 200 and not line.get('error'):
+            body = response['body']
+            if not getattr(client, 'records_usage', False):
+                usage = body.get('usage') or {}
+                get_metrics().record_call(
+                    body.get('model'),
+                    prompt_tokens=usage.get('prompt_tokens', 0),
+                    completion_tokens=usage.get('completion_tokens', 0),
+                    batch=True
+                )
+            yield line['custom_id'], body
+            continue
+        error = line.get('error') or (response.get('body') or {}).get('error') or {}
+        message = error.get('message') if isinstance(error, dict) else str(error)
+        yield line['custom_id'], RuntimeError(f"Batch request failed ({response.get('status_code')}): {message}")
+
+
+def run_batch_requests(client, requests: List[Dict], job_dir: Optional[str] = None,
+                       poll_interval: float = POLL_INTERVAL, timeout: Optional[float] = None,
+                       on_results: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """Run chat completion requests through the Batch API.
+
+    Requests are split into batches of at most MAX_REQUESTS_PER_BATCH, all
+    submitted before any is polled. Returns a dict mapping custom_id to the
+    response body, or to an exception for requests that failed, expired or
+    never came back. on_results, if given, is called with each group of up
+    to RESULT_GROUP_SIZE of these results as a finished batch is read.
+    """
+    job_dir = job_dir or get_batch_job_dir()
+
+    batch_ids = []
+    for start in range(0, len(requests), MAX_REQUESTS_PER_BATCH):
+        input_path = write_batch_input(job_dir, requests[start:start + MAX_REQUESTS_PER_BATCH])
+        batch_ids.append(submit_batch(client, input_path))
+
+    results = {}
+
+    def add_results(group: Dict):
+        results.update(group)
+        if on_results and group:
+            on_results(group)
+
+    for batch_id in batch_ids:
+        batch = wait_for_batch(client, batch_id, poll_interval, timeout)
+        print(f"Batch {batch_id} finished with status {batch.status}")
+        batch_results = iter_batch_results(client, batch)
+        while True:
+            group = dict(islice(batch_results, RESULT_GROUP_SIZE))
+            if not group:
+                break
+            add_results(group)
+
+    add_results({
+        request['custom_id']: RuntimeError("No result returned for batch request")
+        for request in requests if request['custom_id'] not in results
+    })
+    return results
+
+
+def get_batch_client(client, backend: str = "openai", workspace: Optional[Workspace] = None):
+    """Get the client that runs batches for the given backend"""
+    if backend not in BATCH_BACKENDS:
+        raise ValueError(f"Unknown batch backend: {backend}")
+    if backend == "local":
+        return LocalBatchClient(client, os.path.join(get_batch_job_dir(workspace), 'local'))
+    return client
+
+
+class LocalBatchClient:
+    """Local stand-in for the files and batches endpoints of the Batch API.
+
+    Batches are run against client's chat completions through the shared
+    request scheduler the first time they are retrieved, with usage priced
+    as Batch API usage so cost reports match the OpenAI backend. Files and batch
+    records live on disk, so an interrupted run can pick up where it left off.
+    """
+
+    # Requests already go through the instrumented scheduler
+    records_usage = True
+
+    def __init__(self, client, root_dir: Optional[str] = None):
+        self.client = client
+        self.root_dir = root_dir or os.path.join(get_batch_job_dir(), 'local')
+        os.makedirs(os.path.join(self.root_dir, 'files'), exist_ok=True)
+        os.makedirs(os.path.join(self.root_dir, 'batches'), exist_ok=True)
+        self.files = SimpleNamespace(create=self.create_file, content=self.file_content)
+        self.batches = SimpleNamespace(create=self.create_batch, retrieve=self.retrieve_batch)
+
+    def file_path(self, file_id: str) -> str:
+        return os.path.join(self.root_dir, 'files', f'{file_id}.jsonl')
+
+    def batch_path(self, batch_id: str) -> str:
+        return os.path.join(self.root_dir, 'batches', f'{batch_id}.json')
+
+    def write_file(self, lines: List[Dict]) -> Optional[str]:
+        if not lines:
+            return None
+        file_id = f'file-local-{uuid.uuid4().hex[:24]}'
+        with open(self.file_path(file_id), 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+        return file_id
+
+    def create_file(self, file, purpose: str = "batch"):
+        file_id = f'file-local-{uuid.uuid4().hex[:24]}'
+        with open(self.file_path(file_id), 'wb') as f:
+            f.write(file.read())
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def file_content(self, file_id: str):
+        with open(self.file_path(file_id), 'r', encoding='utf-8') as f:
+            return SimpleNamespace(text=f.read())
+
+    def save_batch(self, record: Dict):
+        with open(self.batch_path(record['id']), 'w', encoding='utf-8') as f:
+            json.dump(record, f, indent=2)
+
+    def to_batch(self, record: Dict):
+        return SimpleNamespace(**{**record, 'request_counts': SimpleNamespace(**record['request_counts'])})
+
+    def create_batch(self, input_file_id: str, endpoint: str, completion_window: str, **kwargs):
+        record = {
+            'id': f'batch-local-{uuid.uuid4().hex[:24]}',
+            'status': 'validating',
+            'endpoint': endpoint,
+            'completion_window': completion_window,
+            'input_file_id': input_file_id,
+            'output_file_id': None,
+            'error_file_id': None,
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0}
+        }
+        self.save_batch(record)
+        return self.to_batch(record)
+
+    def retrieve_batch(self, batch_id: str):
+        with open(self.batch_path(batch_id), 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        if record['status'] not in TERMINAL_STATUSES:
+            record = self.run_batch(record)
+        return self.to_batch(record)
+
+    def run_batch(self, record: Dict) -> Dict:
+        """Send every request of a batch and write its output and error files"""
+        with open(self.file_path(record['input_file_id']), 'r', encoding='utf-8') as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+
+        outputs, errors = [], []
+        for request in requests:
+            line = {'id': f'batch_req_{uuid.uuid4().hex[:24]}', 'custom_id': request['custom_id']}
+            try:
+                response = get_scheduler().create_chat_completion(self.client, batch=True, **request['body'])
+                outputs.append({**line, 'response': {'status_code': 200, 'body': response.model_dump()}, 'error': None})
+            except Exception as e:
+                errors.append({**line, 'response': None, 'error': {'code': type(e).__name__, 'message': str(e)}})
+
+        record.update({
+            'status': 'completed',
+            'output_file_id': self.write_file(outputs),
+            'error_file_id': self.write_file(errors),
+            'request_counts': {'total': len(requests), 'completed': len(outputs), 'failed': len(errors)}
+        })
+        self.save_batch(record)
+        return record
@@ -0,0 +1,75 @@
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .aggregate_ratings import matrix_from_ratings, summarize_matrix
+from .generate_graph import get_latest_ratings
+from .workspace import Workspace, get_workspace
+
+
+def brand_step_ratings(ratings_file: str) -> OrderedDict:
+    """Get the review count, mean and normalized rating of each step in a ratings file"""
+    with open(ratings_file, 'r') as f:
+        data = json.load(f)
+
+    steps, matrix = matrix_from_ratings(data['journeySteps'])
+    summary = summarize_matrix(matrix)
+    return OrderedDict(
+        (step, {
+            'total': int(total),
+            'mean': round(float(mean), 2),
+            'normalized': float(normalized)
+        })
+        for step, total, mean, normalized in zip(
+            steps, summary['totals'].tolist(), summary['means'].tolist(), summary['normalized'].tolist()
+        )
+    )
+
+
+def build_comparison(brand_ratings: Dict[str, OrderedDict]) -> Dict:
+    """Line up step ratings of several brands.
+
+    Steps are matched by name and listed in the order they first appear.
+    Brands without a step get None for it. Steps of brands that discovered
+    their own journey steps rarely match, so brands compared should share one
+    journey steps file.
+    """
+    steps: List[str] = list(OrderedDict.fromkeys(
+        step for ratings in brand_ratings.values() for step in ratings
+    ))
+    return {
+        'brands': list(brand_ratings),
+        'steps': OrderedDict(
+            (step, OrderedDict((brand, ratings.get(step)) for brand, ratings in brand_ratings.items()))
+            for step in steps
+        )
+    }
+
+
+def compare_brands(workspaces: List[Workspace], output_root: Optional[Workspace] = None) -> str:
+    """Save a comparison of step ratings across the latest ratings of each brand workspace"""
+    try:
+        brand_ratings = OrderedDict()
+        for workspace in workspaces:
+            try:
+                brand_ratings[workspace.name] = brand_step_ratings(get_latest_ratings(workspace))
+            except FileNotFoundError:
+                print(f"No ratings found for {workspace.name}, leaving it out of the comparison")
+
+        if not brand_ratings:
+            raise FileNotFoundError("No brand ratings found")
+
+        output_dir = get_workspace(output_root).shared_directory('brand-comparisons')
+        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        output_file = os.path.join(output_dir, f'brand_comparison_{timestamp}.json')
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(build_comparison(brand_ratings), f, indent=2, ensure_ascii=False)
+
+        print(f"Compared step ratings of {len(brand_ratings)} brands")
+        return output_file
+
+    except Exception as e:
+        print(f"Error comparing brands: {str(e)}")
+        raise
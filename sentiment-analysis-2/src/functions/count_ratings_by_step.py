@@ -1,64 +1,105 @@
 import json
 import os
-from glob import glob
 from datetime import datetime
 from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from .aggregate_ratings import aggregate_store
+from .review_store import ReviewStore, get_latest_review_store
+from .step_rollups import RollupStore, get_rollup_path, store_rows
+from .workspace import Workspace, get_workspace
 
-def get_journey_steps() -> list:
-    """Get ordered list of journey steps"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    journey_dir = os.path.join(os.path.dirname(current_dir), 'data', 'journey-steps')
-    journey_files = glob(os.path.join(journey_dir, 'customer_journey_steps_*.json'))
-    
-    if not journey_files:
-        raise FileNotFoundError("No journey steps file found")
-    
-    latest_file = max(journey_files, key=os.path.getctime)
-    with open(latest_file, 'r') as f:
-        data = json.load(f)
-        return data.get("journeySteps", [])
+def ratings_to_dict(steps: list, matrix: np.ndarray) -> OrderedDict:
+    """Convert a steps x ratings matrix into ordered per-step score counts"""
+    ratings = OrderedDict()
+    for step, counts in zip(steps, matrix):
+        ratings[step] = OrderedDict(
+            (score, int(count)) for score, count in enumerate(counts, start=1) if count
+        )
+    return ratings
 
-def count_ratings_by_step() -> str:
-    """Count ratings for each journey step and save results"""
+def count_incrementally(store: ReviewStore, bucket: Optional[str] = None,
+                        rollup_path: Optional[str] = None) -> dict:
+    """Merge a review store into the persisted rollups and count from them"""
+    journey_steps = store.journey_steps
+    rollups = RollupStore(rollup_path)
     try:
-        journey_steps = get_journey_steps()
-        print(f"Found {len(journey_steps)} journey steps")
+        merged = rollups.merge(store_rows(store))
+        print(f"Merged {merged['added']} new and {merged['updated']} changed reviews into rollups, "
+              f"{merged['unchanged']} unchanged")
         
-        # Load latest reviews
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        data_dir = os.path.join(os.path.dirname(current_dir), 'data')
-        input_dir = os.path.join(data_dir, 'summarized-reviews')
-        latest_file = max(glob(os.path.join(input_dir, 'summarized_reviews_*.json')), key=os.path.getctime)
+        results = {"journeySteps": ratings_to_dict(journey_steps, rollups.matrix(journey_steps))}
         
-        with open(latest_file, 'r') as f:
-            reviews = json.load(f)
-        print(f"Processing {len(reviews)} reviews")
+        rolling = rollups.rolling_windows(journey_steps)
+        results["rollingWindows"] = {
+            "end": rolling['end'],
+            "windows": OrderedDict(
+                (f"{days}d", ratings_to_dict(journey_steps, counts))
+                for days, counts in rolling['windows'].items()
+            )
+        }
         
-        # Initialize ordered ratings
-        ratings = OrderedDict()
-        for step in journey_steps:
-            ratings[step] = OrderedDict()
+        if bucket:
+            periods, period_counts = rollups.bucketed_matrix(journey_steps, bucket)
+            results["ratingsByPeriod"] = {
+                "bucket": bucket,
+                "periods": OrderedDict(
+                    (period, ratings_to_dict(journey_steps, counts))
+                    for period, counts in zip(periods, period_counts)
+                )
+            }
+        return results
+    finally:
+        rollups.close()
+
+def save_ratings(workspace: Workspace, results: dict) -> str:
+    """Save ordered results to the ratings-by-step directory"""
+    output_dir = workspace.directory('ratings-by-step')
+    output_file = os.path.join(output_dir, f'ratings_by_step_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.json')
+    
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    
+    print(f"Saved ordered ratings")
+    return output_file
+
+def count_ratings_by_step(bucket: Optional[str] = None, incremental: bool = True,
+                          workspace: Optional[Workspace] = None, store_dir: Optional[str] = None) -> str:
+    """Count ratings for each journey step and save results.
+    
+    If bucket is 'day', 'week', 'month' or 'year', counts per period are
+    saved alongside the all-time counts. With incremental, the latest reviews
+    are merged into the persisted rollups and counts cover every review seen
+    by earlier runs too, along with rolling window counts. store_dir
+    defaults to the latest review store.
+    """
+    try:
+        # Load latest review store
+        workspace = get_workspace(workspace)
+        store = ReviewStore(store_dir or get_latest_review_store(workspace))
+        journey_steps = store.journey_steps
+        print(f"Found {len(journey_steps)} journey steps")
         
-        # Count ratings maintaining order
-        for review in reviews:
-            step = review['journeyStep']
-            score = review['reviewRatingScore']
-            
-            if step in journey_steps:
-                if score not in ratings[step]:
-                    ratings[step][score] = 0
-                ratings[step][score] += 1
+        if incremental:
+            results = count_incrementally(store, bucket, get_rollup_path(workspace))
+            print(f"Processed {len(store)} reviews")
+            return save_ratings(workspace, results)
         
-        # Save ordered results
-        output_dir = os.path.join(data_dir, 'ratings-by-step')
-        os.makedirs(output_dir, exist_ok=True)
-        output_file = os.path.join(output_dir, f'ratings_by_step_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.json')
+        # Count ratings of reviews assigned to one of the journey steps
+        aggregate = aggregate_store(store, bucket)
+        results = {"journeySteps": ratings_to_dict(journey_steps, aggregate['counts'])}
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump({"journeySteps": ratings}, f, indent=2, ensure_ascii=False)
+        if bucket:
+            results["ratingsByPeriod"] = {
+                "bucket": bucket,
+                "periods": OrderedDict(
+                    (period, ratings_to_dict(journey_steps, counts))
+                    for period, counts in zip(aggregate['periods'], aggregate['periodCounts'])
+                )
+            }
         
-        print(f"Saved ordered ratings")
-        return output_file
+        print(f"Processed {len(store)} reviews")
+        return save_ratings(workspace, results)
         
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import re
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .review_io import iter_reviews, write_json_lines
+from .workspace import Workspace, get_workspace
+
+# Constants
+NUM_PERMUTATIONS = 128  # MinHash functions per review
+LSH_BANDS = 16  # Bands of NUM_PERMUTATIONS // LSH_BANDS rows; catches pairs above ~0.7 similarity
+SHINGLE_SIZE = 3  # Words per shingle
+SIMILARITY_THRESHOLD = 0.8  # Estimated Jaccard similarity needed to join a cluster
+MAX_ROOTS_PER_BUCKET = 8  # Clusters a review is checked against per LSH bucket
+MINHASH_SEED = 42
+HASH_PRIME = (1 << 32) - 5  # Largest prime below 2^32, so (a * x + b) stays below 2^64
+LARGEST_CLUSTERS_REPORTED = 10
+EXCERPT_LENGTH = 80
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase text and drop punctuation and extra whitespace"""
+    return ' '.join(WORD_PATTERN.findall((text or '').lower()))
+
+
+def shingle_hashes(normalized: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """Hash the overlapping word shingles of normalized text to 32-bit values"""
+    words = normalized.split()
+    if len(words) <= size:
+        shingles = [normalized]
+    else:
+        shingles = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.fromiter(
+        (zlib.crc32(shingle.encode('utf-8')) for shingle in set(shingles)),
+        dtype=np.uint64
+    )
+
+
+class MinHasher:
+    """MinHash signatures from universal hash functions (a * x + b) mod p.
+
+    a, b and x are all below HASH_PRIME, so the products are exact in uint64.
+    """
+
+    def __init__(self, num_permutations: int = NUM_PERMUTATIONS, seed: int = MINHASH_SEED):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, HASH_PRIME, size=num_permutations, dtype=np.uint64)
+        self.b = rng.integers(0, HASH_PRIME, size=num_permutations, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        prime = np.uint64(HASH_PRIME)
+        permuted = ((hashes[:, None] % prime) * self.a + self.b) % prime
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def find_root(parent: List[int], index: int) -> int:
+    while parent[index] != index:
+        parent[index] = parent[parent[index]]
+        index = parent[index]
+    return index
+
+
+def union(parent: List[int], first: int, second: int) -> int:
+    """Merge two clusters, keeping the earlier review as the root"""
+    first, second = find_root(parent, first), find_root(parent, second)
+    if first != second:
+        first, second = min(first, second), max(first, second)
+        parent[second] = first
+    return first
+
+
+def find_duplicate_clusters(texts: Iterable[str], threshold: float = SIMILARITY_THRESHOLD,
+                            bands: int = LSH_BANDS) -> Tuple[List[int], Dict]:
+    """Cluster exact and near-duplicate texts.
+
+    Exact duplicates are found by hashing normalized text. The remaining
+    texts get MinHash signatures that are banded for locality-sensitive
+    hashing, so only texts sharing a band are compared and the work grows
+    with the number of texts rather than the number of pairs.
+
+    Returns the index of each text's cluster representative, the earliest
+    text in its cluster, and counts of exact and near duplicates.
+    """
+    minhasher = MinHasher()
+    parent = []
+    first_by_digest = {}
+    unique_indices = []
+    signatures = []
+
+    for index, text in enumerate(texts):
+        parent.append(index)
+        normalized = normalize_text(text)
+        digest = hashlib.sha1(normalized.encode('utf-8')).digest()
+        first = first_by_digest.setdefault(digest, index)
+        if first != index:
+            parent[index] = first
+            continue
+        unique_indices.append(index)
+        signatures.append(minhasher.signature(shingle_hashes(normalized)))
+
+    exact_duplicates = len(parent) - len(unique_indices)
+    if len(signatures) > 1:
+        signatures = np.vstack(signatures)
+        rows = signatures.shape[1] // bands
+
+        for band in range(bands):
+            # Group texts whose signatures agree on every row of this band
+            keys = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+            keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel()
+            _, bucket_ids = np.unique(keys, return_inverse=True)
+            order = np.argsort(bucket_ids, kind='stable')
+            boundaries = np.flatnonzero(np.diff(bucket_ids[order])) + 1
+
+            for bucket in np.split(order, boundaries):
+                if len(bucket) < 2:
+                    continue
+                roots = []
+                for position in bucket:
+                    index = unique_indices[position]
+                    for root_position in roots:
+                        similarity = np.mean(signatures[position] == signatures[root_position])
+                        if similarity >= threshold:
+                            union(parent, unique_indices[root_position], index)
+                            break
+                    else:
+                        if len(roots) < MAX_ROOTS_PER_BUCKET:
+                            roots.append(position)
+
+    representatives = [find_root(parent, index) for index in range(len(parent))]
+    near_duplicates = sum(1 for index in unique_indices if representatives[index] != index)
+    return representatives, {'exactDuplicates': exact_duplicates, 'nearDuplicates': near_duplicates}
+
+
+def summarize_clusters(review_ids: List[str], representatives: List[int], counts: Dict) -> Tuple[List[Dict], Dict]:
+    """Build cluster records and a savings report from representative indices"""
+    members = {}
+    for index, representative in enumerate(representatives):
+        if index != representative:
+            members.setdefault(representative, []).append(review_ids[index])
+
+    clusters = [
+        {'representativeId': review_ids[representative], 'size': len(member_ids) + 1, 'memberIds': member_ids}
+        for representative, member_ids in sorted(members.items())
+    ]
+    duplicates = counts['exactDuplicates'] + counts['nearDuplicates']
+    report = {
+        'reviews': len(review_ids),
+        'uniqueReviews': len(review_ids) - duplicates,
+        'clusters': len(clusters),
+        **counts,
+        'requestsSaved': duplicates,
+        'savingsRate': round(duplicates / len(review_ids), 4) if review_ids else 0.0,
+        'clusterSizes': {str(size): count for size, count in sorted(Counter(c['size'] for c in clusters).items())}
+    }
+    return clusters, report
+
+
+def get_latest_review_clusters(workspace: Optional[Workspace] = None) -> Optional[str]:
+    """Get latest review clusters file, or None if reviews were not deduplicated"""
+    return get_workspace(workspace).latest('review-clusters', 'review_clusters_*.jsonl')
+
+
+def load_review_clusters(path: Optional[str]) -> Dict[str, str]:
+    """Map each duplicate review id to the id of its cluster representative"""
+    representative_of = {}
+    if not path:
+        return representative_of
+    for cluster in iter_reviews(path):
+        for member_id in cluster['memberIds']:
+            representative_of[member_id] = cluster['representativeId']
+    return representative_of
+
+
+def group_duplicates(reviews: List[Dict], representative_of: Dict[str, str]) -> Tuple[List[Dict], Dict[str, List[Dict]]]:
+    """Split reviews into one representative per cluster and the members behind each.
+
+    The first review of a cluster present in reviews stands in for it, even
+    if the cluster's own representative is not among them.
+    """
+    representatives = []
+    members = {}
+    leaders = {}
+    for review in reviews:
+        review_id = review.get('reviewId')
+        cluster_id = representative_of.get(review_id, review_id)
+        if cluster_id is not None and cluster_id in leaders:
+            members.setdefault(leaders[cluster_id], []).append(review)
+            continue
+        if cluster_id is not None:
+            leaders[cluster_id] = review_id
+        representatives.append(review)
+    return representatives, members
+
+
+def fan_out_summaries(completed: List[Dict], members: Dict[str, List[Dict]]) -> List[Dict]:
+    """Copy each representative's summary and journey step to the members of its cluster"""
+    expanded = []
+    for review in completed:
+        expanded.append(review)
+        for member in members.get(review.get('reviewId'), []):
+            member['reviewSummary'] = review['reviewSummary']
+            member['journeyStep'] = review['journeyStep']
+            member['summarySource'] = review.get('summarySource')
+            expanded.append(member)
+    return expanded
+
+
+def dedupe_reviews(workspace: Optional[Workspace] = None, input_file: Optional[str] = None) -> str:
+    """Cluster duplicate and near-duplicate reviews so each cluster is summarized once.
+
+    input_file defaults to the latest processed reviews file.
+    """
+    try:
+        workspace = get_workspace(workspace)
+        output_dir = workspace.directory('review-clusters')
+        input_file = input_file or workspace.require_latest('pre-processed-raw-data', 'processed_reviews_*.jsonl',
+                                                            description='processed review files')
+
+        review_ids = []
+
+        def descriptions():
+            for review in iter_reviews(input_file):
+                review_ids.append(review['reviewId'])
+                yield review['reviewDescription']
+
+        representatives, counts = find_duplicate_clusters(descriptions())
+        clusters, report = summarize_clusters(review_ids, representatives, counts)
+
+        # Add an excerpt of the largest clusters so boilerplate is easy to spot
+        largest = sorted(clusters, key=lambda c: c['size'], reverse=True)[:LARGEST_CLUSTERS_REPORTED]
+        excerpts = {cluster['representativeId']: None for cluster in largest}
+        for review in iter_reviews(input_file):
+            if review['reviewId'] in excerpts and excerpts[review['reviewId']] is None:
+                excerpts[review['reviewId']] = review['reviewDescription'][:EXCERPT_LENGTH]
+        report['largestClusters'] = [
+            {'representativeId': c['representativeId'], 'size': c['size'], 'excerpt': excerpts[c['representativeId']]}
+            for c in largest
+        ]
+
+        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        output_path = os.path.join(output_dir, f'review_clusters_{timestamp}.jsonl')
+        write_json_lines(output_path, clusters)
+        with open(os.path.join(output_dir, f'dedupe_stats_{timestamp}.json'), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+        print(f"Found {report['exactDuplicates']} exact and {report['nearDuplicates']} near-duplicate reviews "
+              f"in {report['clusters']} clusters")
+        print(f"Summarizing {report['uniqueReviews']}/{report['reviews']} reviews "
+              f"saves {report['savingsRate']:.1%} of requests")
+        for cluster in report['largestClusters'][:3]:
+            print(f"  {cluster['size']} x \"{cluster['excerpt']}\"")
+
+        return output_path
+
+    except Exception as e:
+        print(f"Error deduplicating reviews: {str(e)}")
+        raise
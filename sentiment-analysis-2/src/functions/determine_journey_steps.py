@@ -1,15 +1,29 @@
 import json
 import os
-import random
-from glob import glob
 from datetime import datetime
-from dotenv import load_dotenv
-from openai import OpenAI
-from openai import AsyncOpenAI
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+from .discover_journey_steps import discover_journey_steps, estimate_discovery_usage
+from .instrumentation import usage_estimate
+from .openai_clients import get_client
+from .prompt_compaction import SAMPLE_REVIEW_TOKENS, compaction_stats, count_tokens, fit_reviews, record_compaction
+from .request_scheduler import get_scheduler
+from .review_io import iter_reviews
+from .review_sampling import SAMPLE_SEED, StratifiedSampler, estimate_review_tokens
+from .workspace import Workspace, get_workspace
 
-# Reviews per sample
-REVIEWS_PER_SAMPLE = 100
+JOURNEY_MODEL = "gpt-4-turbo-preview"
+
+# Sample size is set by the prompt budget rather than a fixed count
+CONTEXT_WINDOW_TOKENS = 128_000  # Context window of JOURNEY_MODEL
+RESPONSE_TOKEN_RESERVE = 2_000  # Room left for the model's reply
+TOKEN_SAFETY_MARGIN = 0.9  # Share of the remaining budget used, as token counts are estimates
+MAX_SAMPLE_REVIEWS = 2_000
+JOURNEY_COMPLETION_TOKENS = 300  # Expected size of the journey steps reply
+
+# Discovery modes: "sample" analyzes one sample in a single prompt and
+# "map_reduce" proposes steps from shards of the whole corpus and merges them
+JOURNEY_MODES = ("sample", "map_reduce")
+JOURNEY_MODE = "sample"
 
 # Define prompts as constants
 JOURNEY_ANALYSIS_PROMPT = """
@@ -22,37 +36,49 @@ DO NOT start steps with 'the customer' or 'customer'.
 DO NOT include ',','('.')', 'eg.', 'e.g.', 'for example', 'such as', 'like', 'e.g.,' or 'i.e.'.
 """
 
-# Load environment variables
-load_dotenv()
+JOURNEY_SYSTEM_PROMPT = "You are a customer journey expert. Return only a JSON array of journey steps."
+
+def sample_token_budget() -> int:
+    """Tokens left for sample reviews in the journey analysis prompt"""
+    prompt_tokens = count_tokens(JOURNEY_SYSTEM_PROMPT + JOURNEY_ANALYSIS_PROMPT)
+    return int((CONTEXT_WINDOW_TOKENS - RESPONSE_TOKEN_RESERVE - prompt_tokens) * TOKEN_SAFETY_MARGIN)
 
-# Initialize AsyncOpenAI client
-client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+def build_journey_messages(sample_content: str) -> Tuple[List[Dict], Dict]:
+    """Build chat messages asking for journey steps from the content of a sample file.
+    
+    Each review goes on its own line, fitted to SAMPLE_REVIEW_TOKENS, and
+    reviews that would overflow the context window are left out. Also
+    returns the tokens saved against pasting the indented sample file.
+    """
+    descriptions = [' '.join((review['reviewDescription'] or '').split()) for review in json.loads(sample_content)]
+    fitted = fit_reviews(descriptions, SAMPLE_REVIEW_TOKENS, sample_token_budget())
+    reviews = '\n'.join(fitted)
+    shortened = sum(text != description for text, description in zip(fitted, descriptions))
+    stats = compaction_stats([sample_content], [reviews], shortened + len(descriptions) - len(fitted))
+    return [
+        {"role": "system", "content": JOURNEY_SYSTEM_PROMPT},
+        {"role": "user", "content": f"{JOURNEY_ANALYSIS_PROMPT}\n\nReviews, one per line:\n{reviews}"}
+    ], stats
 
-def extract_sample_reviews() -> str:
-    """Extract random sample of reviews for journey determination"""
+def extract_sample_reviews(seed: int = SAMPLE_SEED, workspace: Optional[Workspace] = None,
+                           input_file: Optional[str] = None) -> str:
+    """Extract a seeded sample of reviews stratified by rating and quarter for journey determination"""
     try:
         # Setup paths
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(os.path.dirname(current_dir))
+        workspace = get_workspace(workspace)
+        output_dir = workspace.directory('sample_for_journey_determination')
         
-        input_dir = os.path.join(project_root, 'src', 'data', 'pre-processed-raw-data')
-        output_dir = os.path.join(project_root, 'src', 'data', 'sample_for_journey_determination')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Get latest processed reviews file
-        json_files = glob(os.path.join(input_dir, 'processed_reviews_*.json'))
-        if not json_files:
-            raise FileNotFoundError("No processed review files found")
-        
-        latest_file = max(json_files, key=os.path.getctime)
+        # Get latest processed reviews file unless given one
+        latest_file = input_file or workspace.require_latest('pre-processed-raw-data', 'processed_reviews_*.jsonl',
+                                                             description='processed review files')
         # print(f"Reading from: {latest_file}")
         
-        # Read and sample reviews
-        with open(latest_file, 'r') as file:
-            reviews = json.load(file)
-        
-        sample_size = min(REVIEWS_PER_SAMPLE, len(reviews))
-        sample = random.sample(reviews, sample_size)
+        # Stream reviews into per-stratum reservoirs, then fill the prompt budget
+        sampler = StratifiedSampler(seed=seed).add_all(iter_reviews(latest_file))
+        token_budget = sample_token_budget()
+        sample = sampler.sample(token_budget, MAX_SAMPLE_REVIEWS)
+        sample_size = len(sample)
+        sample_tokens = sum(estimate_review_tokens(review) for review in sample)
         
         # Extract only reviewDescription
         descriptions = [{"reviewDescription": review["reviewDescription"]} for review in sample]
@@ -64,60 +90,78 @@ def extract_sample_reviews() -> str:
         output_filename = f'sample_for_journey_determination_{timestamp}.json'
         output_file = os.path.join(output_dir, output_filename)
         with open(output_file, 'w', encoding='utf-8') as file:
-            json.dump(descriptions, file, indent=2)
+            json.dump(descriptions, file, indent=2, ensure_ascii=False)
         
-        print(f"Extracted {sample_size} reviews for journey determination")
+        ratings = sorted({rating for rating, _ in sampler.counts})
+        print(f"Extracted {sample_size} of {sum(sampler.counts.values())} reviews for journey determination "
+              f"from {len(sampler.counts)} rating/quarter strata (seed {seed})")
+        print(f"Sample uses ~{sample_tokens} of {token_budget} prompt tokens across ratings {', '.join(ratings)}")
         return output_file
         
     except Exception as e:
         print(f"Error extracting sample reviews: {str(e)}")
         raise
 
-def analyze_journey_steps() -> str:
-    """Send sample reviews file to OpenAI and get journey steps"""
+def get_latest_sample(workspace: Optional[Workspace] = None) -> str:
+    """Get latest sample file for journey determination"""
+    workspace = get_workspace(workspace)
+    sample_dir = workspace.path('sample_for_journey_determination')
+    return workspace.require_latest('sample_for_journey_determination', 'sample_for_journey_determination_*.json',
+                                    description=f"sample files in {sample_dir}")
+
+def estimate_journey_usage(mode: str = JOURNEY_MODE, workspace: Optional[Workspace] = None) -> Dict:
+    """Estimate the API usage of analyze_journey_steps() without calling the API"""
+    if mode not in JOURNEY_MODES:
+        raise ValueError(f"Unknown journey mode: {mode}")
+    if mode == "map_reduce":
+        return estimate_discovery_usage(workspace=workspace)
+    
+    with open(get_latest_sample(workspace), 'r', encoding='utf-8') as f:
+        file_content = f.read()
+    messages, _ = build_journey_messages(file_content)
+    prompt_tokens = sum(count_tokens(message['content']) for message in messages)
+    return usage_estimate('analyze_journey_steps', JOURNEY_MODEL, 1, prompt_tokens, JOURNEY_COMPLETION_TOKENS)
+
+def analyze_journey_steps(mode: str = JOURNEY_MODE, workspace: Optional[Workspace] = None,
+                          sample_file: Optional[str] = None, reviews_file: Optional[str] = None) -> str:
+    """Send sample reviews file to OpenAI and get journey steps.
+    
+    The "sample" mode reads sample_file and "map_reduce" reads reviews_file,
+    each defaulting to the latest one in the workspace.
+    """
+    if mode not in JOURNEY_MODES:
+        raise ValueError(f"Unknown journey mode: {mode}")
+    if mode == "map_reduce":
+        return discover_journey_steps(workspace=workspace, input_file=reviews_file)
+    
     try:
-        # Check for API key
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable not set")
-        
-        # Setup paths
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(os.path.dirname(current_dir))
-        sample_dir = os.path.join(project_root, 'src', 'data', 'sample_for_journey_determination')
-        
-        # Find latest sample file
-        sample_files = glob(os.path.join(sample_dir, 'sample_for_journey_determination_*.json'))
-        if not sample_files:
-            raise FileNotFoundError(f"No sample files found in {sample_dir}")
-        
-        input_file = max(sample_files, key=os.path.getctime)
+        # Find latest sample file unless given one
+        input_file = sample_file or get_latest_sample(workspace)
         # print(f"Using sample file: {input_file}")
         
-        # Initialize OpenAI with explicit API key
-        client = OpenAI(api_key=api_key)
+        # Get the shared OpenAI client, raising ValueError if the API key is not set
+        client = get_client()
         
         # Read file content
-        with open(input_file, 'r') as f:
+        with open(input_file, 'r', encoding='utf-8') as f:
             file_content = f.read()
         
         # Create API request
-        response = client.chat.completions.create(
-            model="gpt-4-turbo-preview",
-            messages=[
-                {"role": "system", "content": "You are a customer journey expert. Return only a JSON array of journey steps."},
-                {"role": "user", "content": f"{JOURNEY_ANALYSIS_PROMPT}\n\nReviews:\n{file_content}"}
-            ],
+        messages, stats = build_journey_messages(file_content)
+        response = get_scheduler().create_chat_completion(
+            client,
+            model=JOURNEY_MODEL,
+            messages=messages,
             response_format={"type": "json_object"}
         )
+        record_compaction(stats)
         
         # Process response
         journey_steps = json.loads(response.choices[0].message.content)
         
         # Save journey steps with timestamp
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-        output_dir = os.path.join(project_root, 'src', 'data', 'journey-steps')
-        os.makedirs(output_dir, exist_ok=True)
+        output_dir = get_workspace(workspace).directory('journey-steps')
         output_file = os.path.join(output_dir, f'customer_journey_steps_{timestamp}.json')
         
         with open(output_file, 'w', encoding='utf-8') as f:
@@ -0,0 +1,329 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .instrumentation import usage_estimate
+from .openai_clients import get_async_client
+from .request_scheduler import get_scheduler
+from .review_io import iter_reviews
+from .prompt_compaction import count_tokens
+from .review_sampling import SAMPLE_SEED, StratifiedSampler, estimate_review_tokens
+from .step_classifier import tokenize
+from .workspace import Workspace, get_workspace
+
+# Constants
+DISCOVERY_MODEL = "gpt-4-turbo-preview"
+JOURNEY_STEP_COUNT = 12
+SHARD_TOKEN_BUDGET = 12_000  # Review tokens per map prompt
+MAX_MAP_SHARDS = 64  # Larger corpora are covered by a stratified sample filling every shard
+MAP_REVIEWS_PER_STRATUM = 2_000  # Reviews kept per rating and quarter when sampling
+MAX_CONCURRENT_SHARDS = 16  # Map requests in flight at once, the scheduler is raised to it unless rate limited
+SHARD_TIMEOUT = 180  # Seconds allowed per HTTP attempt of a map or reduce request
+MAX_REDUCE_CANDIDATES = 300  # Larger candidate lists are reduced in groups first
+INTERMEDIATE_STEP_COUNT = 40  # Steps kept by each group reduce
+MAP_COMPLETION_TOKENS = 400  # Expected size of one shard's candidate list
+REDUCE_COMPLETION_TOKENS = 600  # Expected size of the reduced steps
+CANDIDATES_PER_SHARD = 15  # Expected candidates proposed by each shard
+CANDIDATE_TOKENS = 20  # Expected size of one candidate in the reduce prompt
+
+MAP_PROMPT = """
+Identify the customer journey steps these customer reviews talk about.
+A step is one stage of the customer's experience, from first finding the service to after using it.
+Include rare steps if at least one review clearly describes them.
+
+Return ONLY this JSON structure:
+{
+    "steps": [
+        {"step": "<short journey step title>", "mentions": <number of reviews that mention this step>}
+    ]
+}
+
+Rules:
+- DO NOT include 'feedback' as a step.
+- DO NOT start steps with 'the customer' or 'customer'.
+- Keep titles short and free of examples, brackets or punctuation.
+"""
+
+REDUCE_PROMPT = """
+These candidate customer journey steps were proposed from separate groups of reviews.
+Each candidate has an id, a title, the number of reviews mentioning it and the number of review groups that proposed it.
+
+Merge candidates that describe the same stage into exactly {step_count} distinct steps, ordered chronologically
+from the beginning to the end of the customer journey. Keep rare candidates as their own step when they
+describe a distinct and important stage, rather than folding them into an unrelated step.
+
+Return ONLY this JSON structure:
+{{
+    "journeySteps": [
+        {{"step": "<journey step title>", "candidates": [<ids of the candidates merged into this step>]}}
+    ]
+}}
+
+Rules:
+- Every candidate id belongs to exactly one step.
+- DO NOT include 'feedback' as a step.
+- DO NOT start steps with 'the customer' or 'customer'.
+- DO NOT include ',','('.')', 'eg.', 'e.g.', 'for example', 'such as', 'like', 'e.g.,' or 'i.e.'.
+"""
+
+
+def build_shards(reviews, shard_budget: int = SHARD_TOKEN_BUDGET, max_shards: int = MAX_MAP_SHARDS,
+                 seed: int = SAMPLE_SEED) -> List[List[str]]:
+    """Pack review descriptions into shards of at most shard_budget tokens.
+
+    Reviews are taken in the sampler's balanced draw order, so every shard
+    mixes ratings and periods. Corpora too large for max_shards are covered
+    by a stratified sample instead.
+    """
+    sampler = StratifiedSampler(per_stratum=MAP_REVIEWS_PER_STRATUM, seed=seed).add_all(reviews)
+
+    shards = []
+    shard = []
+    used = 0
+    for review in sampler.draw_order():
+        tokens = estimate_review_tokens(review)
+        if shard and used + tokens > shard_budget:
+            shards.append(shard)
+            if len(shards) == max_shards:
+                return shards
+            shard, used = [], 0
+        shard.append(review['reviewDescription'])
+        used += tokens
+    if shard:
+        shards.append(shard)
+    return shards
+
+
+def parse_map_candidates(content: str) -> List[Dict]:
+    """Read the candidate steps of one map response, skipping malformed entries"""
+    steps = json.loads(content).get('steps', [])
+    candidates = []
+    for entry in steps if isinstance(steps, list) else []:
+        if not isinstance(entry, dict) or not isinstance(entry.get('step'), str) or not entry['step'].strip():
+            continue
+        mentions = entry.get('mentions')
+        candidates.append({
+            'step': entry['step'].strip(),
+            'mentions': mentions if isinstance(mentions, int) and mentions > 0 else 1
+        })
+    return candidates
+
+
+def step_key(step: str) -> str:
+    """Key under which differently worded titles of the same step meet"""
+    return ' '.join(sorted(set(tokenize(step)))) or step.lower()
+
+
+def merge_candidates(shard_candidates: List[List[Dict]]) -> List[Dict]:
+    """Merge candidates with the same normalized title, most mentioned first.
+
+    Each merged candidate keeps its most mentioned wording, the total
+    mentions and the shards that proposed it.
+    """
+    merged = {}
+    for shard, candidates in enumerate(shard_candidates):
+        for candidate in candidates:
+            entry = merged.setdefault(step_key(candidate['step']), {'titles': {}, 'mentions': 0, 'shards': set()})
+            entry['titles'][candidate['step']] = entry['titles'].get(candidate['step'], 0) + candidate['mentions']
+            entry['mentions'] += candidate['mentions']
+            entry['shards'] |= set(candidate.get('shards', {shard}))
+
+    return sorted(
+        (
+            {'step': max(entry['titles'], key=entry['titles'].get), 'mentions': entry['mentions'], 'shards': entry['shards']}
+            for entry in merged.values()
+        ),
+        key=lambda candidate: (-candidate['mentions'], candidate['step'])
+    )
+
+
+def build_reduce_messages(candidates: List[Dict], step_count: int) -> List[Dict]:
+    listing = [
+        {'id': candidate_id, 'step': candidate['step'], 'mentions': candidate['mentions'], 'groups': len(candidate['shards'])}
+        for candidate_id, candidate in enumerate(candidates, start=1)
+    ]
+    return [
+        {"role": "system", "content": "You are a customer journey expert."},
+        {"role": "user", "content": f"{REDUCE_PROMPT.format(step_count=step_count)}\n\nCandidates:\n{json.dumps(listing, ensure_ascii=False)}"}
+    ]
+
+
+def parse_reduce_response(content: str, candidates: List[Dict]) -> List[Dict]:
+    """Combine candidates into the reduced steps, in the order the model returned them.
+
+    Unknown ids are ignored and a candidate listed under several steps only
+    counts towards the first.
+    """
+    steps = json.loads(content).get('journeySteps', [])
+    if not isinstance(steps, list):
+        raise ValueError("Reduce response has no journeySteps list")
+
+    assigned = set()
+    reduced = []
+    for entry in steps:
+        if not isinstance(entry, dict) or not isinstance(entry.get('step'), str):
+            continue
+        ids = [
+            candidate_id for candidate_id in entry.get('candidates', [])
+            if isinstance(candidate_id, int) and 1 <= candidate_id <= len(candidates) and candidate_id not in assigned
+        ]
+        assigned.update(ids)
+        members = [candidates[candidate_id - 1] for candidate_id in ids]
+        reduced.append({
+            'step': entry['step'].strip(),
+            'mentions': sum(member['mentions'] for member in members),
+            'shards': set().union(*(member['shards'] for member in members))
+        })
+
+    if not reduced:
+        raise ValueError("Reduce response has no journey steps")
+    return reduced
+
+
+def build_map_messages(shard: List[str]) -> List[Dict]:
+    return [
+        {"role": "system", "content": "You are a customer journey expert."},
+        {"role": "user", "content": f"{MAP_PROMPT}\n\nReviews:\n{json.dumps(shard, ensure_ascii=False)}"}
+    ]
+
+
+def estimate_shard_usage(shards: List[List[str]]) -> Dict:
+    """Estimate the usage of map-reduce discovery over shards.
+
+    The reduce prompt depends on the candidates the shards propose, so it is
+    sized from CANDIDATES_PER_SHARD before merging, an upper bound.
+    """
+    map_tokens = sum(
+        count_tokens(message['content'])
+        for shard in shards for message in build_map_messages(shard)
+    )
+    candidates = min(len(shards) * CANDIDATES_PER_SHARD, MAX_REDUCE_CANDIDATES)
+    reduce_tokens = count_tokens(REDUCE_PROMPT) + candidates * CANDIDATE_TOKENS
+    return usage_estimate(
+        'analyze_journey_steps', DISCOVERY_MODEL, len(shards) + 1,
+        map_tokens + reduce_tokens,
+        len(shards) * MAP_COMPLETION_TOKENS + REDUCE_COMPLETION_TOKENS
+    )
+
+
+def estimate_discovery_usage(seed: int = SAMPLE_SEED, workspace: Optional[Workspace] = None) -> Dict:
+    """Estimate the usage of discover_journey_steps() without calling the API"""
+    latest_file = get_workspace(workspace).require_latest(
+        'pre-processed-raw-data', 'processed_reviews_*.jsonl', description='processed review files'
+    )
+    return estimate_shard_usage(build_shards(iter_reviews(latest_file), seed=seed))
+
+
+async def request_json(client, messages: List[Dict], timeout: float) -> str:
+    response = await get_scheduler().acreate_chat_completion(
+        client,
+        timeout=timeout,
+        model=DISCOVERY_MODEL,
+        messages=messages,
+        response_format={"type": "json_object"}
+    )
+    return response.choices[0].message.content
+
+
+async def map_shards(client, shards: List[List[str]], max_concurrency: int = MAX_CONCURRENT_SHARDS,
+                     timeout: float = SHARD_TIMEOUT) -> List:
+    """Propose candidate steps for every shard concurrently.
+
+    A failed shard is returned as its exception instead of a candidate list.
+    Every request also takes a slot of the shared scheduler, whose
+    concurrency starts below max_concurrency, so it is raised to match
+    unless rate limits have already lowered it.
+    """
+    get_scheduler().raise_concurrency(max_concurrency)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def map_shard(shard: List[str]) -> List[Dict]:
+        async with semaphore:
+            return parse_map_candidates(await request_json(client, build_map_messages(shard), timeout))
+
+    return await asyncio.gather(*(map_shard(shard) for shard in shards), return_exceptions=True)
+
+
+async def reduce_candidates(client, candidates: List[Dict], step_count: int = JOURNEY_STEP_COUNT,
+                            timeout: float = SHARD_TIMEOUT) -> List[Dict]:
+    """Merge candidates into step_count ordered steps.
+
+    Lists longer than MAX_REDUCE_CANDIDATES are first reduced in concurrent
+    groups, so no single prompt grows with the corpus.
+    """
+    if len(candidates) > MAX_REDUCE_CANDIDATES:
+        groups = [candidates[i:i + MAX_REDUCE_CANDIDATES] for i in range(0, len(candidates), MAX_REDUCE_CANDIDATES)]
+        reduced_groups = await asyncio.gather(*(
+            reduce_candidates(client, group, INTERMEDIATE_STEP_COUNT, timeout) for group in groups
+        ))
+        candidates = merge_candidates(reduced_groups)
+        return await reduce_candidates(client, candidates, step_count, timeout)
+
+    content = await request_json(client, build_reduce_messages(candidates, step_count), timeout)
+    return parse_reduce_response(content, candidates)
+
+
+async def discover_steps_async(shards: List[List[str]], client=None) -> Dict:
+    """Run the map and reduce phases, returning the steps and discovery stats"""
+    if client is None:
+        client = get_async_client()
+
+    results = await map_shards(client, shards)
+    failed = [result for result in results if isinstance(result, Exception)]
+    for error in failed:
+        print(f"Error analyzing shard: {type(error).__name__}: {str(error)}")
+    shard_candidates = [result if not isinstance(result, Exception) else [] for result in results]
+    if len(failed) == len(shards):
+        raise RuntimeError("Every shard failed, no journey steps were proposed")
+
+    candidates = merge_candidates(shard_candidates)
+    print(f"{len(shards) - len(failed)}/{len(shards)} shards proposed {len(candidates)} distinct candidate steps")
+
+    steps = await reduce_candidates(client, candidates)
+    return {
+        'journeySteps': [step['step'] for step in steps],
+        'steps': [
+            {'step': step['step'], 'mentions': step['mentions'], 'shards': len(step['shards'])}
+            for step in steps
+        ],
+        'shardCount': len(shards),
+        'failedShards': len(failed),
+        'candidateCount': len(candidates)
+    }
+
+
+def discover_journey_steps(seed: int = SAMPLE_SEED, workspace: Optional[Workspace] = None,
+                           input_file: Optional[str] = None) -> str:
+    """Discover journey steps by map-reduce over shards of the whole corpus"""
+    try:
+        workspace = get_workspace(workspace)
+        output_dir = workspace.directory('journey-steps')
+        latest_file = input_file or workspace.require_latest('pre-processed-raw-data', 'processed_reviews_*.jsonl',
+                                                             description='processed review files')
+
+        shards = build_shards(iter_reviews(latest_file), seed=seed)
+        review_count = sum(len(shard) for shard in shards)
+        print(f"Analyzing {review_count} reviews in {len(shards)} shards")
+
+        discovery = asyncio.run(discover_steps_async(shards))
+        discovery['reviewCount'] = review_count
+
+        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        output_file = os.path.join(output_dir, f'customer_journey_steps_{timestamp}.json')
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump({'journeySteps': discovery['journeySteps']}, f, indent=2, ensure_ascii=False)
+
+        # Keep frequencies apart, as the steps file is sent to the model as it is
+        with open(os.path.join(output_dir, f'journey_step_frequencies_{timestamp}.json'), 'w', encoding='utf-8') as f:
+            json.dump(discovery, f, indent=2, ensure_ascii=False)
+
+        for step in discovery['steps']:
+            print(f"  {step['step']}: {step['mentions']} mentions in {step['shards']} shards")
+        print(f"Journey steps saved")
+        return output_file
+
+    except Exception as e:
+        print(f"Error discovering journey steps: {str(e)}")
+        raise
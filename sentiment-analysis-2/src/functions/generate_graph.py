@@ -1,11 +1,15 @@
+import importlib.util
 import json
 import os
-from glob import glob
+import shutil
+import sys
 from datetime import datetime
+from html import escape
 from pathlib import Path
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+from typing import Dict, Optional
 import webbrowser
+from .aggregate_ratings import matrix_from_ratings, summarize_matrix
+from .workspace import Workspace, get_workspace
 
 # Constants
 PLOT_CONSTANTS = {
@@ -15,159 +19,370 @@ PLOT_CONSTANTS = {
     'ROW_HEIGHTS': [0.25, 0.25, 0.25],
     'MARGINS': dict(l=80, r=80, t=100, b=80, pad=20)
 }
+RATING_COLORS = ['#FF6B6B', '#FFD93D', '#95D5B2', '#74C0FC', '#38B000']
+TOTAL_COLOR = '#4A4E69'
+AVERAGE_COLOR = '#FF0000'
+PANEL_TITLES = ('Average Rating by Step', 'Rating Distribution by Journey Step', 'Total Responses by Step')
 
-def get_latest_ratings():
+# Output modes: "interactive" builds the plotly figure in Python, "payload"
+# writes the chart data for a small page that draws it in the browser and
+# "svg" renders a static chart without plotly
+GRAPH_MODES = ("interactive", "payload", "svg")
+GRAPH_MODE = "interactive"
+PLOTLY_BUNDLE = 'plotly.min.js'  # Shared by every page instead of being inlined in each
+
+# SVG layout, in pixels
+SVG_PANEL_HEIGHT = 300
+SVG_LABEL_SPACE = 150  # Room for rotated step labels under each panel
+SVG_TOP = 90
+SVG_LEFT = 80
+SVG_RIGHT = 40
+
+PAYLOAD_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Customer journey ratings</title>
+<script src="__BUNDLE__"></script>
+</head>
+<body>
+<div id="chart"></div>
+<script>
+const data = __PAYLOAD__;
+const layout = data.layout;
+const traces = [{
+    x: data.steps, y: data.averages, name: 'Average Rating', mode: 'lines+markers',
+    line: {color: data.colors.average, width: 2}, xaxis: 'x', yaxis: 'y',
+    hovertemplate: 'Step: %{x}<br>Average Rating: %{y:.2f}<extra></extra>'
+}];
+data.ratings.forEach((counts, index) => traces.push({
+    type: 'bar', x: data.steps, y: counts, name: `${index + 1} Star${index ? 's' : ''}`,
+    marker: {color: data.colors.ratings[index]}, xaxis: 'x2', yaxis: 'y2',
+    hovertemplate: `Step: %{x}<br>Rating: ${index + 1}<br>Count: %{y}<extra></extra>`
+}));
+traces.push({
+    type: 'bar', x: data.steps, y: data.totals, name: 'Total Responses',
+    marker: {color: data.colors.total}, xaxis: 'x3', yaxis: 'y3',
+    hovertemplate: 'Step: %{x}<br>Total: %{y}<extra></extra>'
+});
+Plotly.newPlot('chart', traces, layout);
+</script>
+</body>
+</html>
+"""
+
+def get_latest_ratings(workspace: Optional[Workspace] = None):
     """Get latest ratings file from ratings-by-step directory"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    ratings_dir = os.path.join(os.path.dirname(current_dir), 'data', 'ratings-by-step')
-    json_files = glob(os.path.join(ratings_dir, 'ratings_by_step_*.json'))
-    
-    if not json_files:
-        raise FileNotFoundError("No ratings files found")
-    
-    return max(json_files, key=os.path.getctime)
-
-def generate_graph():
-    """Generate and display interactive visualization"""
-    try:
-        # Setup directories
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        data_dir = os.path.join(os.path.dirname(current_dir), 'data')
-        vis_dir = os.path.join(data_dir, 'visualizations')  # Correct path
-        os.makedirs(vis_dir, exist_ok=True)
+    return get_workspace(workspace).require_latest('ratings-by-step', 'ratings_by_step_*.json',
+                                                   description='ratings files')
 
-        # Load data
-        latest_file = get_latest_ratings()
-        
-        with open(latest_file, 'r') as f:
-            data = json.load(f)
-        # print("Data loaded successfully")
-        
-        journey_data = data['journeySteps']
-        steps = list(journey_data.keys())
-        # print(f"Found {len(steps)} journey steps")
-        
-        # Initialize data structures
-        ratings = {i: [] for i in range(1, 6)}
-        total_responses = []
-        average_ratings = []
-        
-        # Process ratings
-        for step in steps:
-            step_data = journey_data[step]
-            step_total = 0
-            weighted_sum = 0.0  # Initialize as float
-            
-            for rating in range(1, 6):
-                count = step_data.get(str(rating), 0)
-                ratings[rating].append(count)
-                step_total += count
-                weighted_sum += float(rating) * count
-            
-            if step_total > 0:
-                avg_rating = round(weighted_sum / step_total, 1)  # Round to 1 decimal
-                normalized_rating = round((avg_rating - 3) / 2, 1)  # Round normalization
-            else:
-                normalized_rating = 0.0
-            
-            average_ratings.append(normalized_rating)
-            total_responses.append(step_total)
-            # print(f"Step: {step}, Total: {step_total}, Avg Rating: {normalized_rating:.2f}")
-        
-        # Create visualization
-        fig = make_subplots(
-            rows=3, cols=1,
-            subplot_titles=(
-                'Average Rating by Step',
-                'Rating Distribution by Journey Step',
-                'Total Responses by Step'
-            ),
-            row_heights=PLOT_CONSTANTS['ROW_HEIGHTS'],
-            vertical_spacing=PLOT_CONSTANTS['VERTICAL_SPACING']
-        )
-        
-        # Add average ratings trace
-        fig.add_trace(
-            go.Scatter(
-                x=steps,
-                y=average_ratings,
-                name='Average Rating',
-                line=dict(color='#FF0000', width=2),
-                mode='lines+markers',
-                hovertemplate="Step: %{x}<br>Average Rating: %{y:.2f}<extra></extra>"
-            ),
-            row=1, col=1
-        )
-        
-        # Add rating distribution traces
-        colors = ['#FF6B6B', '#FFD93D', '#95D5B2', '#74C0FC', '#38B000']
-        for rating in range(1, 6):
-            fig.add_trace(
-                go.Bar(
-                    name=f'{rating} Star{"s" if rating != 1 else ""}',
-                    x=steps,
-                    y=ratings[rating],
-                    marker_color=colors[rating-1],
-                    hovertemplate="Step: %{x}<br>Rating: " + str(rating) + "<br>Count: %{y}<extra></extra>"
-                ),
-                row=2, col=1
-            )
-        
-        # Add total responses trace
+def get_asset_dir(workspace: Optional[Workspace] = None) -> str:
+    """Get directory of assets shared by every visualization"""
+    return get_workspace(workspace).shared_directory('visualization-assets')
+
+def ensure_plotly_bundle(asset_dir: str) -> str:
+    """Copy plotly.js into asset_dir once, without importing plotly"""
+    bundle_path = os.path.join(asset_dir, PLOTLY_BUNDLE)
+    if not os.path.exists(bundle_path):
+        spec = importlib.util.find_spec('plotly')
+        if spec is None or spec.origin is None:
+            raise ImportError("plotly is required for interactive visualizations")
+        shutil.copyfile(os.path.join(os.path.dirname(spec.origin), 'package_data', PLOTLY_BUNDLE), bundle_path)
+    return bundle_path
+
+def load_graph_data(ratings_file: str) -> Dict:
+    """Derive the plotted series from a ratings-by-step file"""
+    with open(ratings_file, 'r') as f:
+        data = json.load(f)
+
+    # Derive totals and normalized averages from the rating matrix
+    steps, matrix = matrix_from_ratings(data['journeySteps'])
+    summary = summarize_matrix(matrix)
+
+    return {
+        'steps': steps,
+        'ratings': [matrix[:, rating - 1].tolist() for rating in range(1, 6)],
+        'totals': summary['totals'].tolist(),
+        'averages': summary['normalized'].tolist()
+    }
+
+def figure_layout() -> Dict:
+    """Layout shared by the plotly figure and the payload page"""
+    return dict(
+        barmode='stack',
+        height=PLOT_CONSTANTS['HEIGHT'],
+        width=PLOT_CONSTANTS['WIDTH'],
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        margin=PLOT_CONSTANTS['MARGINS'],
+        autosize=True
+    )
+
+def payload_layout() -> Dict:
+    """Plotly.js layout with the three stacked subplots of build_figure()"""
+    layout = figure_layout()
+    heights = PLOT_CONSTANTS['ROW_HEIGHTS']
+    spacing = PLOT_CONSTANTS['VERTICAL_SPACING']
+    scale = (1 - spacing * (len(heights) - 1)) / sum(heights)
+
+    top = 1.0
+    annotations = []
+    for row, (height, title) in enumerate(zip(heights, PANEL_TITLES), start=1):
+        bottom = top - height * scale
+        suffix = '' if row == 1 else str(row)
+        layout[f'xaxis{suffix}'] = {'anchor': f'y{suffix}', 'tickangle': 45}
+        layout[f'yaxis{suffix}'] = {'anchor': f'x{suffix}', 'domain': [round(max(bottom, 0), 4), round(top, 4)]}
+        annotations.append({
+            'text': title, 'showarrow': False, 'font': {'size': 16},
+            'xref': 'paper', 'yref': 'paper', 'x': 0.5, 'y': top,
+            'xanchor': 'center', 'yanchor': 'bottom'
+        })
+        top = bottom - spacing
+
+    layout['yaxis'].update(title={'text': "Average Rating"}, range=[-2, 2], tickmode='array',
+                           tickvals=[i/4 for i in range(-10, 11, 2)], tickformat='.1f')
+    layout['yaxis2']['title'] = {'text': "Number of Ratings"}
+    layout['yaxis3']['title'] = {'text': "Total Responses"}
+    layout['annotations'] = annotations
+    return layout
+
+def build_figure(data: Dict):
+    """Build the three-panel plotly figure, importing plotly only when needed"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    steps = data['steps']
+    fig = make_subplots(
+        rows=3, cols=1,
+        subplot_titles=PANEL_TITLES,
+        row_heights=PLOT_CONSTANTS['ROW_HEIGHTS'],
+        vertical_spacing=PLOT_CONSTANTS['VERTICAL_SPACING']
+    )
+
+    # Add average ratings trace
+    fig.add_trace(
+        go.Scatter(
+            x=steps,
+            y=data['averages'],
+            name='Average Rating',
+            line=dict(color=AVERAGE_COLOR, width=2),
+            mode='lines+markers',
+            hovertemplate="Step: %{x}<br>Average Rating: %{y:.2f}<extra></extra>"
+        ),
+        row=1, col=1
+    )
+
+    # Add rating distribution traces
+    for rating in range(1, 6):
         fig.add_trace(
             go.Bar(
+                name=f'{rating} Star{"s" if rating != 1 else ""}',
                 x=steps,
-                y=total_responses,
-                name='Total Responses',
-                marker_color='#4A4E69',
-                hovertemplate="Step: %{x}<br>Total: %{y}<extra></extra>"
+                y=data['ratings'][rating - 1],
+                marker_color=RATING_COLORS[rating-1],
+                hovertemplate="Step: %{x}<br>Rating: " + str(rating) + "<br>Count: %{y}<extra></extra>"
             ),
-            row=3, col=1
+            row=2, col=1
         )
-        
-        # Update layout
-        fig.update_layout(
-            barmode='stack',
-            height=PLOT_CONSTANTS['HEIGHT'],
-            width=PLOT_CONSTANTS['WIDTH'],
-            showlegend=True,
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1
-            ),
-            margin=PLOT_CONSTANTS['MARGINS'],
-            autosize=True
+
+    # Add total responses trace
+    fig.add_trace(
+        go.Bar(
+            x=steps,
+            y=data['totals'],
+            name='Total Responses',
+            marker_color=TOTAL_COLOR,
+            hovertemplate="Step: %{x}<br>Total: %{y}<extra></extra>"
+        ),
+        row=3, col=1
+    )
+
+    fig.update_layout(**figure_layout())
+
+    # Update axes
+    fig.update_yaxes(
+        title_text="Average Rating",
+        range=[-2, 2],
+        tickmode='array',
+        tickvals=[i/4 for i in range(-10, 11, 2)],  # Creates ticks at 0.2 intervals
+        tickformat='.1f',  # Display one decimal place
+        row=1, col=1
+    )
+    fig.update_yaxes(title_text="Number of Ratings", row=2, col=1)
+    fig.update_yaxes(title_text="Total Responses", row=3, col=1)
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+def write_interactive(data: Dict, output_path: str, asset_dir: str):
+    """Write the plotly figure as HTML that loads the shared plotly.js bundle"""
+    bundle_path = ensure_plotly_bundle(asset_dir)
+    bundle_src = Path(os.path.relpath(bundle_path, os.path.dirname(output_path))).as_posix()
+    build_figure(data).write_html(output_path, include_plotlyjs=bundle_src)
+
+def write_payload(data: Dict, output_path: str, asset_dir: str) -> str:
+    """Write the chart data as JSON beside a small page that draws it with the shared bundle.
+
+    Returns the path of the JSON payload.
+    """
+    bundle_path = ensure_plotly_bundle(asset_dir)
+    bundle_src = Path(os.path.relpath(bundle_path, os.path.dirname(output_path))).as_posix()
+    payload = {
+        **data,
+        'colors': {'ratings': RATING_COLORS, 'total': TOTAL_COLOR, 'average': AVERAGE_COLOR},
+        'layout': payload_layout()
+    }
+
+    payload_path = os.path.splitext(output_path)[0] + '.json'
+    with open(payload_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+
+    # Embedded as well, as browsers block reading local files from file:// pages
+    embedded = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+    page = PAYLOAD_PAGE.replace('__BUNDLE__', escape(bundle_src)).replace('__PAYLOAD__', embedded)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return payload_path
+
+def svg_number(value: float) -> str:
+    return f"{value:.1f}".rstrip('0').rstrip('.')
+
+def render_svg(data: Dict) -> str:
+    """Render the three panels as a static SVG chart, without plotly"""
+    steps = data['steps']
+    width = PLOT_CONSTANTS['WIDTH']
+    plot_width = width - SVG_LEFT - SVG_RIGHT
+    band = plot_width / max(len(steps), 1)
+    panel_step = SVG_PANEL_HEIGHT + SVG_LABEL_SPACE
+    height = SVG_TOP + panel_step * len(PANEL_TITLES)
+
+    def x_center(index: int) -> float:
+        return SVG_LEFT + (index + 0.5) * band
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="12">',
+        f'<rect width="{width}" height="{height}" fill="white"/>'
+    ]
+
+    # Legend
+    legend = [(f'{rating} Star{"s" if rating != 1 else ""}', color) for rating, color in enumerate(RATING_COLORS, start=1)]
+    legend += [('Average Rating', AVERAGE_COLOR), ('Total Responses', TOTAL_COLOR)]
+    for index, (label, color) in enumerate(legend):
+        x = SVG_LEFT + index * 150
+        parts.append(f'<rect x="{x}" y="20" width="12" height="12" fill="{color}"/>')
+        parts.append(f'<text x="{x + 18}" y="31">{escape(label)}</text>')
+
+    def panel(row: int, title: str, y_min: float, y_max: float, ticks, label: str):
+        top = SVG_TOP + row * panel_step
+        bottom = top + SVG_PANEL_HEIGHT
+
+        def y_of(value: float) -> float:
+            return bottom - (value - y_min) / ((y_max - y_min) or 1) * SVG_PANEL_HEIGHT
+
+        parts.append(f'<text x="{width / 2}" y="{top - 12}" text-anchor="middle" font-size="16">{escape(title)}</text>')
+        for tick in ticks:
+            y = svg_number(y_of(tick))
+            parts.append(f'<line x1="{SVG_LEFT}" x2="{width - SVG_RIGHT}" y1="{y}" y2="{y}" stroke="#e5e5e5"/>')
+            parts.append(f'<text x="{SVG_LEFT - 6}" y="{y}" text-anchor="end" dominant-baseline="middle">{svg_number(tick)}</text>')
+        parts.append(
+            f'<text transform="translate(20 {(top + bottom) / 2}) rotate(-90)" text-anchor="middle">{escape(label)}</text>'
         )
-        
-        # Update axes
-        fig.update_yaxes(
-            title_text="Average Rating",
-            range=[-2, 2],
-            tickmode='array',
-            tickvals=[i/4 for i in range(-10, 11, 2)],  # Creates ticks at 0.2 intervals
-            tickformat='.1f',  # Display one decimal place
-            row=1, col=1
-)
-        fig.update_yaxes(title_text="Number of Ratings", row=2, col=1)
-        fig.update_yaxes(title_text="Total Responses", row=3, col=1)
-        fig.update_xaxes(tickangle=45)
-        
+        for index, step in enumerate(steps):
+            x = svg_number(x_center(index))
+            parts.append(f'<text transform="translate({x} {bottom + 10}) rotate(45)">{escape(step)}</text>')
+        return y_of
+
+    # Average ratings as a line on a fixed -2 to 2 scale
+    y_of = panel(0, PANEL_TITLES[0], -2, 2, [i / 2 for i in range(-4, 5)], "Average Rating")
+    points = ' '.join(f'{svg_number(x_center(i))},{svg_number(y_of(value))}' for i, value in enumerate(data['averages']))
+    parts.append(f'<polyline points="{points}" fill="none" stroke="{AVERAGE_COLOR}" stroke-width="2"/>')
+    for index, value in enumerate(data['averages']):
+        parts.append(f'<circle cx="{svg_number(x_center(index))}" cy="{svg_number(y_of(value))}" r="4" fill="{AVERAGE_COLOR}">'
+                     f'<title>{escape(steps[index])}: {value:.2f}</title></circle>')
+
+    # Rating distribution as stacked bars, then totals
+    peak = max(data['totals'], default=0) or 1
+    ticks = [peak * i / 4 for i in range(5)]
+    bar_width = svg_number(band * 0.7)
+    for row, title, label in ((1, PANEL_TITLES[1], "Number of Ratings"), (2, PANEL_TITLES[2], "Total Responses")):
+        y_of = panel(row, title, 0, peak, ticks, label)
+        for index, total in enumerate(data['totals']):
+            x = svg_number(x_center(index) - band * 0.35)
+            if row == 1:
+                stacked = 0
+                for rating, color in enumerate(RATING_COLORS):
+                    count = data['ratings'][rating][index]
+                    if count:
+                        parts.append(
+                            f'<rect x="{x}" y="{svg_number(y_of(stacked + count))}" width="{bar_width}" '
+                            f'height="{svg_number(y_of(stacked) - y_of(stacked + count))}" fill="{color}">'
+                            f'<title>{escape(steps[index])}: {count} x {rating + 1} star</title></rect>'
+                        )
+                    stacked += count
+            elif total:
+                parts.append(
+                    f'<rect x="{x}" y="{svg_number(y_of(total))}" width="{bar_width}" '
+                    f'height="{svg_number(y_of(0) - y_of(total))}" fill="{TOTAL_COLOR}">'
+                    f'<title>{escape(steps[index])}: {total}</title></rect>'
+                )
+
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+def can_open_browser() -> bool:
+    """Whether a browser can be shown, which headless Linux servers cannot do"""
+    if sys.platform.startswith('linux'):
+        return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    return True
+
+def generate_graph(mode: str = GRAPH_MODE, open_browser: Optional[bool] = None,
+                   workspace: Optional[Workspace] = None, ratings_file: Optional[str] = None) -> str:
+    """Generate the visualization and open it if a browser can be shown.
+
+    open_browser defaults to opening HTML output when a display is available.
+    ratings_file defaults to the latest ratings file.
+    """
+    if mode not in GRAPH_MODES:
+        raise ValueError(f"Unknown graph mode: {mode}")
+
+    try:
+        # Setup directories
+        workspace = get_workspace(workspace)
+        vis_dir = workspace.directory('visualizations')
+
+        # Load data
+        data = load_graph_data(ratings_file or get_latest_ratings(workspace))
+
         # Save visualization
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-        output_path = os.path.join(vis_dir, f'journey_visualization_{timestamp}.html')
-        
-        fig.write_html(output_path)
-        webbrowser.open('file://' + os.path.abspath(output_path))
-        
+        if mode == "svg":
+            output_path = os.path.join(vis_dir, f'journey_visualization_{timestamp}.svg')
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(render_svg(data))
+        else:
+            output_path = os.path.join(vis_dir, f'journey_visualization_{timestamp}.html')
+            if mode == "payload":
+                write_payload(data, output_path, get_asset_dir(workspace))
+            else:
+                write_interactive(data, output_path, get_asset_dir(workspace))
+
+        if open_browser is None:
+            open_browser = mode != "svg" and can_open_browser()
+        if open_browser:
+            try:
+                webbrowser.open('file://' + os.path.abspath(output_path))
+            except Exception as e:
+                print(f"Could not open browser: {str(e)}")
+
         print(f"Visualization saved")
         return output_path
-        
+
     except Exception as e:
         print(f"Error generating visualization: {str(e)}")
         raise
-
-if __name__ == "__main__":
-    generate_graph()
\ No newline at end of file
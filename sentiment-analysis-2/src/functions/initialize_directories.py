@@ -1,31 +1,41 @@
 import shutil
 from datetime import datetime
 import os
+from typing import Optional
+from .workspace import Workspace, get_workspace
 
 # Constants for directory structure
 DIRECTORIES_TO_CLEAN = [
     'pre-processed-raw-data',
+    'review-clusters',
     'sample_for_journey_determination',
     'journey-steps',
     'summarized-reviews',
+    'review-store',
+    'search-index',
     'ratings-by-step',
-    'visualizations'
+    'visualizations',
+    'run-manifest',
+    'batch-jobs'
 ]
 
 DIRECTORIES_TO_PRESERVE = [
-    'raw-trustpilot-data'
+    'raw-trustpilot-data',
+    'step-rollups'
 ]
 
-def initialize_directories():
+# Preserved directories shared by every workspace
+SHARED_DIRECTORIES = [
+    'summary-cache',
+    'run-reports',
+    'visualization-assets'
+]
+
+def initialize_directories(workspace: Optional[Workspace] = None):
     """Initialize working directories by removing and recreating them"""
+    workspace = get_workspace(workspace)
+    data_dir = workspace.data_dir
     
-    # Get absolute path to project root
-    current_dir = os.path.dirname(os.path.abspath(__file__))  # /functions
-    src_dir = os.path.dirname(current_dir)  # /src
-    data_dir = os.path.join(src_dir, 'data')  # /src/data
-    
-    print(f"Current directory: {current_dir}")
-    print(f"Source directory: {src_dir}")
     print(f"Data directory: {data_dir}")
     
     # Ensure base data directory exists
@@ -58,4 +68,7 @@ def initialize_directories():
             print(f"Preserved directory: {full_path}")
         except Exception as e:
             print(f"Error preserving directory {dir_name}: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+    
+    for dir_name in SHARED_DIRECTORIES:
+        workspace.shared_directory(dir_name)
\ No newline at end of file
@@ -0,0 +1,280 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .workspace import Workspace, get_workspace
+
+# Constants
+# USD per million prompt and completion tokens
+MODEL_PRICES = {
+    "gpt-4-turbo-preview": (10.00, 30.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+DEFAULT_PRICES = (10.00, 30.00)  # Assumed for models missing from MODEL_PRICES
+BATCH_DISCOUNT = 0.5  # Batch API requests cost half the synchronous price
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)  # Seconds
+NO_STAGE = 'none'
+
+
+def model_prices(model: Optional[str]):
+    """Get prices for a model, matching dated snapshots such as gpt-4o-2024-08-06 by prefix"""
+    if model in MODEL_PRICES:
+        return MODEL_PRICES[model]
+    matches = [name for name in MODEL_PRICES if model and model.startswith(name)]
+    return MODEL_PRICES[max(matches, key=len)] if matches else DEFAULT_PRICES
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, batch: bool = False) -> float:
+    """Estimate the USD cost of a request from its token counts"""
+    prompt_price, completion_price = model_prices(model)
+    cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+def usage_estimate(stage: str, model: str, requests: int, prompt_tokens: int,
+                   completion_tokens: int, batch: bool = False) -> Dict:
+    """Describe the expected API usage of a stage for a dry run"""
+    return {
+        'stage': stage,
+        'model': model,
+        'requests': requests,
+        'promptTokens': prompt_tokens,
+        'completionTokens': completion_tokens,
+        'batch': batch,
+        'costUsd': round(estimate_cost(model, prompt_tokens, completion_tokens, batch), 4)
+    }
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def new_totals() -> Dict:
+    return {'calls': 0, 'errors': 0, 'promptTokens': 0, 'completionTokens': 0, 'costUsd': 0.0}
+
+
+def new_compaction() -> Dict:
+    return {'prompts': 0, 'originalTokens': 0, 'sentTokens': 0, 'truncatedReviews': 0}
+
+
+def compaction_summary(compaction: Dict) -> Dict:
+    saved = compaction['originalTokens'] - compaction['sentTokens']
+    return {
+        **compaction,
+        'savedTokens': saved,
+        'savedPercent': round(100 * saved / compaction['originalTokens'], 1) if compaction['originalTokens'] else 0.0
+    }
+
+
+class RunMetrics:
+    """Thread-safe record of stage timings and model calls for one run.
+
+    Calls are attributed to the stage running in their thread when they
+    finish, so pipelines running in parallel threads keep apart. Latencies
+    are kept per model both raw, for percentiles, and bucketed, for the
+    Prometheus histogram.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.start = time.perf_counter()
+        self.local = threading.local()
+        self.stages: List[Dict] = []
+        self.stage_totals: Dict[str, Dict] = {}
+        self.models: Dict[str, Dict] = {}
+        self.latencies: Dict[str, List[float]] = {}
+        self.compaction: Dict[str, Dict] = {}
+
+    @property
+    def current_stage(self) -> str:
+        return getattr(self.local, 'stage', NO_STAGE)
+
+    @current_stage.setter
+    def current_stage(self, name: str):
+        self.local.stage = name
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a pipeline stage and attribute model calls made during it"""
+        previous = self.current_stage
+        self.current_stage = name
+        started = time.perf_counter()
+        # Offset from the start of the run, showing which stages overlapped
+        entry = {'name': name, 'status': 'running', 'startOffset': round(started - self.start, 3)}
+        try:
+            yield entry
+            entry['status'] = 'complete'
+        except BaseException:
+            entry['status'] = 'failed'
+            raise
+        finally:
+            entry['seconds'] = round(time.perf_counter() - started, 3)
+            with self.lock:
+                self.stages.append(entry)
+            self.current_stage = previous
+
+    def record_call(self, model: str, latency: Optional[float] = None, prompt_tokens: int = 0,
+                    completion_tokens: int = 0, error: bool = False, batch: bool = False):
+        """Record one model call, or the usage of one Batch API request when batch is set"""
+        cost = estimate_cost(model, prompt_tokens, completion_tokens, batch)
+        with self.lock:
+            for totals in (
+                self.models.setdefault(model, new_totals()),
+                self.stage_totals.setdefault(self.current_stage, new_totals())
+            ):
+                totals['calls'] += 1
+                totals['errors'] += int(error)
+                totals['promptTokens'] += prompt_tokens
+                totals['completionTokens'] += completion_tokens
+                totals['costUsd'] += cost
+            if latency is not None:
+                self.latencies.setdefault(model, []).append(latency)
+
+    def record_compaction(self, original_tokens: int, sent_tokens: int, truncated_reviews: int = 0):
+        """Record one prompt built with compaction and the tokens it saved"""
+        with self.lock:
+            totals = self.compaction.setdefault(self.current_stage, new_compaction())
+            totals['prompts'] += 1
+            totals['originalTokens'] += original_tokens
+            totals['sentTokens'] += sent_tokens
+            totals['truncatedReviews'] += truncated_reviews
+
+    def record_response(self, model: str, latency: float, response, batch: bool = False):
+        """Record a successful chat completion, reading its token usage"""
+        usage = getattr(response, 'usage', None)
+        self.record_call(
+            model, latency,
+            getattr(usage, 'prompt_tokens', 0) or 0,
+            getattr(usage, 'completion_tokens', 0) or 0,
+            batch=batch
+        )
+
+    def latency_summary(self, model: str) -> Dict:
+        latencies = self.latencies.get(model, [])
+        buckets = {}
+        for bound in LATENCY_BUCKETS:
+            buckets['+Inf' if bound == math.inf else str(bound)] = sum(1 for value in latencies if value <= bound)
+        return {
+            'count': len(latencies),
+            'sum': round(sum(latencies), 3),
+            'p50': percentile(latencies, 0.5),
+            'p95': percentile(latencies, 0.95),
+            'max': max(latencies) if latencies else None,
+            'buckets': buckets
+        }
+
+    def report(self, extra: Optional[Dict] = None) -> Dict:
+        """Build the machine-readable run report"""
+        with self.lock:
+            stages = []
+            for entry in self.stages:
+                totals = self.stage_totals.get(entry['name'], new_totals())
+                seconds = entry.get('seconds') or 0
+                stages.append({
+                    **entry,
+                    **totals,
+                    'costUsd': round(totals['costUsd'], 4),
+                    'callsPerSecond': round(totals['calls'] / seconds, 2) if seconds else None,
+                    'tokensPerSecond': round((totals['promptTokens'] + totals['completionTokens']) / seconds, 1) if seconds else None
+                })
+
+            models = {
+                model: {**totals, 'costUsd': round(totals['costUsd'], 4), 'latency': self.latency_summary(model)}
+                for model, totals in self.models.items()
+            }
+            total = new_totals()
+            for totals in self.models.values():
+                for key in total:
+                    total[key] += totals[key]
+            total['costUsd'] = round(total['costUsd'], 4)
+
+            compaction_total = new_compaction()
+            for totals in self.compaction.values():
+                for key in compaction_total:
+                    compaction_total[key] += totals[key]
+            compaction = {
+                'stages': {stage: compaction_summary(totals) for stage, totals in self.compaction.items()},
+                'totals': compaction_summary(compaction_total)
+            }
+
+        return {
+            'startedAt': self.started_at,
+            'seconds': round(time.perf_counter() - self.start, 3),
+            'stages': stages,
+            'models': models,
+            'totals': total,
+            'promptCompaction': compaction,
+            **(extra or {})
+        }
+
+    def to_prometheus(self, report: Optional[Dict] = None) -> str:
+        """Render the run report in the Prometheus text exposition format"""
+        report = report or self.report()
+        lines = [
+            '# HELP pipeline_stage_seconds Wall-clock time of each pipeline stage.',
+            '# TYPE pipeline_stage_seconds gauge'
+        ]
+        for stage in report['stages']:
+            lines.append(f'pipeline_stage_seconds{{stage="{stage["name"]}",status="{stage["status"]}"}} {stage["seconds"]}')
+
+        counters = [
+            ('openai_requests_total', 'calls', 'Model requests made.'),
+            ('openai_request_errors_total', 'errors', 'Model requests that failed.'),
+            ('openai_prompt_tokens_total', 'promptTokens', 'Prompt tokens used.'),
+            ('openai_completion_tokens_total', 'completionTokens', 'Completion tokens used.'),
+            ('openai_cost_usd_total', 'costUsd', 'Estimated cost in USD.'),
+        ]
+        for metric, key, help_text in counters:
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+            for model, totals in report['models'].items():
+                lines.append(f'{metric}{{model="{model}"}} {totals[key]}')
+
+        lines += [
+            '# HELP openai_request_latency_seconds Latency of successful model requests.',
+            '# TYPE openai_request_latency_seconds histogram'
+        ]
+        for model, totals in report['models'].items():
+            latency = totals['latency']
+            for bound, count in latency['buckets'].items():
+                lines.append(f'openai_request_latency_seconds_bucket{{model="{model}",le="{bound}"}} {count}')
+            lines.append(f'openai_request_latency_seconds_sum{{model="{model}"}} {latency["sum"]}')
+            lines.append(f'openai_request_latency_seconds_count{{model="{model}"}} {latency["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def get_report_dir(workspace: Optional[Workspace] = None) -> str:
+    """Get directory holding run reports, shared by every workspace"""
+    return get_workspace(workspace).shared_directory('run-reports')
+
+
+def write_run_report(report: Dict, prometheus_text: Optional[str] = None, report_dir: Optional[str] = None) -> str:
+    """Write a run report as JSON, plus a .prom file when Prometheus text is given"""
+    report_dir = report_dir or get_report_dir()
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    report_path = os.path.join(report_dir, f'run_report_{timestamp}.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    if prometheus_text is not None:
+        with open(os.path.join(report_dir, f'run_report_{timestamp}.prom'), 'w', encoding='utf-8') as f:
+            f.write(prometheus_text)
+    return report_path
+
+
+_metrics = RunMetrics()
+
+
+def get_metrics() -> RunMetrics:
+    """Get the metrics shared by every stage and model call in the process"""
+    return _metrics
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import threading
+import weakref
+
+# openai and dotenv are imported on first use, keeping them out of the
+# startup of stages that never call the API
+
+_lock = threading.Lock()
+_environment_loaded = False
+_client = None
+_async_clients = weakref.WeakKeyDictionary()  # One per event loop, as async clients are tied to theirs
+
+
+def load_environment():
+    """Load variables from .env once per process"""
+    global _environment_loaded
+    with _lock:
+        if not _environment_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _environment_loaded = True
+
+
+def get_api_key() -> str:
+    """Get the OpenAI API key, raising ValueError if it is not set"""
+    load_environment()
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY environment variable not set")
+    return api_key
+
+
+def get_client():
+    """Get the OpenAI client shared by the process, leaving retries to the request scheduler"""
+    global _client
+    api_key = get_api_key()
+    with _lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(api_key=api_key, max_retries=0)
+        return _client
+
+
+def get_async_client():
+    """Get the AsyncOpenAI client of the running event loop, leaving retries to the request scheduler"""
+    loop = asyncio.get_running_loop()
+    api_key = get_api_key()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI(api_key=api_key, max_retries=0)
+            _async_clients[loop] = client
+        return client
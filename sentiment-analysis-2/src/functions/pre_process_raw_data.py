@@ -1,68 +1,252 @@
+import hashlib
 import json
 import os
-from datetime import datetime
+import re
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+from .review_io import iter_json_array, iter_json_lines, write_json_lines
+from .workspace import Workspace, get_workspace
 # import random
 
-def parse_experience_date(date_string):
+# Constants
+MAX_WORKERS = os.cpu_count() or 1
+DATE_CHUNK_SIZE = 10000  # Reviews whose dates are normalized together
+DATE_CACHE_SIZE = 65536  # Unique date strings remembered between chunks
+MAX_FAILED_DATE_EXAMPLES = 5
+
+MONTH_NAMES = [
+    'january', 'february', 'march', 'april', 'may', 'june',
+    'july', 'august', 'september', 'october', 'november', 'december'
+]
+MONTHS = {name: number for number, name in enumerate(MONTH_NAMES, start=1)}
+MONTHS.update({name[:3]: number for name, number in list(MONTHS.items())})
+MONTHS['sept'] = 9
+
+LONG_DATE_PATTERN = re.compile(r'^\s*([A-Za-z]+)\.?\s+(\d{1,2}),?\s+(\d{4})\s*$')  # January 17, 2025
+ISO_DATE_PATTERN = re.compile(r'^\s*(\d{4})-(\d{2})-(\d{2})\s*$')  # 2025-01-17
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_experience_date(date_string: str) -> Optional[str]:
+    """Parse an experience date into YYYY-MM-DD, returning None if it is not a valid date"""
+    if not isinstance(date_string, str):
+        return None
+    
+    match = LONG_DATE_PATTERN.match(date_string)
+    if match:
+        month = MONTHS.get(match.group(1).lower())
+        day, year = int(match.group(2)), int(match.group(3))
+    else:
+        match = ISO_DATE_PATTERN.match(date_string)
+        if not match:
+            return None
+        year, month, day = (int(part) for part in match.groups())
+    
     try:
-        return datetime.strptime(date_string, '%B %d, %Y').strftime('%Y-%m-%d')
-    except ValueError as e:
-        print(f"Warning: Could not parse experience date: {date_string}")
-        return date_string
+        return date(year, month, day).isoformat()
+    except (TypeError, ValueError):
+        return None
 
-def pre_process_raw_data():
-    """Pre-process raw data files"""
-    # Get absolute path to project root
-    current_dir = os.path.dirname(os.path.abspath(__file__))  # /functions
-    src_dir = os.path.dirname(current_dir)  # /src
-    data_dir = os.path.join(src_dir, 'data')  # /src/data
+def normalize_dates(date_strings: List[str]) -> Tuple[List[str], List[str]]:
+    """Normalize a column of experience dates at once.
     
-    # Setup directories using absolute paths
-    output_dir = os.path.join(data_dir, 'pre-processed-raw-data')
-    raw_data_dir = os.path.join(data_dir, 'raw-trustpilot-data')
+    Each distinct string is parsed only once. Unparseable dates are kept as
+    they are and returned separately so callers can count them.
+    """
+    parsed = {value: parse_experience_date(value) for value in set(date_strings)}
+    failures = [value for value in date_strings if parsed[value] is None]
+    normalized = [parsed[value] or value for value in date_strings]
+    return normalized, failures
+
+def make_review_id(review: Dict) -> str:
+    """Build a stable id for a raw review so it can be deduplicated across exports.
     
-    os.makedirs(output_dir, exist_ok=True)
+    The export's own review id or URL is used when present, otherwise the id
+    is a hash of the review's date, title, text and rating.
+    """
+    source_id = review.get('reviewId') or review.get('reviewUrl')
+    if source_id:
+        key = str(source_id)
+    else:
+        key = json.dumps([
+            review['reviewDateOfExperience'],
+            review['reviewTitle'],
+            review['reviewDescription'],
+            review['reviewRatingScore']
+        ], ensure_ascii=False)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def process_review(review: Dict) -> Dict:
+    """Extract required fields from a raw review"""
+    return {
+        'reviewId': make_review_id(review),
+        'reviewDateOfExperience': review['reviewDateOfExperience'],
+        'reviewTitle': review['reviewTitle'],
+        'reviewDescription': review['reviewDescription'],
+        'reviewRatingScore': review['reviewRatingScore']
+    }
+
+def iter_processed_reviews(input_path: str, date_failures: Optional[Dict] = None) -> Iterator[Dict]:
+    """Stream processed reviews from a raw export without loading it into memory.
     
-    # Get the first JSON file from raw-trustpilot-data directory
-    json_files = [f for f in os.listdir(raw_data_dir) if f.endswith('.json')]
+    Dates are normalized a chunk at a time. Unparseable dates are tallied in
+    date_failures rather than reported one by one.
+    """
+    raw_reviews = iter_json_array(input_path)
     
-    if not json_files:
-        raise FileNotFoundError("No JSON files found in raw-trustpilot-data directory")
+    while True:
+        chunk = [process_review(review) for review in islice(raw_reviews, DATE_CHUNK_SIZE)]
+        if not chunk:
+            return
+        
+        dates, failures = normalize_dates([review['reviewDateOfExperience'] for review in chunk])
+        for review, normalized in zip(chunk, dates):
+            review['reviewDateOfExperience'] = normalized
+        
+        if date_failures is not None and failures:
+            date_failures['count'] = date_failures.get('count', 0) + len(failures)
+            examples = date_failures.setdefault('examples', [])
+            for failure in failures:
+                if len(examples) >= MAX_FAILED_DATE_EXAMPLES:
+                    break
+                if failure not in examples:
+                    examples.append(failure)
+        
+        yield from chunk
+
+def update_date_stats(period_counts: Dict, review: Dict):
+    """Count a review's rating against its experience month"""
+    parsed = review['reviewDateOfExperience']
+    if not isinstance(parsed, str) or not ISO_DATE_PATTERN.match(parsed):
+        return
+    period_counts[parsed[:7]][str(review['reviewRatingScore'])] += 1
+
+def summarize_period_counts(period_counts: Dict) -> Dict:
+    """Build review counts and average ratings per month and per year"""
+    def summarize(counts: Dict) -> Dict:
+        total = sum(counts.values())
+        weighted = sum(float(rating) * count for rating, count in counts.items())
+        return {
+            'reviews': total,
+            'averageRating': round(weighted / total, 2) if total else None,
+            'ratings': dict(sorted(counts.items()))
+        }
     
-    input_path = os.path.join(raw_data_dir, json_files[0])
-    # print(f"Processing file: {json_files[0]}")
+    by_year = defaultdict(lambda: defaultdict(int))
+    for month, counts in period_counts.items():
+        for rating, count in counts.items():
+            by_year[month[:4]][rating] += count
     
-    with open(input_path, 'r') as file:
-        data = json.load(file)
+    months = sorted(period_counts)
+    return {
+        'firstMonth': months[0] if months else None,
+        'lastMonth': months[-1] if months else None,
+        'byMonth': {month: summarize(period_counts[month]) for month in months},
+        'byYear': {year: summarize(by_year[year]) for year in sorted(by_year)}
+    }
+
+def process_raw_file(input_path: str, output_path: str) -> Dict:
+    """Pre-process one raw export into a JSON Lines part file and time it"""
+    start = time.perf_counter()
+    date_failures = {}
+    review_count = write_json_lines(output_path, iter_processed_reviews(input_path, date_failures))
+    return {
+        'file': os.path.basename(input_path),
+        'reviews': review_count,
+        'dateFailures': date_failures.get('count', 0),
+        'dateFailureExamples': date_failures.get('examples', []),
+        'seconds': time.perf_counter() - start
+    }
+
+def merge_processed_files(part_paths: list, output_path: str) -> Dict:
+    """Merge part files into one dataset, keeping the first copy of each review.
     
-    # Add count of reviews
-    review_count = len(data)
-    print(f"Found {review_count} reviews in source file")
+    Per-month rating counts of the merged reviews are collected on the way.
+    """
+    seen_ids = set()
+    period_counts = defaultdict(lambda: defaultdict(int))
     
-    # Extract required fields
-    processed_data = []
-    for review in data:
-        processed_review = {
-            'reviewDateOfExperience': parse_experience_date(review['reviewDateOfExperience']),
-            'reviewTitle': review['reviewTitle'],
-            'reviewDescription': review['reviewDescription'],
-            'reviewRatingScore': review['reviewRatingScore']
-        }
-        processed_data.append(processed_review)
+    def unique_reviews():
+        for part_path in part_paths:
+            for review in iter_json_lines(part_path):
+                if review['reviewId'] in seen_ids:
+                    continue
+                seen_ids.add(review['reviewId'])
+                update_date_stats(period_counts, review)
+                yield review
+    
+    review_count = write_json_lines(output_path, unique_reviews())
+    return {'reviews': review_count, 'periodCounts': period_counts}
 
-    # Randomize order of reviews
-    # random.shuffle(processed_data)
-    # print("Randomized review order")
+def pre_process_raw_data(workspace: Optional[Workspace] = None):
+    """Pre-process raw data files"""
+    workspace = get_workspace(workspace)
+    
+    # Setup directories
+    output_dir = workspace.directory('pre-processed-raw-data')
+    raw_data_dir = workspace.path('raw-trustpilot-data')
+    
+    # Get every JSON export from raw-trustpilot-data directory
+    json_files = sorted(f for f in os.listdir(raw_data_dir) if f.endswith('.json'))
+    
+    if not json_files:
+        raise FileNotFoundError("No JSON files found in raw-trustpilot-data directory")
+    
+    print(f"Processing {len(json_files)} raw files")
     
     # Generate output filename with timestamp
     timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    output_filename = f'processed_reviews_{timestamp}.json'
+    output_filename = f'processed_reviews_{timestamp}.jsonl'
     output_path = os.path.join(output_dir, output_filename)
     
-    # Save processed data
-    with open(output_path, 'w', encoding='utf-8') as file:
-        json.dump(processed_data, file, indent=2, ensure_ascii=False)
+    # Fan files out across worker processes, each writing its own part file
+    parts_dir = tempfile.mkdtemp(prefix='parts_', dir=output_dir)
+    try:
+        input_paths = [os.path.join(raw_data_dir, f) for f in json_files]
+        part_paths = [os.path.join(parts_dir, f'part_{i:04d}.jsonl') for i in range(len(json_files))]
+        
+        start = time.perf_counter()
+        workers = min(MAX_WORKERS, len(json_files))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            file_stats = list(executor.map(process_raw_file, input_paths, part_paths))
+        
+        for stats in file_stats:
+            rate = stats['reviews'] / stats['seconds'] if stats['seconds'] else 0.0
+            print(f"{stats['file']}: {stats['reviews']} reviews in {stats['seconds']:.2f}s ({rate:.0f} reviews/s)")
         
+        # Merge parts in file order, dropping reviews seen in an earlier file
+        merged = merge_processed_files(part_paths, output_path)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+    
+    # Save date distribution for time-bucketed analysis
+    date_failures = sum(stats['dateFailures'] for stats in file_stats)
+    failed_examples = dict.fromkeys(example for stats in file_stats for example in stats['dateFailureExamples'])
+    date_stats = {
+        'parseFailures': date_failures,
+        'failedExamples': list(failed_examples)[:MAX_FAILED_DATE_EXAMPLES],
+        **summarize_period_counts(merged['periodCounts'])
+    }
+    date_stats_path = os.path.join(output_dir, f'date_stats_{timestamp}.json')
+    with open(date_stats_path, 'w', encoding='utf-8') as file:
+        json.dump(date_stats, file, indent=2, ensure_ascii=False)
+    
+    if date_failures:
+        print(f"Warning: Could not parse {date_failures} experience dates, e.g. {date_stats['failedExamples']}")
+    print(f"Reviews span {date_stats['firstMonth']} to {date_stats['lastMonth']}")
+    
+    total_reviews = sum(stats['reviews'] for stats in file_stats)
+    elapsed = time.perf_counter() - start
+    print(f"Found {total_reviews} reviews in {len(json_files)} source files")
+    print(f"Removed {total_reviews - merged['reviews']} duplicate reviews, kept {merged['reviews']}")
+    print(f"Pre-processed {len(json_files)} files in {elapsed:.2f}s using {workers} workers")
+    
     print(f"Successfully pre-processed and saved reviews.")
 
     return output_path
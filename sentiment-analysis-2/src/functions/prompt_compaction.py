@@ -0,0 +1,147 @@
+import math
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+from .instrumentation import get_metrics
+from .step_classifier import split_sentences, tokenize
+
+# Constants
+TOKENIZER_ENCODING = "cl100k_base"  # Encoding of the gpt-4 models, counted locally with tiktoken
+CHARS_PER_TOKEN = 4  # Rough size of a token in English text, used without tiktoken
+MAX_REVIEW_TOKENS = 400  # Longest review text sent to the model
+SAMPLE_REVIEW_TOKENS = 250  # Longest review in the journey analysis prompt
+TOKEN_COUNT_CACHE_SIZE = 16_384  # Texts whose token counts are remembered
+OMISSION_MARKER = "[...]"  # Stands in for sentences left out of a review
+
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    """Get the tiktoken encoding, or None to fall back to estimated counts.
+
+    tiktoken is optional and downloads its vocabulary on first use, so a
+    missing package or an offline machine only makes counts less exact.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        print(f"Estimating prompt tokens, tiktoken is unavailable: {type(e).__name__}")
+        return None
+
+
+@lru_cache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+def count_tokens(text: str) -> int:
+    """Count the tokens of text, with tiktoken when available.
+
+    Every prompt size in the pipeline is measured here, so sample packing,
+    scheduler budgets and compaction agree.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text or '') // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text or '', disallowed_special=()))
+
+
+def cut_to_tokens(text: str, budget: int) -> str:
+    """Cut text to its first budget tokens, ending on a whole word"""
+    encoding = get_encoding()
+    if encoding is None:
+        cut = text[:max(0, budget - 1) * CHARS_PER_TOKEN]
+    else:
+        cut = encoding.decode(encoding.encode(text, disallowed_special=())[:budget])
+    if len(cut) < len(text) and ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.strip()
+
+
+def fit_review(text: str, budget: int = MAX_REVIEW_TOKENS) -> str:
+    """Shorten review text to at most budget tokens, leaving short reviews untouched.
+
+    Long reviews keep their first sentence, for context, and then the
+    sentences whose terms recur most across the review, in their original
+    order with OMISSION_MARKER where sentences were left out. A first
+    sentence longer than the budget is cut instead.
+    """
+    text = text or ''
+    if count_tokens(text) <= budget:
+        return text
+    text = ' '.join(text.split())
+
+    sentences = split_sentences(text)
+    marker_tokens = count_tokens(OMISSION_MARKER) + 1
+    first_tokens = count_tokens(sentences[0]) + marker_tokens
+    if len(sentences) == 1 or first_tokens > budget:
+        return cut_to_tokens(text, budget - marker_tokens) + ' ' + OMISSION_MARKER
+
+    frequencies = Counter(tokenize(text))
+
+    def score(sentence: str) -> float:
+        terms = tokenize(sentence)
+        return sum(frequencies[term] for term in set(terms)) / math.sqrt(len(terms)) if terms else 0.0
+
+    kept = {0}
+    used = first_tokens
+    for index in sorted(range(1, len(sentences)), key=lambda i: score(sentences[i]), reverse=True):
+        tokens = count_tokens(sentences[index]) + marker_tokens
+        if used + tokens <= budget:
+            kept.add(index)
+            used += tokens
+
+    parts = []
+    for index, sentence in enumerate(sentences):
+        if index in kept:
+            parts.append(sentence)
+        elif not parts or parts[-1] != OMISSION_MARKER:
+            parts.append(OMISSION_MARKER)
+    return ' '.join(parts)
+
+
+def fit_reviews(texts: Sequence[str], review_budget: int, total_budget: int) -> List[str]:
+    """Fit each review to review_budget, keeping reviews in order while they fit in total_budget"""
+    fitted = []
+    used = 0
+    for text in texts:
+        text = fit_review(text, review_budget)
+        tokens = count_tokens(text) + 1
+        if used + tokens > total_budget:
+            break
+        fitted.append(text)
+        used += tokens
+    return fitted
+
+
+def number_steps(steps: Sequence[str]) -> str:
+    """List journey steps one per line, numbered from 1 for the model to answer with"""
+    return '\n'.join(f"{number}. {step}" for number, step in enumerate(steps, start=1))
+
+
+def step_for_number(answer, steps: Sequence[str]) -> Optional[str]:
+    """Get the journey step the model answered with, or None if it is not one of steps.
+
+    The answer is a step number, as a number or a string, or the title
+    itself. With no steps to choose from, any title is taken as is.
+    """
+    if isinstance(answer, str):
+        answer = answer.strip().rstrip('.')
+        if answer.isdigit():
+            answer = int(answer)
+        elif answer and (not steps or answer in steps):
+            return answer
+    if isinstance(answer, int) and not isinstance(answer, bool) and 1 <= answer <= len(steps):
+        return steps[answer - 1]
+    return None
+
+
+def compaction_stats(original: Sequence[str], sent: Sequence[str], truncated_reviews: int = 0) -> Dict:
+    """Measure the tokens of prompt parts as sent against their uncompacted originals"""
+    return {
+        'originalTokens': sum(count_tokens(text) for text in original),
+        'sentTokens': sum(count_tokens(text) for text in sent),
+        'truncatedReviews': truncated_reviews
+    }
+
+
+def record_compaction(stats: Dict):
+    """Record the compaction of a prompt once it has been sent"""
+    get_metrics().record_compaction(stats['originalTokens'], stats['sentTokens'], stats['truncatedReviews'])
@@ -0,0 +1,142 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .aggregate_ratings import RATING_SCORES, rating_matrix
+from .count_ratings_by_step import ratings_to_dict
+from .generate_graph import get_asset_dir, load_graph_data, write_payload
+from .review_store import MISSING_STEP
+from .workspace import Workspace, get_workspace
+
+# Constants
+STREAM_QUEUE_SIZE = 64  # Groups of summaries waiting to be counted before producers block
+REFRESH_INTERVAL = 30.0  # Seconds between refreshes of the partial ratings and chart
+PARTIAL_RATINGS_FILENAME = 'ratings_by_step_partial.json'
+LIVE_PAGE_FILENAME = 'journey_visualization_live.html'
+
+_CLOSE = object()  # Queued by close() to stop the counter
+
+
+def write_atomically(path: str, data: Dict):
+    """Write JSON through a temporary file so readers never see a partial file"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+class RatingsStream:
+    """Count summarized reviews on a background thread while summarization runs.
+
+    Producers put groups of summarized reviews into a bounded queue and block
+    while the counter is STREAM_QUEUE_SIZE groups behind. Every
+    refresh_interval seconds, and on close, the counts so far are written to
+    ratings-by-step/partial in the ratings-by-step format, and the payload
+    chart in visualizations is redrawn from them. Partial files are kept apart
+    from the final output of count_ratings_by_step.
+    """
+
+    def __init__(self, journey_steps: List[str], workspace: Optional[Workspace] = None,
+                 refresh_interval: float = REFRESH_INTERVAL, queue_size: int = STREAM_QUEUE_SIZE,
+                 chart: bool = True):
+        self.journey_steps = list(journey_steps)
+        self.step_codes = {step: code for code, step in enumerate(self.journey_steps)}
+        self.workspace = get_workspace(workspace)
+        self.refresh_interval = refresh_interval
+        self.chart = chart
+
+        self.counts = np.zeros((len(self.journey_steps), len(RATING_SCORES)), dtype=np.int64)
+        self.reviews = 0
+        self.refreshes = 0
+        self.error: Optional[BaseException] = None
+        self.dropped = 0
+        self.ratings_path = os.path.join(self.workspace.directory(os.path.join('ratings-by-step', 'partial')),
+                                         PARTIAL_RATINGS_FILENAME)
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self._consume, name='ratings-stream', daemon=True)
+        self.thread.start()
+
+    def put(self, reviews: Iterable[Dict]):
+        """Queue summarized reviews for counting, blocking while the queue is full.
+
+        Once the counter has failed, reviews are dropped so the preview never
+        stops summarization. close() reports the failure.
+        """
+        reviews = list(reviews)
+        if not reviews:
+            return
+        if self.error is not None:
+            if not self.dropped:
+                print(f"Ratings stream stopped, no longer counting summarized reviews: {str(self.error)}")
+            self.dropped += len(reviews)
+            return
+        self.queue.put(reviews)
+
+    def close(self) -> str:
+        """Count everything queued, write the final partial results and return their path"""
+        self.queue.put(_CLOSE)
+        self.thread.join()
+        if self.error is not None:
+            raise RuntimeError("Ratings stream stopped") from self.error
+        return self.ratings_path
+
+    def add(self, reviews: List[Dict]):
+        """Count a group of summarized reviews"""
+        codes = [self.step_codes.get(review.get('journeyStep'), MISSING_STEP) for review in reviews]
+        ratings = []
+        for review in reviews:
+            try:
+                ratings.append(int(review.get('reviewRatingScore')))
+            except (TypeError, ValueError):
+                ratings.append(0)
+        self.counts += rating_matrix(np.array(codes), np.array(ratings), len(self.journey_steps))
+        self.reviews += len(reviews)
+
+    def refresh(self):
+        """Write the counts so far and redraw the chart from them"""
+        write_atomically(self.ratings_path, {
+            'journeySteps': ratings_to_dict(self.journey_steps, self.counts),
+            'partial': True,
+            'reviews': self.reviews,
+            'updatedAt': datetime.now().isoformat(timespec='seconds')
+        })
+        if self.chart:
+            try:
+                page_path = os.path.join(self.workspace.directory('visualizations'), LIVE_PAGE_FILENAME)
+                write_payload(load_graph_data(self.ratings_path), page_path, get_asset_dir(self.workspace))
+            except ImportError as e:
+                print(f"Not drawing partial chart: {str(e)}")
+                self.chart = False
+        self.refreshes += 1
+
+    def _consume(self):
+        next_refresh = time.monotonic() + self.refresh_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0.0, next_refresh - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            try:
+                if item is _CLOSE:
+                    if self.error is None:
+                        self.refresh()
+                    return
+                if item is not None and self.error is None:
+                    self.add(item)
+                if time.monotonic() >= next_refresh:
+                    if self.error is None:
+                        self.refresh()
+                        print(f"Refreshed partial ratings from {self.reviews} summarized reviews")
+                    next_refresh = time.monotonic() + self.refresh_interval
+            except Exception as e:
+                # Keep draining so producers never block on a dead counter
+                print(f"Error counting streamed reviews: {str(e)}")
+                self.error = e
@@ -0,0 +1,301 @@
+import asyncio
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from .instrumentation import get_metrics
+
+# Constants
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 200_000
+EXPECTED_COMPLETION_TOKENS = 300  # Budgeted per request until usage is known
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators around each chat message
+MAX_RETRIES = 6
+BASE_BACKOFF = 1.0  # Seconds, doubled on each retry
+MAX_BACKOFF = 60.0
+INITIAL_CONCURRENCY = 8
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 64
+SLOT_POLL_INTERVAL = 0.05  # Seconds between checks for a free concurrency slot
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse rate limit reset durations such as '1s', '6m0s' or '250ms' into seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def estimate_tokens(messages: List[Dict]) -> int:
+    """Estimate the tokens a request uses, counting its prompt like prompt compaction does"""
+    from .prompt_compaction import count_tokens
+    prompt_tokens = sum(count_tokens(message.get('content') or '') + MESSAGE_OVERHEAD_TOKENS for message in messages)
+    return prompt_tokens + EXPECTED_COMPLETION_TOKENS
+
+
+def is_retryable(error: Exception) -> bool:
+    """Check whether a failed request is worth retrying"""
+    import openai
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Get the server's requested wait from an error response, if any"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    if headers.get('retry-after-ms'):
+        return parse_duration(headers['retry-after-ms']) / 1000
+    return parse_duration(headers.get('retry-after'))
+
+
+class TokenBucket:
+    """Budget that refills continuously up to its capacity"""
+
+    def __init__(self, capacity: float, refill_per_second: float, clock=time.monotonic):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.clock = clock
+        self.available = capacity
+        self.updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount is available, 0 if it is available now"""
+        self.refill()
+        # Never wait for more than a full bucket
+        shortfall = min(amount, self.capacity) - self.available
+        return max(0.0, shortfall / self.refill_per_second)
+
+    def consume(self, amount: float):
+        self.refill()
+        self.available -= amount
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], reset_seconds: Optional[float]):
+        """Adopt the limit and remaining budget reported by the server"""
+        self.refill()
+        if limit:
+            self.capacity = limit
+            self.refill_per_second = limit / 60
+        if remaining is not None:
+            self.available = min(self.available, remaining)
+        if reset_seconds and remaining is not None and limit:
+            # Refill at least fast enough to be full again at the reset time
+            self.refill_per_second = max(self.refill_per_second, (limit - remaining) / max(reset_seconds, 0.001))
+
+
+class RequestScheduler:
+    """Shared rate-limit-aware scheduler for OpenAI calls.
+
+    Requests wait for request and token budgets, kept in token buckets that
+    are corrected from x-ratelimit-* response headers. Retryable failures
+    back off exponentially with full jitter, or for as long as the server
+    asks. Concurrency grows additively on success and halves on a 429, so
+    throughput settles just under the limit.
+    """
+
+    def __init__(self, requests_per_minute: float = REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = TOKENS_PER_MINUTE,
+                 max_retries: int = MAX_RETRIES, base_backoff: float = BASE_BACKOFF,
+                 max_backoff: float = MAX_BACKOFF, concurrency: float = INITIAL_CONCURRENCY,
+                 clock=time.monotonic):
+        self.request_bucket = TokenBucket(requests_per_minute, requests_per_minute / 60, clock)
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60, clock)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'rateLimited': 0, 'failures': 0}
+
+    def try_acquire(self, tokens: int) -> float:
+        """Reserve a slot and budget, returning 0, or the seconds to wait first"""
+        with self.lock:
+            if self.in_flight >= max(MIN_CONCURRENCY, int(self.concurrency)):
+                return SLOT_POLL_INTERVAL
+            wait = max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(tokens))
+            if wait > 0:
+                return wait
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(tokens)
+            self.in_flight += 1
+            self.stats['requests'] += 1
+            return 0.0
+
+    def raise_concurrency(self, concurrency: float):
+        """Allow at least concurrency requests at once, unless rate limits have already lowered it.
+
+        For callers that fan out wider than INITIAL_CONCURRENCY from the
+        start. A 429 still halves concurrency as usual.
+        """
+        with self.lock:
+            if not self.stats['rateLimited']:
+                self.concurrency = max(self.concurrency, min(MAX_CONCURRENCY, concurrency))
+
+    def release(self, estimated_tokens: int, response=None, error: Optional[Exception] = None):
+        """Free a slot and adapt budgets and concurrency to the outcome"""
+        import openai
+        with self.lock:
+            self.in_flight -= 1
+
+            if isinstance(error, openai.RateLimitError):
+                self.stats['rateLimited'] += 1
+                self.concurrency = max(MIN_CONCURRENCY, self.concurrency / 2)
+            elif error is None:
+                self.concurrency = min(MAX_CONCURRENCY, self.concurrency + 1 / self.concurrency)
+
+            usage = getattr(response, 'usage', None)
+            if usage is not None and getattr(usage, 'total_tokens', None) is not None:
+                # Correct the estimate with what the request actually used
+                self.token_bucket.consume(usage.total_tokens - estimated_tokens)
+
+    def sync_headers(self, headers):
+        """Update budgets from x-ratelimit-* response headers"""
+        def number(name):
+            try:
+                return float(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        with self.lock:
+            self.request_bucket.sync(
+                number('x-ratelimit-limit-requests'),
+                number('x-ratelimit-remaining-requests'),
+                parse_duration(headers.get('x-ratelimit-reset-requests'))
+            )
+            self.token_bucket.sync(
+                number('x-ratelimit-limit-tokens'),
+                number('x-ratelimit-remaining-tokens'),
+                parse_duration(headers.get('x-ratelimit-reset-tokens'))
+            )
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Seconds to wait before retrying after a failed attempt"""
+        requested = retry_after(error)
+        if requested is not None:
+            return min(self.max_backoff, requested)
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    def handle_failure(self, attempt: int, error: Exception) -> float:
+        """Decide whether to retry, returning the backoff or re-raising"""
+        if not is_retryable(error) or attempt >= self.max_retries:
+            with self.lock:
+                self.stats['failures'] += 1
+            raise error
+        with self.lock:
+            self.stats['retries'] += 1
+        return self.backoff(attempt, error)
+
+    def call_with_retries(self, function: Callable, *args, **kwargs):
+        """Call an API method outside the completion budgets, such as a batch poll, retrying transient failures"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                time.sleep(self.handle_failure(attempt, e))
+
+    def request_kwargs(self, kwargs: Dict) -> Dict:
+        """Add an idempotency key shared by every attempt of one logical request"""
+        headers = dict(kwargs.pop('extra_headers', None) or {})
+        headers.setdefault('Idempotency-Key', uuid.uuid4().hex)
+        return {**kwargs, 'extra_headers': headers}
+
+    def parse_response(self, raw):
+        """Sync budgets from a raw response and return the parsed completion"""
+        headers = getattr(raw, 'headers', None)
+        if headers is None:
+            return raw
+        self.sync_headers(headers)
+        return raw.parse()
+
+    def create_chat_completion(self, client, batch: bool = False, **kwargs):
+        """Create a chat completion with budgeting, backoff and retries.
+
+        With batch, usage is priced as Batch API usage.
+        """
+        kwargs = self.request_kwargs(kwargs)
+        estimated = estimate_tokens(kwargs.get('messages', []))
+        completions = client.chat.completions
+        create = getattr(completions, 'with_raw_response', completions).create
+
+        for attempt in range(self.max_retries + 1):
+            while (wait := self.try_acquire(estimated)) > 0:
+                time.sleep(wait)
+            started = time.perf_counter()
+            try:
+                response = self.parse_response(create(**kwargs))
+            except Exception as e:
+                get_metrics().record_call(kwargs.get('model'), error=True)
+                self.release(estimated, error=e)
+                time.sleep(self.handle_failure(attempt, e))
+                continue
+            get_metrics().record_response(kwargs.get('model'), time.perf_counter() - started, response, batch)
+            self.release(estimated, response=response)
+            return response
+
+    async def acreate_chat_completion(self, client, timeout: Optional[float] = None, **kwargs):
+        """Async variant of create_chat_completion for AsyncOpenAI clients.
+
+        timeout limits each HTTP attempt, not the waits for budget or backoff
+        around it. An attempt that runs over fails with asyncio.TimeoutError.
+        """
+        kwargs = self.request_kwargs(kwargs)
+        estimated = estimate_tokens(kwargs.get('messages', []))
+        completions = client.chat.completions
+        create = getattr(completions, 'with_raw_response', completions).create
+
+        for attempt in range(self.max_retries + 1):
+            while (wait := self.try_acquire(estimated)) > 0:
+                await asyncio.sleep(wait)
+            started = time.perf_counter()
+            try:
+                response = self.parse_response(await asyncio.wait_for(create(**kwargs), timeout))
+            except asyncio.CancelledError:
+                get_metrics().record_call(kwargs.get('model'), error=True)
+                self.release(estimated, error=asyncio.CancelledError())
+                raise
+            except Exception as e:
+                get_metrics().record_call(kwargs.get('model'), error=True)
+                self.release(estimated, error=e)
+                await asyncio.sleep(self.handle_failure(attempt, e))
+                continue
+            get_metrics().record_response(kwargs.get('model'), time.perf_counter() - started, response)
+            self.release(estimated, response=response)
+            return response
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """Get the scheduler shared by every OpenAI call in the process"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
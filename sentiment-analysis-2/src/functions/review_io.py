@@ -0,0 +1,158 @@
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator
+
+# Constants
+READ_CHUNK_SIZE = 64 * 1024  # Characters read per step when streaming JSON arrays
+FSYNC_INTERVAL = 5.0  # Seconds between fsyncs of an append-only writer
+
+
+def iter_json_array(path: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator:
+    """Yield the elements of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+        started = False
+
+        def fill() -> bool:
+            """Drop consumed text and read the next chunk, returning False at end of file"""
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            eof = not chunk
+            return bool(chunk)
+
+        while True:
+            # Skip whitespace between tokens
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos == len(buffer):
+                if not fill():
+                    raise ValueError(f"Unexpected end of JSON array in {path}")
+                continue
+
+            char = buffer[pos]
+            if not started:
+                if char != '[':
+                    raise ValueError(f"Expected a JSON array in {path}")
+                started = True
+                pos += 1
+            elif char == ']':
+                return
+            elif char == ',':
+                pos += 1
+            else:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Element is split across chunks
+                    if not fill():
+                        raise
+                    continue
+                ended = end < len(buffer) and (buffer[end] in ',]' or buffer[end].isspace())
+                if not ended and not eof:
+                    # A scalar could continue in the next chunk
+                    fill()
+                    continue
+                pos = end
+                yield item
+
+
+def iter_json_lines(path: str) -> Iterator:
+    """Yield one record per non-empty line of a JSON Lines file.
+    
+    A last line without a newline is still being written, so it is skipped.
+    This makes it safe to read a file another process is appending to.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                return
+            if line.strip():
+                yield json.loads(line)
+
+
+def repair_json_lines(path: str) -> int:
+    """Truncate a torn last line left by an interrupted writer, returning bytes removed"""
+    if not os.path.exists(path):
+        return 0
+
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            step = min(READ_CHUNK_SIZE, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b'\n')
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        f.truncate(position)
+
+    return size - position
+
+
+class JsonLinesWriter:
+    """Append-only JSON Lines writer that flushes every write and fsyncs periodically.
+    
+    Each write costs O(records written), however large the file already is,
+    and readers only ever see whole lines plus at most one torn last line.
+    """
+
+    def __init__(self, path: str, fsync_interval: float = FSYNC_INTERVAL):
+        repair_json_lines(path)
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.file = open(path, 'a', encoding='utf-8')
+        self.last_fsync = time.monotonic()
+
+    def write_many(self, records: Iterable[Dict]) -> int:
+        """Append records, returning the number written"""
+        lines = [json.dumps(record, ensure_ascii=False) + '\n' for record in records]
+        self.file.write(''.join(lines))
+        self.file.flush()
+
+        if time.monotonic() - self.last_fsync >= self.fsync_interval:
+            self.sync()
+        return len(lines)
+
+    def sync(self):
+        """Force written records to disk"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_fsync = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+    def __enter__(self) -> 'JsonLinesWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+def iter_reviews(path: str) -> Iterator[Dict]:
+    """Stream reviews from a JSON Lines file or a JSON array file"""
+    if path.endswith('.jsonl'):
+        return iter_json_lines(path)
+    return iter_json_array(path)
+
+
+def write_json_lines(path: str, records: Iterable[Dict]) -> int:
+    """Write records as JSON Lines, returning the number written"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write('\n')
+            count += 1
+    return count
@@ -0,0 +1,98 @@
+import random
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .prompt_compaction import count_tokens
+
+# Constants
+SAMPLE_SEED = 42
+MAX_REVIEWS_PER_STRATUM = 200  # Reviews kept per rating and period while streaming
+REVIEW_OVERHEAD_TOKENS = 10  # JSON keys and punctuation around each review in a prompt
+UNKNOWN_PERIOD = 'unknown'
+
+
+def estimate_review_tokens(review: Dict) -> int:
+    return count_tokens(review.get('reviewDescription') or '') + REVIEW_OVERHEAD_TOKENS
+
+
+def review_period(review: Dict) -> str:
+    """Get the quarter of a review's experience date, such as 2025-Q1"""
+    date = review.get('reviewDateOfExperience')
+    if not isinstance(date, str) or len(date) < 7 or not date[:4].isdigit() or not date[5:7].isdigit():
+        return UNKNOWN_PERIOD
+    return f"{date[:4]}-Q{(int(date[5:7]) - 1) // 3 + 1}"
+
+
+def stratum_key(review: Dict) -> Tuple[str, str]:
+    return str(review.get('reviewRatingScore')), review_period(review)
+
+
+class StratifiedSampler:
+    """Seeded single-pass sampler stratified by rating score and quarter.
+
+    Each stratum keeps its own reservoir, so memory is bounded by the number
+    of strata however large the input is. Samples are drawn evenly across
+    ratings, so a dominant rating cannot crowd out the others, and in
+    proportion to review counts across periods within each rating.
+    """
+
+    def __init__(self, per_stratum: int = MAX_REVIEWS_PER_STRATUM, seed: int = SAMPLE_SEED):
+        self.per_stratum = per_stratum
+        self.rng = random.Random(seed)
+        self.reservoirs: Dict[Tuple[str, str], List[Dict]] = {}
+        self.counts = Counter()
+
+    def add(self, review: Dict):
+        key = stratum_key(review)
+        seen = self.counts[key]
+        self.counts[key] += 1
+        reservoir = self.reservoirs.setdefault(key, [])
+        if seen < self.per_stratum:
+            reservoir.append(review)
+        else:
+            index = self.rng.randint(0, seen)
+            if index < self.per_stratum:
+                reservoir[index] = review
+
+    def add_all(self, reviews: Iterable[Dict]) -> 'StratifiedSampler':
+        for review in reviews:
+            self.add(review)
+        return self
+
+    def draw_order(self) -> List[Dict]:
+        """Order every kept review so that any prefix is a balanced sample"""
+        queues = {}
+        for key in sorted(self.reservoirs):
+            reviews = list(self.reservoirs[key])
+            self.rng.shuffle(reviews)
+            queues.setdefault(key[0], {})[key[1]] = reviews
+
+        taken = Counter()
+        order = []
+        while queues:
+            for rating in list(queues):
+                periods = queues[rating]
+                # Take from the period furthest below its share of this rating
+                period = min(periods, key=lambda p: taken[rating, p] / self.counts[rating, p])
+                order.append(periods[period][taken[rating, period]])
+                taken[rating, period] += 1
+                if taken[rating, period] == len(periods[period]):
+                    del periods[period]
+                if not periods:
+                    del queues[rating]
+        return order
+
+    def sample(self, token_budget: int, max_reviews: Optional[int] = None) -> List[Dict]:
+        """Draw a balanced sample that fits in token_budget prompt tokens"""
+        sample = []
+        used = 0
+        for review in self.draw_order():
+            if max_reviews is not None and len(sample) >= max_reviews:
+                break
+            tokens = estimate_review_tokens(review)
+            if used + tokens > token_budget:
+                # Skip reviews that do not fit, a shorter one may still fit
+                continue
+            sample.append(review)
+            used += tokens
+        return sample
@@ -0,0 +1,170 @@
+import json
+import os
+from array import array
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .review_io import iter_reviews
+from .workspace import Workspace, get_workspace
+
+# Constants
+STORE_VERSION = 1
+TEXT_FIELDS = ('reviewId', 'reviewTitle', 'reviewSummary', 'reviewDescription', 'summarySource')
+MISSING_DATE = np.iinfo(np.int32).min
+MISSING_RATING = 0
+MISSING_STEP = -1
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def date_to_day(date_string: str) -> int:
+    """Convert a YYYY-MM-DD date into days since 1970-01-01"""
+    try:
+        return date.fromisoformat(date_string).toordinal() - EPOCH_ORDINAL
+    except (TypeError, ValueError):
+        return MISSING_DATE
+
+
+def day_to_date(day: int) -> Optional[str]:
+    """Convert days since 1970-01-01 back into a YYYY-MM-DD date"""
+    if day == MISSING_DATE:
+        return None
+    return date.fromordinal(int(day) + EPOCH_ORDINAL).isoformat()
+
+
+def write_review_store(reviews: Iterable[Dict], journey_steps: List[str], store_dir: str) -> int:
+    """Write reviews to a columnar store directory, returning the number written.
+
+    Ratings are stored as uint8, dates as int32 day numbers and journey steps
+    as int16 codes into an interned step table that starts with journey_steps.
+    Text fields share one UTF-8 buffer addressed by int64 offsets.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+
+    step_table = list(journey_steps)
+    step_codes = {step: code for code, step in enumerate(step_table)}
+
+    ratings = array('B')
+    days = array('i')
+    steps = array('h')
+    offsets = array('q', [0])
+    position = 0
+
+    with open(os.path.join(store_dir, 'text.bin'), 'wb') as text_file:
+        for review in reviews:
+            ratings.append(int(review.get('reviewRatingScore') or MISSING_RATING))
+            days.append(date_to_day(review.get('reviewDateOfExperience')))
+
+            step = review.get('journeyStep')
+            if step is None:
+                steps.append(MISSING_STEP)
+            else:
+                if step not in step_codes:
+                    step_codes[step] = len(step_table)
+                    step_table.append(step)
+                steps.append(step_codes[step])
+
+            for field in TEXT_FIELDS:
+                encoded = (review.get(field) or '').encode('utf-8')
+                text_file.write(encoded)
+                position += len(encoded)
+                offsets.append(position)
+
+    np.save(os.path.join(store_dir, 'ratings.npy'), np.frombuffer(ratings, dtype=np.uint8))
+    np.save(os.path.join(store_dir, 'dates.npy'), np.frombuffer(days, dtype=np.int32))
+    np.save(os.path.join(store_dir, 'steps.npy'), np.frombuffer(steps, dtype=np.int16))
+    np.save(os.path.join(store_dir, 'text_offsets.npy'), np.frombuffer(offsets, dtype=np.int64))
+
+    with open(os.path.join(store_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': STORE_VERSION,
+            'count': len(ratings),
+            'journeyStepCount': len(journey_steps),
+            'steps': step_table,
+            'textFields': list(TEXT_FIELDS)
+        }, f, indent=2, ensure_ascii=False)
+
+    return len(ratings)
+
+
+class ReviewStore:
+    """Memory-mapped read access to a columnar review store"""
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['version'] != STORE_VERSION:
+            raise ValueError(f"Unsupported review store version: {meta['version']}")
+
+        self.step_names = meta['steps']
+        self.journey_step_count = meta['journeyStepCount']
+        self.text_fields = meta['textFields']
+        self.count = meta['count']
+
+        self.ratings = np.load(os.path.join(store_dir, 'ratings.npy'), mmap_mode='r')
+        self.dates = np.load(os.path.join(store_dir, 'dates.npy'), mmap_mode='r')
+        self.steps = np.load(os.path.join(store_dir, 'steps.npy'), mmap_mode='r')
+        self.text_offsets = np.load(os.path.join(store_dir, 'text_offsets.npy'), mmap_mode='r')
+
+        text_path = os.path.join(store_dir, 'text.bin')
+        if os.path.getsize(text_path):
+            self.text = np.memmap(text_path, dtype=np.uint8, mode='r')
+        else:
+            self.text = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def journey_steps(self) -> List[str]:
+        """Journey steps the store was built with, in order"""
+        return self.step_names[:self.journey_step_count]
+
+    def get_text(self, index: int, field: str) -> str:
+        """Get one text field of one review"""
+        slot = index * len(self.text_fields) + self.text_fields.index(field)
+        start, end = self.text_offsets[slot], self.text_offsets[slot + 1]
+        return self.text[start:end].tobytes().decode('utf-8')
+
+    def get_review(self, index: int) -> Dict:
+        """Rebuild one review as a dict"""
+        review = {field: self.get_text(index, field) for field in self.text_fields}
+        review['reviewRatingScore'] = int(self.ratings[index])
+        review['reviewDateOfExperience'] = day_to_date(self.dates[index])
+        code = int(self.steps[index])
+        review['journeyStep'] = self.step_names[code] if code != MISSING_STEP else None
+        return review
+
+
+def get_latest_review_store(workspace: Optional[Workspace] = None) -> str:
+    """Get latest review store directory"""
+    return get_workspace(workspace).require_latest('review-store', 'review_store_*', description='review store')
+
+
+def build_review_store(workspace: Optional[Workspace] = None, summary_file: Optional[str] = None,
+                       journey_steps_file: Optional[str] = None) -> str:
+    """Build a columnar review store from the given or latest summarized reviews"""
+    try:
+        workspace = get_workspace(workspace)
+
+        journey_file = journey_steps_file or workspace.require_latest('journey-steps', 'customer_journey_steps_*.json',
+                                                                      description='journey steps file')
+        with open(journey_file, 'r') as f:
+            journey_steps = json.load(f).get("journeySteps", [])
+
+        latest_file = summary_file or workspace.require_latest('summarized-reviews', 'summarized_reviews_*.jsonl',
+                                                               'summarized_reviews_*.json',
+                                                               description='summarized review files')
+
+        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        store_dir = workspace.path('review-store', f'review_store_{timestamp}')
+        review_count = write_review_store(iter_reviews(latest_file), journey_steps, store_dir)
+
+        print(f"Stored {review_count} reviews in columnar store")
+        return store_dir
+
+    except Exception as e:
+        print(f"Error building review store: {str(e)}")
+        raise
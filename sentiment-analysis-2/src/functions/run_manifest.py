@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from .workspace import Workspace, get_workspace
+
+# Constants
+MANIFEST_FILENAME = 'manifest.json'
+REVIEW_LOG_FILENAME = 'reviews.log'
+
+
+def get_manifest_dir(workspace: Optional[Workspace] = None) -> str:
+    """Get directory holding the run manifest"""
+    return get_workspace(workspace).path('run-manifest')
+
+
+class RunManifest:
+    """Record of completed stages and reviews so an interrupted run can resume.
+
+    Stage progress lives in manifest.json. Per-review outcomes are appended to
+    reviews.log so recording a batch never rewrites the whole history. Stage
+    updates are locked, as stages running in parallel share one manifest.
+    """
+
+    def __init__(self, manifest_dir: str, data: Dict):
+        self.manifest_dir = manifest_dir
+        self.data = data
+        self.lock = threading.RLock()
+        self.completed_reviews = set()
+        self.failed_reviews = {}
+
+    @property
+    def run_id(self) -> str:
+        return self.data['runId']
+
+    @classmethod
+    def start(cls, manifest_dir: Optional[str] = None) -> 'RunManifest':
+        """Start a new run, replacing any previous manifest"""
+        manifest_dir = manifest_dir or get_manifest_dir()
+        os.makedirs(manifest_dir, exist_ok=True)
+
+        manifest = cls(manifest_dir, {
+            'runId': uuid.uuid4().hex[:12],
+            'startedAt': datetime.now().isoformat(timespec='seconds'),
+            'stages': {}
+        })
+        open(os.path.join(manifest_dir, REVIEW_LOG_FILENAME), 'w').close()
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def load(cls, manifest_dir: Optional[str] = None) -> Optional['RunManifest']:
+        """Load the previous run's manifest, or None if there is none"""
+        manifest_dir = manifest_dir or get_manifest_dir()
+        manifest_path = os.path.join(manifest_dir, MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            return None
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = cls(manifest_dir, json.load(f))
+
+        # Replay review outcomes in order, ignoring a torn last line
+        log_path = os.path.join(manifest_dir, REVIEW_LOG_FILENAME)
+        if os.path.exists(log_path):
+            with open(log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    manifest._apply_review_entry(entry)
+
+        return manifest
+
+    def save(self):
+        """Atomically write stage progress"""
+        manifest_path = os.path.join(self.manifest_dir, MANIFEST_FILENAME)
+        temp_path = manifest_path + '.tmp'
+        with self.lock:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            os.replace(temp_path, manifest_path)
+
+    def is_stage_complete(self, stage: str) -> bool:
+        return self.data['stages'].get(stage, {}).get('status') == 'complete'
+
+    def stage_output(self, stage: str) -> Optional[str]:
+        """Get output recorded for a stage, complete or not"""
+        return self.data['stages'].get(stage, {}).get('output')
+
+    def start_stage(self, stage: str, output: Optional[str] = None):
+        """Mark a stage as running, recording where it writes its output"""
+        with self.lock:
+            self.data['stages'][stage] = {
+                'status': 'running',
+                'output': output,
+                'startedAt': datetime.now().isoformat(timespec='seconds')
+            }
+            self.save()
+
+    def complete_stage(self, stage: str, output: Optional[str] = None):
+        """Mark a stage as complete"""
+        with self.lock:
+            entry = self.data['stages'].setdefault(stage, {})
+            entry['status'] = 'complete'
+            entry['output'] = output if output is not None else entry.get('output')
+            entry['completedAt'] = datetime.now().isoformat(timespec='seconds')
+            self.save()
+
+    def record_reviews(self, completed_ids: Iterable[str] = (), failed_ids: Iterable[str] = ()):
+        """Append review outcomes to the review log"""
+        entries = [{'id': review_id, 'status': 'done'} for review_id in completed_ids]
+        entries += [{'id': review_id, 'status': 'failed'} for review_id in failed_ids]
+        if not entries:
+            return
+
+        with open(os.path.join(self.manifest_dir, REVIEW_LOG_FILENAME), 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+                self._apply_review_entry(entry)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _apply_review_entry(self, entry: Dict):
+        if entry['status'] == 'done':
+            self.completed_reviews.add(entry['id'])
+            self.failed_reviews.pop(entry['id'], None)
+        else:
+            self.failed_reviews[entry['id']] = self.failed_reviews.get(entry['id'], 0) + 1
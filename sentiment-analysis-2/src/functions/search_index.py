@@ -0,0 +1,237 @@
+import json
+import os
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .aggregate_ratings import BUCKET_UNITS, RATING_SCORES
+from .review_store import MISSING_DATE, ReviewStore, get_latest_review_store
+from .step_classifier import tokenize
+from .workspace import Workspace, get_workspace
+
+# Constants
+INDEX_VERSION = 1
+INDEXED_FIELDS = ('reviewTitle', 'reviewSummary', 'reviewDescription')
+PERIOD_BUCKET = 'month'  # Date facet granularity
+DEFAULT_LIMIT = 20  # Reviews returned per query
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def popcount(bitmap: np.ndarray) -> int:
+    """Count the set bits of a packed bitmap"""
+    return int(POPCOUNT[bitmap].sum(dtype=np.int64))
+
+
+def facet_bitmaps(codes: np.ndarray, value_count: int) -> np.ndarray:
+    """Pack one bitmap per facet value, set for the reviews with that value.
+
+    codes holds each review's value code, or a negative code for none.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    bitmaps = np.zeros((value_count, (len(codes) + 7) // 8), dtype=np.uint8)
+    for code in range(value_count):
+        bitmaps[code] = np.packbits(codes == code)
+    return bitmaps
+
+
+def period_codes(days: np.ndarray, bucket: str = PERIOD_BUCKET) -> Tuple[List[str], np.ndarray]:
+    """Get the labels of periods holding reviews and each review's period code, -1 if undated"""
+    if bucket not in BUCKET_UNITS:
+        raise ValueError(f"Unknown time bucket: {bucket}")
+
+    days = np.asarray(days, dtype=np.int64)
+    dated = days != MISSING_DATE
+    unit = f'datetime64[{BUCKET_UNITS[bucket]}]'
+    periods = days[dated].astype('datetime64[D]').astype(unit).astype(np.int64)
+    labels, codes = np.unique(periods, return_inverse=True)
+
+    all_codes = np.full(len(days), -1, dtype=np.int64)
+    all_codes[dated] = codes
+    return [str(label) for label in labels.astype(unit)], all_codes
+
+
+def build_postings(documents: Iterable[Iterable[str]]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Build an inverted index from the terms of each document.
+
+    Returns the terms, the ascending document numbers containing each term
+    concatenated, and the offset of each term's postings in them.
+    """
+    term_ids: Dict[str, int] = {}
+    pair_terms = array('i')
+    pair_docs = array('i')
+    for doc, terms in enumerate(documents):
+        for term in set(terms):
+            term_id = term_ids.setdefault(term, len(term_ids))
+            pair_terms.append(term_id)
+            pair_docs.append(doc)
+
+    terms = np.frombuffer(pair_terms, dtype=np.int32) if pair_terms else np.zeros(0, dtype=np.int32)
+    docs = np.frombuffer(pair_docs, dtype=np.int32) if pair_docs else np.zeros(0, dtype=np.int32)
+    order = np.lexsort((docs, terms))
+    offsets = np.zeros(len(term_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=len(term_ids)), out=offsets[1:])
+    return list(term_ids), docs[order], offsets
+
+
+def write_search_index(store: ReviewStore, index_dir: str, bucket: str = PERIOD_BUCKET) -> int:
+    """Write an inverted index and facet bitmaps over a review store, returning the number of terms"""
+    os.makedirs(index_dir, exist_ok=True)
+
+    documents = (
+        tokenize(' '.join(store.get_text(index, field) for field in INDEXED_FIELDS))
+        for index in range(len(store))
+    )
+    terms, postings, offsets = build_postings(documents)
+    np.save(os.path.join(index_dir, 'postings.npy'), postings)
+    np.save(os.path.join(index_dir, 'postings_offsets.npy'), offsets)
+
+    steps = np.asarray(store.steps, dtype=np.int64)
+    periods, period_review_codes = period_codes(store.dates, bucket)
+    np.save(os.path.join(index_dir, 'facet_journeyStep.npy'), facet_bitmaps(steps, len(store.step_names)))
+    np.save(os.path.join(index_dir, 'facet_reviewRatingScore.npy'),
+            facet_bitmaps(np.asarray(store.ratings, dtype=np.int64) - 1, len(RATING_SCORES)))
+    np.save(os.path.join(index_dir, 'facet_period.npy'), facet_bitmaps(period_review_codes, len(periods)))
+
+    with open(os.path.join(index_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': INDEX_VERSION,
+            'count': len(store),
+            'storeDir': os.path.abspath(store.store_dir),
+            'bucket': bucket,
+            'facets': {
+                'journeyStep': store.step_names,
+                'reviewRatingScore': [int(score) for score in RATING_SCORES],
+                'period': periods
+            },
+            'terms': terms
+        }, f, ensure_ascii=False)
+
+    return len(terms)
+
+
+class SearchIndex:
+    """Full-text and faceted queries over a review store.
+
+    Text matches and facet values are turned into packed bitmaps over the
+    store's reviews and combined with bitwise operations, so a query costs a
+    few passes over n/8 bytes however many reviews match.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['version'] != INDEX_VERSION:
+            raise ValueError(f"Unsupported search index version: {meta['version']}")
+
+        self.count = meta['count']
+        self.bucket = meta['bucket']
+        self.facet_values = meta['facets']
+        self.term_ids = {term: term_id for term_id, term in enumerate(meta['terms'])}
+        self.store = ReviewStore(meta['storeDir'])
+
+        self.postings = np.load(os.path.join(index_dir, 'postings.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(index_dir, 'postings_offsets.npy'), mmap_mode='r')
+        self.facets = {
+            name: np.load(os.path.join(index_dir, f'facet_{name}.npy'), mmap_mode='r')
+            for name in self.facet_values
+        }
+
+    def __len__(self) -> int:
+        return self.count
+
+    def empty(self) -> np.ndarray:
+        return np.zeros((self.count + 7) // 8, dtype=np.uint8)
+
+    def full(self) -> np.ndarray:
+        return np.packbits(np.ones(self.count, dtype=bool))
+
+    def term_bitmap(self, term: str) -> np.ndarray:
+        """Bitmap of the reviews containing a term"""
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return self.empty()
+        mask = np.zeros(self.count, dtype=bool)
+        mask[self.postings[self.offsets[term_id]:self.offsets[term_id + 1]]] = True
+        return np.packbits(mask)
+
+    def text_bitmap(self, text: str, all_terms: bool = False) -> np.ndarray:
+        """Bitmap of the reviews mentioning any, or with all_terms every, term of text"""
+        terms = list(dict.fromkeys(tokenize(text)))
+        if not terms:
+            return self.full()
+        bitmaps = [self.term_bitmap(term) for term in terms]
+        combine = np.bitwise_and if all_terms else np.bitwise_or
+        return combine.reduce(bitmaps)
+
+    def facet_bitmap(self, name: str, values: Iterable) -> np.ndarray:
+        """Bitmap of the reviews having any of the given facet values"""
+        codes = {value: code for code, value in enumerate(self.facet_values[name])}
+        bitmap = self.empty()
+        for value in values:
+            code = codes.get(int(value) if name == 'reviewRatingScore' else value)
+            if code is not None:
+                bitmap |= self.facets[name][code]
+        return bitmap
+
+    def facet_counts(self, bitmap: np.ndarray, name: str) -> Dict:
+        """Count matching reviews per value of a facet, leaving out values without any"""
+        counts = {}
+        for code, value in enumerate(self.facet_values[name]):
+            count = popcount(bitmap & self.facets[name][code])
+            if count:
+                counts[value] = count
+        return counts
+
+    def search(self, text: Optional[str] = None, steps: Optional[Iterable[str]] = None,
+               ratings: Optional[Iterable[int]] = None, periods: Optional[Iterable[str]] = None,
+               all_terms: bool = False, limit: int = DEFAULT_LIMIT, offset: int = 0) -> Dict:
+        """Find reviews matching every given filter.
+
+        text matches reviews mentioning any of its terms, or all of them with
+        all_terms, after the stemming used for indexing. steps, ratings and
+        periods each match any of their values. Returns the number of
+        matches, per facet counts over the matches and up to limit reviews
+        starting at offset, in store order.
+        """
+        started = time.perf_counter()
+        bitmap = self.text_bitmap(text, all_terms) if text else self.full()
+        for name, values in (('journeyStep', steps), ('reviewRatingScore', ratings), ('period', periods)):
+            if values is not None:
+                bitmap &= self.facet_bitmap(name, values)
+
+        matches = np.flatnonzero(np.unpackbits(bitmap, count=self.count))
+        result = {
+            'total': int(len(matches)),
+            'facets': {name: self.facet_counts(bitmap, name) for name in self.facet_values},
+            'reviews': [self.store.get_review(int(index)) for index in matches[offset:offset + limit]]
+        }
+        result['milliseconds'] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+
+def get_latest_search_index(workspace: Optional[Workspace] = None) -> str:
+    """Get latest search index directory"""
+    return get_workspace(workspace).require_latest('search-index', 'search_index_*', description='search index')
+
+
+def build_search_index(workspace: Optional[Workspace] = None, store_dir: Optional[str] = None,
+                       bucket: str = PERIOD_BUCKET) -> str:
+    """Index the given or latest review store for full-text and faceted search"""
+    try:
+        workspace = get_workspace(workspace)
+        store = ReviewStore(store_dir or get_latest_review_store(workspace))
+
+        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        index_dir = workspace.path('search-index', f'search_index_{timestamp}')
+        term_count = write_search_index(store, index_dir, bucket)
+
+        print(f"Indexed {len(store)} reviews with {term_count} distinct terms")
+        return index_dir
+
+    except Exception as e:
+        print(f"Error building search index: {str(e)}")
+        raise
@@ -0,0 +1,83 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# Constants
+MAX_PARALLEL_STAGES = 4
+
+
+class StageSpec(NamedTuple):
+    """A pipeline stage and the stages it takes its inputs from.
+
+    inputs maps a keyword argument of the stage function to the stage whose
+    output is passed in it.
+    """
+    name: str
+    module: str
+    inputs: Dict[str, str] = {}
+
+    @property
+    def dependencies(self) -> List[str]:
+        return list(dict.fromkeys(self.inputs.values()))
+
+
+def check_stage_graph(stages: List[StageSpec]):
+    """Raise ValueError if a stage depends on an unknown or later stage"""
+    seen = set()
+    for spec in stages:
+        if spec.name in seen:
+            raise ValueError(f"Duplicate stage: {spec.name}")
+        for dependency in spec.dependencies:
+            if dependency not in seen:
+                raise ValueError(f"Stage {spec.name} depends on {dependency}, which does not run before it")
+        seen.add(spec.name)
+
+
+def run_stage_graph(stages: List[StageSpec], run: Callable[[StageSpec, Dict], Optional[str]],
+                    completed: Optional[Dict[str, Optional[str]]] = None,
+                    max_workers: int = MAX_PARALLEL_STAGES) -> Dict[str, Optional[str]]:
+    """Run stages as soon as the stages they depend on have finished.
+
+    run(spec, inputs) runs one stage with the outputs of its input stages as
+    keyword arguments and returns its output. Stages in completed are
+    skipped with their recorded output unless a stage they depend on ran.
+    If a stage fails, no further stages start and the error is raised once
+    running stages finish. Returns the output of every stage.
+    """
+    check_stage_graph(stages)
+    completed = completed or {}
+    outputs: Dict[str, Optional[str]] = {}
+    ran = set()
+    pending = list(stages)
+    running = {}
+    error = None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # Start every stage whose dependencies have finished
+            if error is None:
+                for spec in [spec for spec in pending if all(d in outputs for d in spec.dependencies)]:
+                    pending.remove(spec)
+                    if spec.name in completed and not ran.intersection(spec.dependencies):
+                        print(f"Skipping completed stage: {spec.name}")
+                        outputs[spec.name] = completed[spec.name]
+                        continue
+                    inputs = {argument: outputs[stage] for argument, stage in spec.inputs.items()}
+                    running[executor.submit(run, spec, inputs)] = spec
+                if not running:
+                    # Skipping stages may have made more stages ready
+                    continue
+            elif not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                spec = running.pop(future)
+                try:
+                    outputs[spec.name] = future.result()
+                    ran.add(spec.name)
+                except Exception as e:
+                    error = error or e
+
+    if error is not None:
+        raise error
+    return outputs
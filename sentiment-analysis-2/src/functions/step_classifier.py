@@ -0,0 +1,190 @@
+import math
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Constants
+CONFIDENCE_THRESHOLD = 0.05  # Minimum similarity margin over the runner-up step
+TITLE_WEIGHT = 1.0  # Weight of a step's own title against the mean of its labelled reviews
+SIMILARITY_CHUNK_SIZE = 1_000_000  # Non-zero terms scored at once
+MAX_SUMMARY_SENTENCES = 3
+MIN_TOKEN_LENGTH = 2
+MIN_STEM_LENGTH = 3
+STEM_SUFFIXES = ('ing', 'ed', 'es', 's')
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+STOP_WORDS = frozenset("""
+a about after again all also am an and any are as at be because been before being
+but by can could did do does doing don't for from had has have having he her here
+him his how i i'm if in into is it it's its just me more most my no not now of on
+once only or other our out over own so some such than that the their them then there
+these they this those through to too under until up very was we were what when where
+which while who why will with would you your
+""".split())
+
+
+def stem(token: str) -> str:
+    """Strip common inflections so 'booked', 'booking' and 'books' match"""
+    for suffix in STEM_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+            return token[:-len(suffix)]
+    return token
+
+
+@lru_cache(maxsize=None)
+def to_term(token: str) -> Optional[str]:
+    """Map a token to its term, or None for stop words and short tokens"""
+    if len(token) < MIN_TOKEN_LENGTH or token in STOP_WORDS:
+        return None
+    return stem(token)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase stemmed terms, dropping stop words"""
+    return [term for term in map(to_term, TOKEN_PATTERN.findall((text or '').lower())) if term]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in SENTENCE_PATTERN.split((text or '').strip()) if sentence.strip()]
+
+
+class StepClassifier:
+    """TF-IDF nearest-centroid classifier assigning reviews to journey steps.
+
+    Each step's centroid is its title plus the mean of any reviews already
+    labelled with it, such as reviews the model summarized earlier. Review
+    vectors are kept sparse as (indptr, indices, data) arrays and scored
+    against all centroids at once, so classifying a review costs
+    microseconds on CPU.
+    """
+
+    def __init__(self, journey_steps: Sequence[str], threshold: float = CONFIDENCE_THRESHOLD):
+        if not journey_steps:
+            raise ValueError("At least one journey step is needed to classify reviews")
+        self.journey_steps = list(journey_steps)
+        self.threshold = threshold
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.centroids = np.zeros((len(self.journey_steps), 0), dtype=np.float32)
+
+    def vectorize(self, documents: Sequence[List[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Build L2-normalized sublinear TF-IDF rows for tokenized documents, ignoring unknown terms"""
+        indptr = [0]
+        indices = []
+        counts = []
+        for terms in documents:
+            row = {}
+            for term in terms:
+                index = self.vocabulary.get(term)
+                if index is not None:
+                    row[index] = row.get(index, 0) + 1
+            indices.extend(row.keys())
+            counts.extend(row.values())
+            indptr.append(len(indices))
+
+        indptr = np.asarray(indptr, dtype=np.int64)
+        indices = np.asarray(indices, dtype=np.int64)
+        data = (1 + np.log(np.asarray(counts, dtype=np.float32))) * self.idf[indices]
+
+        # Normalize each row to unit length
+        row_ids = np.repeat(np.arange(len(documents)), np.diff(indptr))
+        norms = np.sqrt(np.bincount(row_ids, weights=data * data, minlength=len(documents)))
+        data = (data / np.maximum(norms[row_ids], 1e-12)).astype(np.float32)
+        return indptr, indices, data
+
+    def similarities(self, rows: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+        """Cosine similarity of every row with every centroid, shape (rows, steps)"""
+        indptr, indices, data = rows
+        row_count = len(indptr) - 1
+        row_ids = np.repeat(np.arange(row_count), np.diff(indptr))
+        scores = np.zeros((row_count, len(self.journey_steps)), dtype=np.float32)
+
+        for start in range(0, len(indices), SIMILARITY_CHUNK_SIZE):
+            end = start + SIMILARITY_CHUNK_SIZE
+            contributions = self.centroids[:, indices[start:end]].T * data[start:end, None]
+            np.add.at(scores, row_ids[start:end], contributions)
+        return scores
+
+    def fit(self, texts: Sequence[str], labels: Optional[Sequence[Optional[str]]] = None) -> 'StepClassifier':
+        """Learn term weights from texts and build centroids from titles and labelled texts.
+
+        labels gives the known step of each text, or None where it is unknown.
+        Labels that are not one of the journey steps are ignored.
+        """
+        documents = [tokenize(text) for text in texts]
+        titles = [tokenize(step) for step in self.journey_steps]
+
+        document_frequency = {}
+        for terms in documents + titles:
+            for term in set(terms):
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+
+        self.vocabulary = {term: index for index, term in enumerate(document_frequency)}
+        frequencies = np.fromiter(document_frequency.values(), dtype=np.float32, count=len(document_frequency))
+        self.idf = (np.log((1 + len(documents) + len(titles)) / (1 + frequencies)) + 1).astype(np.float32)
+
+        centroids = TITLE_WEIGHT * self.dense(self.vectorize(titles))
+
+        step_codes = {step: code for code, step in enumerate(self.journey_steps)}
+        labelled = [
+            (terms, step_codes[label])
+            for terms, label in zip(documents, labels or [])
+            if label in step_codes
+        ]
+        if labelled:
+            indptr, indices, data = self.vectorize([terms for terms, _ in labelled])
+            codes = np.asarray([code for _, code in labelled], dtype=np.int64)
+
+            # Average the labelled rows of each step into its centroid
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, (np.repeat(codes, np.diff(indptr)), indices), data)
+            members = np.bincount(codes, minlength=len(self.journey_steps))
+            centroids += sums / np.maximum(members, 1)[:, None]
+
+        self.centroids = self.normalize(centroids)
+        return self
+
+    def dense(self, rows: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+        indptr, indices, data = rows
+        matrix = np.zeros((len(indptr) - 1, len(self.vocabulary)), dtype=np.float32)
+        matrix[np.repeat(np.arange(len(indptr) - 1), np.diff(indptr)), indices] = data
+        return matrix
+
+    @staticmethod
+    def normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return (matrix / np.maximum(norms, 1e-12)).astype(np.float32)
+
+    @staticmethod
+    def assign(scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Pick the best step per row, with the margin over the runner-up as confidence"""
+        if scores.shape[1] == 1:
+            return np.zeros(len(scores), dtype=np.int64), scores[:, 0]
+        top_two = np.sort(scores, axis=1)[:, -2:]
+        return scores.argmax(axis=1), top_two[:, 1] - top_two[:, 0]
+
+    def predict(self, texts: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+        """Return the best step and its confidence for each text"""
+        rows = self.vectorize([tokenize(text) for text in texts])
+        steps, confidences = self.assign(self.similarities(rows))
+        return [self.journey_steps[step] for step in steps], confidences
+
+    def is_confident(self, confidences: np.ndarray) -> np.ndarray:
+        """Mask of predictions confident enough to skip the model"""
+        return confidences >= self.threshold
+
+    def summarize(self, text: str, max_sentences: int = MAX_SUMMARY_SENTENCES) -> str:
+        """Pick the most informative sentences of text, kept in their original order"""
+        sentences = split_sentences(text)
+        if len(sentences) <= max_sentences:
+            return ' '.join(sentences)
+
+        def score(sentence: str) -> float:
+            weights = [self.idf[self.vocabulary[term]] for term in tokenize(sentence) if term in self.vocabulary]
+            return sum(weights) / math.sqrt(len(weights)) if weights else 0.0
+
+        ranked = sorted(range(len(sentences)), key=lambda i: score(sentences[i]), reverse=True)
+        return ' '.join(sentences[i] for i in sorted(ranked[:max_sentences]))
@@ -0,0 +1,198 @@
+import os
+import sqlite3
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .aggregate_ratings import BUCKET_UNITS, RATING_SCORES
+from .pre_process_raw_data import make_review_id
+from .review_store import MISSING_DATE, MISSING_STEP, day_to_date
+from .workspace import Workspace, get_workspace
+
+# Constants
+ROLLUP_FILENAME = 'rollups.sqlite3'
+ROLLING_WINDOWS = (7, 30, 90)  # Days covered by each rolling window
+
+
+def get_rollup_path(workspace: Optional[Workspace] = None) -> str:
+    """Get path of the persisted step rollup database"""
+    return os.path.join(get_workspace(workspace).directory('step-rollups'), ROLLUP_FILENAME)
+
+
+def store_rows(store) -> Iterable[Tuple[str, Optional[str], int, int]]:
+    """Yield (review id, journey step, day, rating) for every review in a review store.
+
+    Reviews summarized before reviews had ids get one from their content, as
+    pre-processing builds them, numbered when identical reviews repeat so
+    each is still counted.
+    """
+    steps = store.steps.tolist()
+    days = store.dates.tolist()
+    ratings = store.ratings.tolist()
+    derived_ids = Counter()
+    for index in range(len(store)):
+        code = steps[index]
+        step = store.step_names[code] if code != MISSING_STEP else None
+        review_id = store.get_text(index, 'reviewId')
+        if not review_id:
+            review_id = make_review_id(store.get_review(index))
+            derived_ids[review_id] += 1
+            if derived_ids[review_id] > 1:
+                review_id = f"{review_id}-{derived_ids[review_id]}"
+        yield review_id, step, days[index], ratings[index]
+
+
+class RollupStore:
+    """Persisted per-step, per-rating, per-day review counts in SQLite.
+
+    Every merged review is remembered by id, so merging a snapshot that
+    repeats earlier reviews only counts the new ones, and a review whose
+    step, date or rating changed is moved between counters. Counters are
+    keyed by step title, so they survive a change of journey steps and
+    queries simply ask for the steps they need.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_rollup_path()
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS reviews ("
+            "review_id TEXT PRIMARY KEY, step TEXT, day INTEGER NOT NULL, rating INTEGER NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS daily_counts ("
+            "step TEXT NOT NULL, day INTEGER NOT NULL, rating INTEGER NOT NULL, count INTEGER NOT NULL, "
+            "PRIMARY KEY (day, step, rating))"
+        )
+        self.conn.commit()
+
+    def merge(self, rows: Iterable[Tuple[str, Optional[str], int, int]]) -> Dict:
+        """Merge (review id, step, day, rating) rows into the counters.
+
+        Only new and changed reviews touch the counters, so the work done
+        grows with the reviews that differ from earlier merges.
+        """
+        with self.conn:
+            self.conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS incoming ("
+                "review_id TEXT PRIMARY KEY, step TEXT, day INTEGER NOT NULL, rating INTEGER NOT NULL)"
+            )
+            self.conn.execute("DELETE FROM incoming")
+            self.conn.executemany("INSERT OR REPLACE INTO incoming VALUES (?, ?, ?, ?)", rows)
+
+            self.conn.execute(
+                "CREATE TEMP TABLE changed AS "
+                "SELECT i.review_id, r.step AS old_step, r.day AS old_day, r.rating AS old_rating, "
+                "i.step, i.day, i.rating "
+                "FROM incoming i LEFT JOIN reviews r ON r.review_id = i.review_id "
+                "WHERE r.review_id IS NULL OR r.step IS NOT i.step OR r.day != i.day OR r.rating != i.rating"
+            )
+            try:
+                updated = self.conn.execute("SELECT COUNT(*) FROM changed WHERE old_day IS NOT NULL").fetchone()[0]
+                added = self.conn.execute("SELECT COUNT(*) FROM changed WHERE old_day IS NULL").fetchone()[0]
+
+                # Take changed reviews out of their old counters, then count them where they are now
+                self.add_counts(
+                    "SELECT old_step, old_day, old_rating, -COUNT(*) FROM changed "
+                    "WHERE old_step IS NOT NULL AND old_rating BETWEEN 1 AND 5 "
+                    "GROUP BY old_step, old_day, old_rating"
+                )
+                self.add_counts(
+                    "SELECT step, day, rating, COUNT(*) FROM changed "
+                    "WHERE step IS NOT NULL AND rating BETWEEN 1 AND 5 "
+                    "GROUP BY step, day, rating"
+                )
+                self.conn.execute(
+                    "DELETE FROM daily_counts WHERE count = 0 AND (day, step, rating) IN "
+                    "(SELECT old_day, old_step, old_rating FROM changed)"
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO reviews SELECT review_id, step, day, rating FROM changed"
+                )
+            finally:
+                self.conn.execute("DROP TABLE changed")
+            total = self.conn.execute("SELECT COUNT(*) FROM incoming").fetchone()[0]
+
+        return {'added': added, 'updated': updated, 'unchanged': total - added - updated}
+
+    def add_counts(self, select: str):
+        self.conn.execute(
+            f"INSERT INTO daily_counts (step, day, rating, count) {select} "
+            "ON CONFLICT (day, step, rating) DO UPDATE SET count = count + excluded.count"
+        )
+
+    def latest_day(self) -> Optional[int]:
+        """Day number of the most recent dated review, or None"""
+        return self.conn.execute(
+            "SELECT MAX(day) FROM daily_counts WHERE day != ?", (MISSING_DATE,)
+        ).fetchone()[0]
+
+    def matrix(self, journey_steps: List[str], first_day: Optional[int] = None,
+               last_day: Optional[int] = None) -> np.ndarray:
+        """Count ratings into a steps x ratings matrix, optionally between two days inclusive.
+
+        Undated reviews only count when no range is given.
+        """
+        query = "SELECT step, rating, SUM(count) FROM daily_counts"
+        params = ()
+        if first_day is not None:
+            query += " WHERE day BETWEEN ? AND ?"
+            params = (first_day, last_day)
+        query += " GROUP BY step, rating"
+
+        codes = {step: code for code, step in enumerate(journey_steps)}
+        matrix = np.zeros((len(journey_steps), len(RATING_SCORES)), dtype=np.int64)
+        for step, rating, count in self.conn.execute(query, params):
+            if step in codes:
+                matrix[codes[step], rating - 1] = count
+        return matrix
+
+    def rolling_windows(self, journey_steps: List[str], windows=ROLLING_WINDOWS,
+                        end_day: Optional[int] = None) -> Dict:
+        """Count ratings over the last N days of each window, ending at end_day.
+
+        end_day defaults to the latest review date, as reviews are collected
+        in snapshots that may lag the run date.
+        """
+        end_day = end_day if end_day is not None else self.latest_day()
+        if end_day is None:
+            empty = np.zeros((len(journey_steps), len(RATING_SCORES)), dtype=np.int64)
+            return {'end': None, 'windows': {days: empty for days in windows}}
+        return {
+            'end': day_to_date(end_day),
+            'windows': {days: self.matrix(journey_steps, end_day - days + 1, end_day) for days in windows}
+        }
+
+    def bucketed_matrix(self, journey_steps: List[str], bucket: str = 'month') -> Tuple[List[str], np.ndarray]:
+        """Count ratings into a periods x steps x ratings array, like bucketed_rating_matrix()"""
+        if bucket not in BUCKET_UNITS:
+            raise ValueError(f"Unknown time bucket: {bucket}")
+
+        codes = {step: code for code, step in enumerate(journey_steps)}
+        rows = [
+            (codes[step], day, rating, count)
+            for step, day, rating, count in self.conn.execute(
+                "SELECT step, day, rating, SUM(count) FROM daily_counts WHERE day != ? GROUP BY step, day, rating",
+                (MISSING_DATE,)
+            )
+            if step in codes
+        ]
+        if not rows:
+            return [], np.zeros((0, len(journey_steps), len(RATING_SCORES)), dtype=np.int64)
+
+        steps, days, ratings, counts = (np.array(column, dtype=np.int64) for column in zip(*rows))
+        unit = f'datetime64[{BUCKET_UNITS[bucket]}]'
+        periods = days.astype('datetime64[D]').astype(unit).astype(np.int64)
+        first = periods.min()
+        labels = np.arange(first, periods.max() + 1).astype(unit)
+
+        result = np.zeros((len(labels), len(journey_steps), len(RATING_SCORES)), dtype=np.int64)
+        np.add.at(result, (periods - first, steps, ratings - 1), counts)
+        return [str(label) for label in labels], result
+
+    def close(self):
+        """Commit and close the database"""
+        self.conn.commit()
+        self.conn.close()
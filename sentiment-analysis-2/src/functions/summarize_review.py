@@ -1,45 +1,96 @@
+import asyncio
 import json
+from itertools import islice
 import os
-from glob import glob
 from datetime import datetime
-from openai import OpenAI
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional, Tuple
+from .dedupe_reviews import fan_out_summaries, get_latest_review_clusters, group_duplicates, load_review_clusters
+from .batch_api import BATCH_BACKENDS, build_batch_request, get_batch_client, get_batch_job_dir, run_batch_requests
+from .instrumentation import usage_estimate
+from .prompt_compaction import compaction_stats, count_tokens, fit_review, number_steps, record_compaction, step_for_number
+from .openai_clients import get_async_client, get_client
+from .request_scheduler import get_scheduler
+from .ratings_stream import RatingsStream
+from .step_classifier import StepClassifier
+from .review_io import JsonLinesWriter, iter_reviews
+from .run_manifest import RunManifest
+from .summary_cache import SummaryCache, get_cache_path, make_cache_key
+from .workspace import Workspace, get_workspace
 
 # Constants
 BATCH_SIZE = 5
 MAX_BATCHES = 15  # Set maximum number of batches to process
+SUMMARY_MODEL = "gpt-4-turbo-preview"
+PROMPT_VERSION = "2"  # Bump when the prompts change to invalidate cached summaries
 
-print(f"Processing {BATCH_SIZE * MAX_BATCHES} reviews")
+# Summarization modes: "sync" sends one request at a time, "async" keeps
+# up to MAX_CONCURRENT_REQUESTS requests in flight, "batched" packs
+# REVIEWS_PER_REQUEST reviews into each request and "batch_api" submits
+# every review as an offline Batch API job and waits for the results
+SUMMARY_MODES = ("sync", "async", "batched", "batch_api")
+SUMMARY_MODE = "sync"
+MAX_CONCURRENT_REQUESTS = 10
+REQUEST_TIMEOUT = 60  # Seconds allowed per HTTP attempt in async mode
+REVIEWS_PER_REQUEST = 10
+MAX_REVIEW_ATTEMPTS = 3  # Times a failing review is queued within one run
+USE_LOCAL_CLASSIFIER = False
+LOCAL_SEED_REVIEWS = 50  # Model-labelled reviews the local classifier learns from
+SUMMARY_COMPLETION_TOKENS = 80  # Expected reply tokens per summarized review
+PLACEHOLDER_STEP_COUNT = 12  # Journey steps assumed when estimating before they exist
+
+# Where a review's summary came from, saved as its summarySource
+MODEL_SUMMARY = "model"
+EXTRACTIVE_SUMMARY = "extractive"  # Sentences of the review picked by the local classifier
 
 # Define prompt as constant
 SUMMARY_PROMPT = """
-Using the provided journey steps, analyze this review and:
+Using the provided numbered journey steps, analyze this review and:
 1. Create a summary of the reviewDescription in maximum three sentances.
 2. Assign the most relevant journey step to each reviewSummary.
 
 Return ONLY this JSON structure:
 {
     "reviewSummary": "<your generated summary>",
-    "journeyStep": "<matching journey step from provided list>"
+    "journeyStep": <number of the matching journey step>
 }
 
 Rules:
 - Keep emotional content in the summary if relevant.
 - Each review MUST be assigned to exactly one journey step.
-- Use original journey step text exactly as provided.
+- Answer with the journey step's number only, not its text.
+- [...] marks where parts of a long review were left out.
 
 """
 
-def get_latest_journey_steps():
-    """Get latest journey steps file content"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    journey_dir = os.path.join(os.path.dirname(os.path.dirname(current_dir)), 'src', 'data', 'journey-steps')
-    journey_files = glob(os.path.join(journey_dir, 'customer_journey_steps_*.json'))
-    
-    if not journey_files:
-        raise FileNotFoundError("No journey steps file found")
-    
-    latest_file = max(journey_files, key=os.path.getctime)
+BATCH_SUMMARY_PROMPT = """
+Using the provided numbered journey steps, analyze each of the reviews below and:
+1. Create a summary of the reviewDescription in maximum three sentances.
+2. Assign the most relevant journey step to each reviewSummary.
+
+Return ONLY this JSON structure, with one entry for every review id:
+{
+    "reviews": {
+        "<review id>": {
+            "reviewSummary": "<your generated summary>",
+            "journeyStep": <number of the matching journey step>
+        }
+    }
+}
+
+Rules:
+- Keep emotional content in the summary if relevant.
+- Each review MUST be assigned to exactly one journey step.
+- Answer with the journey step's number only, not its text.
+- [...] marks where parts of a long review were left out.
+- Summarize each review on its own, never combine reviews.
+
+"""
+
+def get_latest_journey_steps(workspace: Optional[Workspace] = None, journey_steps_file: Optional[str] = None):
+    """Get content of the given or latest journey steps file"""
+    latest_file = journey_steps_file or get_workspace(workspace).require_latest(
+        'journey-steps', 'customer_journey_steps_*.json', description='journey steps file'
+    )
     with open(latest_file, 'r') as f:
         return json.load(f)
 
@@ -49,88 +100,555 @@ def chunk_reviews(reviews: list, batch_size: int = BATCH_SIZE) -> list:
     return [reviews[i:i + batch_size] for i in range(0, len(reviews), batch_size)]
 
 
-def summarize_review() -> str:
-    """Add AI-generated summaries and journey steps to reviews"""
+def uncompacted_steps(journey_steps: Dict, indent: Optional[int] = None) -> str:
+    """Journey steps JSON as a prompt mode sent it before compaction, to measure savings against"""
+    return json.dumps(journey_steps, indent=indent)
+
+
+def build_summary_messages(review: Dict, journey_steps: Dict) -> Tuple[List[Dict], Dict]:
+    """Build chat messages asking for a summary and journey step number of one review.
     
-    # Get journey steps
-    journey_steps = get_latest_journey_steps()
+    Long reviews are fitted to MAX_REVIEW_TOKENS. Also returns the tokens
+    saved against the full review and indented steps JSON, for callers to
+    record once the prompt is sent.
+    """
+    steps = number_steps(journey_steps.get('journeySteps', []))
+    description = fit_review(review['reviewDescription'])
+    # Single-review prompts sent the steps as indented JSON before compaction
+    stats = compaction_stats(
+        [uncompacted_steps(journey_steps, indent=2), review['reviewDescription']],
+        [steps, description],
+        int(description != review['reviewDescription'])
+    )
+    return [
+        {"role": "system", "content": "You are a review analysis expert."},
+        {"role": "user", "content": f"Journey Steps:\n{steps}\n\n{SUMMARY_PROMPT}\n\nReview: {description}"}
+    ], stats
+
+
+def parse_summary(content: str, journey_steps: Dict) -> Dict:
+    """Read the summary and journey step title from a single-review response"""
+    result = json.loads(content)
+    step = step_for_number(result.get('journeyStep'), journey_steps.get('journeySteps', []))
+    if step is None:
+        raise ValueError(f"Unknown journey step in response: {result.get('journeyStep')!r}")
+    return {"reviewSummary": result['reviewSummary'], "journeyStep": step}
+
+
+def apply_summary(review: Dict, result: Dict, source: str = MODEL_SUMMARY) -> Dict:
+    """Update review with a summary and journey step, noting where the summary came from"""
+    review['reviewSummary'] = result['reviewSummary']
+    review['journeyStep'] = result['journeyStep']
+    review['summarySource'] = source
     
-    # Setup paths
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    src_dir = os.path.dirname(current_dir)
-    data_dir = os.path.join(src_dir, 'data')
+    return review
+
+
+def summarize_single_review(client, review: Dict, journey_steps: Dict) -> Dict:
+    """Summarize one review with a blocking request"""
+    messages, stats = build_summary_messages(review, journey_steps)
+    response = get_scheduler().create_chat_completion(
+        client,
+        model=SUMMARY_MODEL,
+        messages=messages,
+        response_format={"type": "json_object"}
+    )
+    record_compaction(stats)
+    return apply_summary(review, parse_summary(response.choices[0].message.content, journey_steps))
+
+
+def build_batch_summary_messages(reviews: List[Dict], journey_steps: Dict) -> Tuple[List[Dict], Dict]:
+    """Build chat messages asking for summaries of several reviews keyed by id, and their compaction stats"""
+    steps = number_steps(journey_steps.get('journeySteps', []))
+    descriptions = [fit_review(review['reviewDescription']) for review in reviews]
+    # Batched prompts sent the steps as compact JSON before compaction
+    stats = compaction_stats(
+        [uncompacted_steps(journey_steps)] + [review['reviewDescription'] for review in reviews],
+        [steps] + descriptions,
+        sum(description != review['reviewDescription'] for description, review in zip(descriptions, reviews))
+    )
+    batch = [
+        {"id": str(review_id), "reviewDescription": description}
+        for review_id, description in enumerate(descriptions, start=1)
+    ]
+    return [
+        {"role": "system", "content": "You are a review analysis expert."},
+        {"role": "user", "content": f"Journey Steps:\n{steps}\n\n{BATCH_SUMMARY_PROMPT}\n\nReviews:\n{json.dumps(batch, ensure_ascii=False)}"}
+    ], stats
+
+
+def parse_batch_summaries(content: str, review_ids: List[str], journey_steps: Dict) -> Dict[str, Dict]:
+    """Return the well-formed results of a batch response keyed by review id.
+    
+    Ids that are missing, unknown or have malformed results are left out so
+    the caller can retry them on their own.
+    """
+    try:
+        results = json.loads(content).get('reviews', {})
+    except (json.JSONDecodeError, AttributeError):
+        return {}
+    if not isinstance(results, dict):
+        return {}
+    
+    steps = journey_steps.get('journeySteps', [])
+    parsed = {}
+    for review_id in review_ids:
+        result = results.get(review_id)
+        if not isinstance(result, dict):
+            continue
+        summary = result.get('reviewSummary')
+        step = step_for_number(result.get('journeyStep'), steps)
+        if not isinstance(summary, str) or not summary.strip() or step is None:
+            continue
+        parsed[review_id] = {"reviewSummary": summary, "journeyStep": step}
+    
+    return parsed
+
+
+def summarize_review_batch(client, reviews: List[Dict], journey_steps: Dict) -> List:
+    """Summarize several reviews in one request, returning results in input order.
+    
+    Reviews missing or malformed in the batch response are retried with a
+    single-review request. A review that still fails is returned as its
+    exception instead of a dict.
+    """
+    review_ids = [str(review_id) for review_id in range(1, len(reviews) + 1)]
     
-    input_dir = os.path.join(data_dir, 'pre-processed-raw-data')
-    output_dir = os.path.join(data_dir, 'summarized-reviews')
-    os.makedirs(output_dir, exist_ok=True)
+    try:
+        messages, stats = build_batch_summary_messages(reviews, journey_steps)
+        response = get_scheduler().create_chat_completion(
+            client,
+            model=SUMMARY_MODEL,
+            messages=messages,
+            response_format={"type": "json_object"}
+        )
+        record_compaction(stats)
+        parsed = parse_batch_summaries(response.choices[0].message.content, review_ids, journey_steps)
+    except Exception as e:
+        print(f"Error processing review batch: {str(e)}")
+        parsed = {}
     
-    # Get latest processed reviews file
-    json_files = glob(os.path.join(input_dir, 'processed_reviews_*.json'))
-    if not json_files:
-        raise FileNotFoundError("No processed review files found")
+    missing = len(review_ids) - len(parsed)
+    if missing:
+        print(f"Retrying {missing}/{len(review_ids)} reviews individually")
     
-    input_file = max(json_files, key=os.path.getctime)
+    results = []
+    for review_id, review in zip(review_ids, reviews):
+        if review_id in parsed:
+            results.append(apply_summary(review, parsed[review_id]))
+            continue
+        try:
+            results.append(summarize_single_review(client, review, journey_steps))
+        except Exception as e:
+            results.append(e)
+    
+    return results
+
+
+async def summarize_reviews_async(reviews: List[Dict], journey_steps: Dict, client=None,
+                                  max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                                  timeout: float = REQUEST_TIMEOUT,
+                                  on_result: Optional[Callable[[int, object], None]] = None) -> List:
+    """Summarize reviews concurrently, returning results in input order.
+    
+    At most max_concurrency requests are in flight at once. timeout limits
+    each HTTP attempt, so waits for rate limits and retries do not count
+    against it. A review that fails or whose attempt exceeds timeout is
+    returned as its exception instead of a dict. on_result, if given, is
+    called with each review's index and result as soon as it finishes.
+    """
+    if client is None:
+        client = get_async_client()
+    
+    semaphore = asyncio.Semaphore(max_concurrency)
+    completed = 0
+    
+    async def summarize_one(review: Dict) -> Dict:
+        nonlocal completed
+        messages, stats = build_summary_messages(review, journey_steps)
+        async with semaphore:
+            response = await get_scheduler().acreate_chat_completion(
+                client,
+                timeout=timeout,
+                model=SUMMARY_MODEL,
+                messages=messages,
+                response_format={"type": "json_object"}
+            )
+        record_compaction(stats)
+        completed += 1
+        if completed % BATCH_SIZE == 0:
+            print(f"Completed {completed}/{len(reviews)} reviews")
+        return apply_summary(review, parse_summary(response.choices[0].message.content, journey_steps))
+    
+    async def finish_one(index: int, review: Dict):
+        try:
+            result = await summarize_one(review)
+        except Exception as e:
+            result = e
+        if on_result:
+            on_result(index, result)
+        return result
+    
+    return await asyncio.gather(*(finish_one(index, review) for index, review in enumerate(reviews)))
+
+
+def summarize_with_batch_api(batch_client, reviews: List[Dict], journey_steps: Dict,
+                             job_dir: Optional[str] = None, on_results=None) -> List:
+    """Summarize reviews with one offline Batch API job, returning results in input order.
+    
+    Each review is one request whose custom_id is its position in reviews.
+    A review whose request failed is returned as its exception instead of a dict.
+    on_results(indices, results), if given, is called with each group of
+    results as the finished job's output is read.
+    """
+    prompts = [build_summary_messages(review, journey_steps) for review in reviews]
+    requests = [
+        build_batch_request(str(index), {
+            "model": SUMMARY_MODEL,
+            "messages": messages,
+            "response_format": {"type": "json_object"}
+        })
+        for index, (messages, _) in enumerate(prompts)
+    ]
+    results = [None] * len(reviews)
+    
+    def add_responses(responses: Dict):
+        indices = [int(custom_id) for custom_id in responses]
+        for index, response in zip(indices, responses.values()):
+            if isinstance(response, Exception):
+                results[index] = response
+                continue
+            record_compaction(prompts[index][1])
+            try:
+                results[index] = apply_summary(
+                    reviews[index], parse_summary(response['choices'][0]['message']['content'], journey_steps)
+                )
+            except Exception as e:
+                results[index] = e
+        if on_results:
+            on_results(indices, [results[index] for index in indices])
+    
+    run_batch_requests(batch_client, requests, job_dir, on_results=add_responses)
+    return results
+
+
+def classify_reviews_locally(reviews: List[Dict], journey_steps: Dict,
+                             labelled_texts: List[str], labels: List[str]):
+    """Assign journey steps and extractive summaries without calling the model.
+    
+    Returns the reviews the classifier is confident about, summarized with
+    summarySource EXTRACTIVE_SUMMARY, and the indices of the reviews left
+    for the model. Extractive summaries are never cached, so later runs
+    do not take them for model summaries.
+    """
+    if not reviews:
+        return [], []
+    
+    texts = [review['reviewDescription'] for review in reviews]
+    classifier = StepClassifier(journey_steps.get('journeySteps', []))
+    classifier.fit(labelled_texts + texts, labels + [None] * len(texts))
+    steps, confidences = classifier.predict(texts)
+    
+    summarized = []
+    remaining = []
+    for index, confident in enumerate(classifier.is_confident(confidences)):
+        if not confident:
+            remaining.append(index)
+            continue
+        summarized.append(apply_summary(reviews[index], {
+            "reviewSummary": classifier.summarize(texts[index]),
+            "journeyStep": steps[index]
+        }, EXTRACTIVE_SUMMARY))
+    
+    return summarized, remaining
+
+
+def summarize_pending(mode: str, client, reviews: List[Dict], journey_steps: Dict, on_results,
+                      workspace: Optional[Workspace] = None):
+    """Send reviews to the API in the given mode.
+    
+    on_results(indices, results) is called with the results for those
+    indices of reviews as they arrive: after each request group, after each
+    async request and as Batch API output is read. A failed review is
+    passed as its exception instead of a dict.
+    """
+    if mode == "batch_api":
+        print(f"Submitting {len(reviews)} reviews to the Batch API...\n")
+        summarize_with_batch_api(client, reviews, journey_steps, get_batch_job_dir(workspace), on_results)
+    
+    elif mode == "async":
+        print(f"Summarizing {len(reviews)} reviews with up to {MAX_CONCURRENT_REQUESTS} concurrent requests...\n")
+        asyncio.run(summarize_reviews_async(
+            reviews, journey_steps, on_result=lambda index, result: on_results([index], [result])
+        ))
+    
+    elif mode == "batched":
+        request_batches = chunk_reviews(reviews, REVIEWS_PER_REQUEST)
+        print(f"Summarizing {len(reviews)} reviews in {len(request_batches)} requests...\n")
+        
+        for request_num, request_batch in enumerate(request_batches, start=1):
+            results = summarize_review_batch(client, request_batch, journey_steps)
+            offset = (request_num - 1) * REVIEWS_PER_REQUEST
+            on_results(range(offset, offset + len(results)), results)
+            print(f"Completed request {request_num}/{len(request_batches)}")
+    
+    else:
+        print("Starting batch processing...\n")
+        batches = chunk_reviews(reviews, BATCH_SIZE)
+        
+        for batch_num in range(1, len(batches) + 1):
+            print(f"Processing batch {batch_num}/{len(batches)}")
+            batch_summaries = []
+            
+            for review in batches[batch_num - 1]:
+                try:
+                    # Update review with new fields from response
+                    batch_summaries.append(summarize_single_review(client, review, journey_steps))
+                except Exception as e:
+                    batch_summaries.append(e)
+            
+            offset = (batch_num - 1) * BATCH_SIZE
+            on_results(range(offset, offset + len(batch_summaries)), batch_summaries)
+            print(f"Completed batch {batch_num}/{len(batches)}")
+
+
+def estimate_messages_tokens(messages: List[Dict]) -> int:
+    return sum(count_tokens(message['content']) for message in messages)
+
+
+def estimate_summary_usage(mode: str = SUMMARY_MODE, workspace: Optional[Workspace] = None) -> Dict:
+    """Estimate the API usage of summarize_review() without calling the API.
+    
+    Duplicate clusters and cached summaries are taken into account. Before
+    journey steps exist, PLACEHOLDER_STEP_COUNT made-up steps stand in.
+    With the local classifier the real usage is lower than estimated.
+    """
+    workspace = get_workspace(workspace)
+    try:
+        journey_steps = get_latest_journey_steps(workspace)
+    except FileNotFoundError:
+        journey_steps = {"journeySteps": ["Placeholder journey step title"] * PLACEHOLDER_STEP_COUNT}
+    
+    input_file = workspace.require_latest('pre-processed-raw-data', 'processed_reviews_*.jsonl',
+                                          description='processed review files')
+    reviews = list(islice(iter_reviews(input_file), BATCH_SIZE * MAX_BATCHES))
+    reviews, _ = group_duplicates(reviews, load_review_clusters(get_latest_review_clusters(workspace)))
+    
+    cache = SummaryCache(get_cache_path(workspace))
+    try:
+        pending = [
+            review for review in reviews
+            if cache.get(make_cache_key(SUMMARY_MODEL, PROMPT_VERSION, journey_steps, review['reviewDescription'])) is None
+        ]
+    finally:
+        cache.close()
+    
+    if mode == "batched":
+        requests = [build_batch_summary_messages(batch, journey_steps)[0] for batch in chunk_reviews(pending, REVIEWS_PER_REQUEST)]
+    else:
+        requests = [build_summary_messages(review, journey_steps)[0] for review in pending]
+    
+    return usage_estimate(
+        'summarize_review', SUMMARY_MODEL, len(requests),
+        sum(estimate_messages_tokens(messages) for messages in requests),
+        len(pending) * SUMMARY_COMPLETION_TOKENS,
+        batch=mode == "batch_api"
+    )
+
+
+def summarize_review(mode: str = SUMMARY_MODE, manifest: Optional[RunManifest] = None,
+                     batch_backend: str = "openai", local_classifier: bool = USE_LOCAL_CLASSIFIER,
+                     workspace: Optional[Workspace] = None, input_file: Optional[str] = None,
+                     journey_steps_file: Optional[str] = None, clusters_file: Optional[str] = None,
+                     stream_interval: Optional[float] = None) -> str:
+    """Add AI-generated summaries and journey steps to reviews.
+    
+    input_file, journey_steps_file and clusters_file default to the latest
+    ones in the workspace.
+    In "batch_api" mode, batch_backend picks the OpenAI Batch API or a
+    local stand-in that runs the batch through chat completions.
+    With local_classifier, the model only labels a seed sample and the
+    reviews the local classifier is unsure about.
+    With a run manifest, progress is recorded per review and a resumed run
+    continues the previous output file, skipping reviews already done.
+    Failed reviews are requeued up to MAX_REVIEW_ATTEMPTS times per run.
+    With stream_interval, summaries are counted as they complete and partial
+    ratings and a chart are refreshed every stream_interval seconds.
+    """
+    
+    if mode not in SUMMARY_MODES:
+        raise ValueError(f"Unknown summary mode: {mode}")
+    if batch_backend not in BATCH_BACKENDS:
+        raise ValueError(f"Unknown batch backend: {batch_backend}")
+    
+    workspace = get_workspace(workspace)
+    
+    # Get journey steps
+    journey_steps = get_latest_journey_steps(workspace, journey_steps_file)
+    
+    # Setup paths
+    output_dir = workspace.directory('summarized-reviews')
+    
+    # Get latest processed reviews file unless given one
+    input_file = input_file or workspace.require_latest('pre-processed-raw-data', 'processed_reviews_*.jsonl',
+                                                        description='processed review files')
     # print(f"Reading from: {input_file}")
     
-    # Initialize OpenAI
-    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    # Get the shared OpenAI client, which leaves retries to the request scheduler
+    client = get_client()
+    if mode == "batch_api":
+        client = get_batch_client(client, batch_backend, workspace)
     
-    # Read reviews
-    with open(input_file, 'r') as f:
-        reviews = json.load(f)
+    # Stream only the reviews that will be processed
+    reviews = list(islice(iter_reviews(input_file), BATCH_SIZE * MAX_BATCHES))
     
-    # Setup output file with timestamp
-    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    output_filename = f'summarized_reviews_{timestamp}.json'
-    output_path = os.path.join(output_dir, output_filename)
+    # Continue the previous output file when resuming
+    done_ids = set()
+    output_path = manifest.stage_output('summarize_review') if manifest else None
+    if output_path and os.path.exists(output_path):
+        # Reviews saved to the output but not yet logged also count as done
+        done_ids = {review.get('reviewId') for review in iter_reviews(output_path)}
+        print(f"Resuming with {len(done_ids)} reviews already summarized")
+    else:
+        # Setup output file with timestamp
+        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        output_filename = f'summarized_reviews_{timestamp}.jsonl'
+        output_path = os.path.join(output_dir, output_filename)
+        if manifest:
+            manifest.start_stage('summarize_review', output_path)
     
     # Process reviews in batches
     batches = chunk_reviews(reviews, BATCH_SIZE)
     total_batches = min(len(batches), MAX_BATCHES)
-    summarized_reviews = []
+    selected = [review for batch in batches[:total_batches] for review in batch]
+    if manifest:
+        done_ids |= manifest.completed_reviews
+        selected = [review for review in selected if review.get('reviewId') not in done_ids]
     
     print(f"Processing {MAX_BATCHES * BATCH_SIZE} reviews in {total_batches} batches")
     # print("First batch content:")
     # print(json.dumps(batches[0], indent=2))
-    print("Starting batch processing...\n")
     
-    for batch_num in range(1, total_batches + 1):
-        try:
-            print(f"Processing batch {batch_num}/{total_batches}")
-            batch_summaries = []
-            
-            for review in batches[batch_num - 1]:
-                response = client.chat.completions.create(
-                    model="gpt-4-turbo-preview",
-                    messages=[
-                        {"role": "system", "content": "You are a review analysis expert."},
-                        {"role": "user", "content": f"Journey Steps:\n{json.dumps(journey_steps, indent=2)}\n\n{SUMMARY_PROMPT}\n\nReview: {review['reviewDescription']}"}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                
-                # Get processed data from response
-                result = json.loads(response.choices[0].message.content)
-                
-                # Update review with new fields
-                review['reviewSummary'] = result['reviewSummary']
-                review['journeyStep'] = result['journeyStep']
-                del review['reviewDescription']
-                
-                batch_summaries.append(review)
+    # Send one review per duplicate cluster and copy its summary to the rest
+    clusters_file = clusters_file or get_latest_review_clusters(workspace)
+    selected, cluster_members = group_duplicates(selected, load_review_clusters(clusters_file))
+    duplicate_count = sum(len(members) for members in cluster_members.values())
+    if duplicate_count:
+        print(f"Skipping {duplicate_count} duplicate reviews, their summaries are copied from {len(cluster_members)} representatives")
+    
+    # Reuse cached summaries and only send unseen reviews to the API
+    cache = SummaryCache(get_cache_path(workspace))
+    pending_reviews = []
+    pending_keys = []
+    cached_reviews = []
+    # Review text and step of every review the model has labelled, to train the local classifier
+    labelled_texts = []
+    labels = []
+    for review in selected:
+        key = make_cache_key(SUMMARY_MODEL, PROMPT_VERSION, journey_steps, review['reviewDescription'])
+        cached = cache.get(key)
+        if cached is not None:
+            labelled_texts.append(review['reviewDescription'])
+            labels.append(cached['journeyStep'])
+            cached_reviews.append(apply_summary(review, cached))
+        else:
+            pending_reviews.append(review)
+            pending_keys.append(key)
+    
+    print(f"Found {cache.hits} cached summaries, {len(pending_reviews)} reviews to summarize")
+    
+    writer = JsonLinesWriter(output_path)
+    summarized_count = len(done_ids)
+    stream = None
+    if stream_interval:
+        stream = RatingsStream(journey_steps.get("journeySteps", []), workspace, stream_interval)
+        if done_ids:
+            stream.put(iter_reviews(output_path))
+    
+    def save_progress(completed: List[Dict], failed_ids: List):
+        """Append newly summarized reviews and record review outcomes"""
+        nonlocal summarized_count
+        completed = fan_out_summaries(completed, cluster_members)
+        failed_ids = failed_ids + [
+            member.get('reviewId') for review_id in failed_ids for member in cluster_members.get(review_id, [])
+        ]
+        summarized_count += writer.write_many(completed)
+        if stream:
+            stream.put(completed)
+        if manifest:
+            manifest.record_reviews(
+                [review.get('reviewId') for review in completed if review.get('reviewId')],
+                [review_id for review_id in failed_ids if review_id]
+            )
+    
+    def summarize_with_model(reviews: List[Dict], keys: List[str]):
+        """Send reviews to the model, requeuing failures up to MAX_REVIEW_ATTEMPTS times"""
+        for attempt in range(1, MAX_REVIEW_ATTEMPTS + 1):
+            if not reviews:
+                return
+            if attempt > 1:
+                print(f"Requeuing {len(reviews)} failed reviews (attempt {attempt}/{MAX_REVIEW_ATTEMPTS})")
             
-            # Append batch to output file
-            summarized_reviews.extend(batch_summaries)
+            descriptions = [review['reviewDescription'] for review in reviews]
+            failed_reviews = []
+            failed_keys = []
             
-            # Save progress after each batch
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(summarized_reviews, f, indent=2, ensure_ascii=False)
+            def on_results(indices, results: List):
+                """Cache successful results, queue failures and save progress"""
+                completed = []
+                failed_ids = []
+                for index, result in zip(indices, results):
+                    review, key = reviews[index], keys[index]
+                    if isinstance(result, Exception):
+                        print(f"Error processing review: {type(result).__name__}: {str(result)}")
+                        failed_reviews.append(review)
+                        failed_keys.append(key)
+                        failed_ids.append(review.get('reviewId'))
+                        continue
+                    # Only model summaries are cached, extractive ones are saved straight to the output
+                    cache.put(key, {"reviewSummary": result['reviewSummary'], "journeyStep": result['journeyStep']})
+                    labelled_texts.append(descriptions[index])
+                    labels.append(result['journeyStep'])
+                    completed.append(result)
+                
+                # Save progress after each request group
+                save_progress(completed, failed_ids)
             
-            print(f"Completed batch {batch_num}/{total_batches}")
+            summarize_pending(mode, client, reviews, journey_steps, on_results, workspace)
+            reviews, keys = failed_reviews, failed_keys
+        
+        if reviews:
+            print(f"Warning: {len(reviews)} reviews still failing after {MAX_REVIEW_ATTEMPTS} attempts")
+    
+    try:
+        save_progress(cached_reviews, [])
+        
+        if local_classifier and pending_reviews:
+            # Label a seed sample with the model so the classifier has examples to learn from
+            seed_count = max(0, LOCAL_SEED_REVIEWS - len(labels))
+            summarize_with_model(pending_reviews[:seed_count], pending_keys[:seed_count])
+            pending_reviews, pending_keys = pending_reviews[seed_count:], pending_keys[seed_count:]
             
-        except Exception as e:
-            print(f"Error processing batch {batch_num}: {str(e)}")
-            continue
+            local_reviews, remaining = classify_reviews_locally(
+                pending_reviews, journey_steps, labelled_texts, labels
+            )
+            save_progress(local_reviews, [])
+            print(f"Classified {len(local_reviews)} reviews locally, {len(remaining)} left for the model")
+            pending_reviews = [pending_reviews[index] for index in remaining]
+            pending_keys = [pending_keys[index] for index in remaining]
+        
+        summarize_with_model(pending_reviews, pending_keys)
+        
+    finally:
+        writer.close()
+        print(f"Summary cache: {cache.stats()}")
+        cache.close()
+        if stream:
+            # Partial results are a preview, so a failed stream does not fail summarization
+            try:
+                print(f"Streamed ratings of {stream.reviews} reviews to {stream.close()}")
+            except RuntimeError as e:
+                print(f"Error: {str(e)}")
     
-    print(f"Completed processing {len(summarized_reviews)} reviews")
-    return output_path
\ No newline at end of file
+    print(f"Completed processing {summarized_count} reviews")
+    return output_path
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+
+from .workspace import Workspace, get_workspace
+
+# Constants
+CACHE_FILENAME = 'summaries.sqlite3'
+MAX_CACHE_BYTES = 256 * 1024 * 1024  # Evict least recently used entries above this size
+EVICTION_TARGET = 0.9  # Fraction of MAX_CACHE_BYTES to shrink to when evicting
+BUSY_TIMEOUT = 30.0  # Seconds to wait on writes from pipelines sharing the cache
+
+
+def get_cache_path(workspace: Optional[Workspace] = None) -> str:
+    """Get path of the summary cache database, shared by every workspace"""
+    return os.path.join(get_workspace(workspace).shared_directory('summary-cache'), CACHE_FILENAME)
+
+
+def make_cache_key(model: str, prompt_version: str, journey_steps: Dict, review_description: str) -> str:
+    """Hash everything that affects a summary into a cache key"""
+    payload = json.dumps(
+        [model, prompt_version, journey_steps, review_description],
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SummaryCache:
+    """Content-addressed SQLite store of model results with LRU size eviction"""
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = MAX_CACHE_BYTES):
+        self.path = path or get_cache_path()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON summaries (last_used)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached result for key, or None on a miss"""
+        row = self.conn.execute("SELECT value FROM summaries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Dict):
+        """Store result under key, evicting old entries if over the size limit"""
+        value = json.dumps(result, ensure_ascii=False)
+        size = len(value.encode('utf-8'))
+
+        row = self.conn.execute("SELECT size FROM summaries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self.total_bytes -= row[0]
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO summaries (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, value, size, time.time())
+        )
+        self.total_bytes += size
+
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+        self.conn.commit()
+
+    def evict(self):
+        """Remove least recently used entries until under the eviction target"""
+        target = self.max_bytes * EVICTION_TARGET
+        evicted = []
+
+        for key, size in self.conn.execute("SELECT key, size FROM summaries ORDER BY last_used ASC"):
+            if self.total_bytes <= target:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+
+        self.conn.executemany("DELETE FROM summaries WHERE key = ?", evicted)
+        print(f"Evicted {len(evicted)} cached summaries")
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters and current cache size"""
+        entries = self.conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "bytes": self.total_bytes
+        }
+
+    def close(self):
+        """Commit and close the database"""
+        self.conn.commit()
+        self.conn.close()
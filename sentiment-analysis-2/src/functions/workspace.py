@@ -0,0 +1,71 @@
+import os
+import re
+from glob import glob
+from typing import Optional
+
+# Constants
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+BRANDS_DIRECTORY = 'brands'  # Holds one workspace per brand under the shared data directory
+
+
+def brand_slug(brand: str) -> str:
+    """Turn a brand name into a directory name"""
+    slug = re.sub(r'[^a-z0-9]+', '-', brand.lower()).strip('-')
+    if not slug:
+        raise ValueError(f"Invalid brand name: {brand!r}")
+    return slug
+
+
+class Workspace:
+    """Data directories of one pipeline run.
+
+    Stages read and write their files under data_dir, so runs in separate
+    workspaces never see each other's output. Caches that are safe to share,
+    such as model summaries, stay in shared_dir.
+    """
+
+    def __init__(self, data_dir: str = DEFAULT_DATA_DIR, name: Optional[str] = None,
+                 shared_dir: Optional[str] = None):
+        self.data_dir = data_dir
+        self.name = name
+        self.shared_dir = shared_dir or data_dir
+
+    @classmethod
+    def for_brand(cls, brand: str, root_dir: str = DEFAULT_DATA_DIR) -> 'Workspace':
+        """Workspace of one brand, sharing caches with root_dir"""
+        return cls(os.path.join(root_dir, BRANDS_DIRECTORY, brand_slug(brand)), name=brand, shared_dir=root_dir)
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self.data_dir, *parts)
+
+    def directory(self, name: str) -> str:
+        """Get a directory of this workspace, creating it if needed"""
+        path = self.path(name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def shared_directory(self, name: str) -> str:
+        """Get a directory shared by every workspace, creating it if needed"""
+        path = os.path.join(self.shared_dir, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def latest(self, name: str, *patterns: str) -> Optional[str]:
+        """Get the newest file in a directory matching any pattern, or None"""
+        matches = [match for pattern in patterns for match in glob(self.path(name, pattern))]
+        return max(matches, key=os.path.getctime) if matches else None
+
+    def require_latest(self, name: str, *patterns: str, description: str = 'files') -> str:
+        """Get the newest matching file, raising FileNotFoundError if there is none"""
+        latest = self.latest(name, *patterns)
+        if latest is None:
+            raise FileNotFoundError(f"No {description} found")
+        return latest
+
+
+_default_workspace = Workspace()
+
+
+def get_workspace(workspace: Optional[Workspace] = None) -> Workspace:
+    """Get the given workspace, or the default one under src/data"""
+    return workspace or _default_workspace
@@ -1,36 +1,377 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from functions.aggregate_ratings import BUCKET_UNITS
+from functions.batch_api import BATCH_BACKENDS
+from functions.generate_graph import GRAPH_MODES
 from functions.initialize_directories import initialize_directories
-from functions.pre_process_raw_data import pre_process_raw_data
-from functions.determine_journey_steps import extract_sample_reviews, analyze_journey_steps
-from functions.summarize_review import summarize_review
-from functions.count_ratings_by_step import count_ratings_by_step
-from functions.generate_graph import generate_graph
+from functions.instrumentation import get_metrics, write_run_report
+from functions.request_scheduler import get_scheduler
+from functions.run_manifest import RunManifest, get_manifest_dir
+from functions.stage_graph import StageSpec, run_stage_graph
+from functions.workspace import Workspace, get_workspace
 
-def main():
+# Pipeline stages, the module defining each and the stages whose output
+# each takes as input. A stage starts once its inputs are ready, so
+# dedupe_reviews runs alongside journey step discovery. Stages are imported
+# when they run, so a run only loads what it uses.
+STAGES = [
+    StageSpec('pre_process_raw_data', 'functions.pre_process_raw_data'),
+    StageSpec('dedupe_reviews', 'functions.dedupe_reviews', {'input_file': 'pre_process_raw_data'}),
+    StageSpec('extract_sample_reviews', 'functions.determine_journey_steps', {'input_file': 'pre_process_raw_data'}),
+    StageSpec('analyze_journey_steps', 'functions.determine_journey_steps',
+              {'sample_file': 'extract_sample_reviews', 'reviews_file': 'pre_process_raw_data'}),
+    StageSpec('summarize_review', 'functions.summarize_review', {
+        'input_file': 'pre_process_raw_data',
+        'clusters_file': 'dedupe_reviews',
+        'journey_steps_file': 'analyze_journey_steps'
+    }),
+    StageSpec('build_review_store', 'functions.review_store',
+              {'summary_file': 'summarize_review', 'journey_steps_file': 'analyze_journey_steps'}),
+    StageSpec('build_search_index', 'functions.search_index', {'store_dir': 'build_review_store'}),
+    StageSpec('count_ratings_by_step', 'functions.count_ratings_by_step', {'store_dir': 'build_review_store'}),
+    StageSpec('generate_graph', 'functions.generate_graph', {'ratings_file': 'count_ratings_by_step'})
+]
+
+# Stages that take the run manifest to record their own progress
+MANIFEST_STAGES = {'summarize_review'}
+
+# Stages a dry run executes, as they make no API calls
+DRY_RUN_STAGES = ['pre_process_raw_data', 'dedupe_reviews', 'extract_sample_reviews']
+
+# Stages that discover journey steps, run once when brands share one set of steps
+STEP_DISCOVERY_STAGES = ['pre_process_raw_data', 'extract_sample_reviews', 'analyze_journey_steps']
+
+# Brands whose pipelines run at once, sharing the summary cache and rate budget
+MAX_CONCURRENT_BRANDS = 4
+
+def load_stage(name: str):
+    """Import a stage function by name"""
+    modules = {spec.name: spec.module for spec in STAGES}
+    return getattr(import_module(modules[name]), name)
+
+def write_report(extra: dict, prometheus: bool = False):
+    """Write the run report, printing where it went"""
+    metrics = get_metrics()
+    report = metrics.report(extra)
+    report_path = write_run_report(report, metrics.to_prometheus(report) if prometheus else None)
+    totals = report['totals']
+    print(f"Run report saved to {report_path}: {totals['calls']} model calls, "
+          f"{totals['promptTokens'] + totals['completionTokens']} tokens, ~${totals['costUsd']:.2f}")
+    compaction = report['promptCompaction']['totals']
+    if compaction['prompts']:
+        print(f"Prompt compaction saved {compaction['savedTokens']} of {compaction['originalTokens']} prompt tokens "
+              f"({compaction['savedPercent']}%) across {compaction['prompts']} prompts, "
+              f"truncating {compaction['truncatedReviews']} reviews")
+
+def dry_run(summary_mode: str = None, journey_mode: str = None, prometheus: bool = False,
+            workspace: Workspace = None):
+    """Prepare the inputs and estimate the tokens and cost of a run without calling the API"""
     try:
+        from functions.determine_journey_steps import JOURNEY_MODE, estimate_journey_usage
+        from functions.summarize_review import SUMMARY_MODE, estimate_summary_usage
+        
+        def run_dry_stage(spec: StageSpec, inputs: dict):
+            with get_metrics().stage(spec.name):
+                return load_stage(spec.name)(workspace=workspace, **inputs)
+        
+        run_stage_graph([spec for spec in STAGES if spec.name in DRY_RUN_STAGES], run_dry_stage)
+        
+        estimates = [estimate_journey_usage(journey_mode or JOURNEY_MODE, workspace),
+                     estimate_summary_usage(summary_mode or SUMMARY_MODE, workspace)]
+        for estimate in estimates:
+            print(f"{estimate['stage']}: {estimate['requests']} requests to {estimate['model']}, "
+                  f"~{estimate['promptTokens']} prompt and ~{estimate['completionTokens']} completion tokens, "
+                  f"~${estimate['costUsd']:.2f}")
+        total = round(sum(estimate['costUsd'] for estimate in estimates), 4)
+        print(f"Estimated cost: ~${total:.2f}")
+        write_report({'dryRun': True, 'estimates': estimates, 'estimatedCostUsd': total}, prometheus)
+        
+    except Exception as e:
+        print(f"Error: {str(e)}")
+
+def stage_options_for(batch_backend: str = None, local_classifier: bool = False,
+                      map_reduce_steps: bool = False, graph_mode: str = None,
+                      stream_interval: float = None) -> dict:
+    """Get keyword arguments of each stage for the command line options"""
+    summary_options = {'local_classifier': local_classifier}
+    if batch_backend:
+        summary_options.update(mode="batch_api", batch_backend=batch_backend)
+    if stream_interval:
+        summary_options['stream_interval'] = stream_interval
+    stage_options = {'summarize_review': summary_options}
+    if map_reduce_steps:
+        stage_options['analyze_journey_steps'] = {'mode': "map_reduce"}
+    if graph_mode:
+        stage_options['generate_graph'] = {'mode': graph_mode}
+    return stage_options
+
+def pipeline_stages(stage_names: list = None, journey_steps_file: str = None) -> list:
+    """Get the stages of a run, limited to stage_names if given.
+    
+    With journey_steps_file the run uses those steps instead of discovering
+    its own, so analyze_journey_steps takes no inputs and sampling is left out.
+    """
+    stages = [spec for spec in STAGES if stage_names is None or spec.name in stage_names]
+    if journey_steps_file:
+        stages = [StageSpec(spec.name, spec.module) if spec.name == 'analyze_journey_steps' else spec
+                  for spec in stages if spec.name != 'extract_sample_reviews']
+    return stages
+
+def run_pipeline(workspace: Workspace, stage_options: dict, resume: bool = False, stage_names: list = None,
+                 journey_steps_file: str = None) -> RunManifest:
+    """Run every stage in one workspace, skipping stages a resumed run already completed.
+    
+    stage_names limits the run to those stages. journey_steps_file gives
+    journey steps to use instead of discovering them in this workspace.
+    """
+    manifest_dir = get_manifest_dir(workspace)
+    manifest = RunManifest.load(manifest_dir) if resume else None
+    
+    if manifest is None:
+        if resume:
+            print("No previous run found, starting a new run")
+        
         # Initialize directories first
-        initialize_directories()
+        initialize_directories(workspace)
+        manifest = RunManifest.start(manifest_dir)
+    else:
+        print(f"Resuming run {manifest.run_id}")
+    
+    def run(spec: StageSpec, inputs: dict):
+        name = spec.name
+        if name == 'analyze_journey_steps' and journey_steps_file:
+            print(f"Using shared journey steps: {journey_steps_file}")
+            manifest.complete_stage(name, journey_steps_file)
+            return journey_steps_file
         
-        # Process the data
-        output_file = pre_process_raw_data()
+        stage = load_stage(name)
+        options = {**stage_options.get(name, {}), **inputs}
+        with get_metrics().stage(name):
+            if name in MANIFEST_STAGES:
+                output = stage(manifest=manifest, workspace=workspace, **options)
+            else:
+                manifest.start_stage(name)
+                output = stage(workspace=workspace, **options)
         
-        # Extract sample reviews
-        sample_file = extract_sample_reviews()
+        if name == 'summarize_review' and manifest.failed_reviews:
+            # Leave incomplete so --resume retries the failed reviews
+            print(f"{len(manifest.failed_reviews)} reviews failed, run with --resume to retry them")
+        else:
+            manifest.complete_stage(name, output)
+        return output
+    
+    # Once a stage runs, every stage depending on it runs again on its output
+    stages = pipeline_stages(stage_names, journey_steps_file)
+    completed = {spec.name: manifest.stage_output(spec.name) for spec in stages
+                 if manifest.is_stage_complete(spec.name)}
+    if journey_steps_file and completed.get('analyze_journey_steps') != journey_steps_file:
+        # Stages summarized with other steps run again with the shared ones
+        completed.pop('analyze_journey_steps', None)
+    run_stage_graph(stages, run, completed)
+    return manifest
+
+def main(resume: bool = False, batch_backend: str = None, local_classifier: bool = False,
+         map_reduce_steps: bool = False, prometheus: bool = False, graph_mode: str = None,
+         stream_interval: float = None):
+    manifest = None
+    try:
+        stage_options = stage_options_for(batch_backend, local_classifier, map_reduce_steps, graph_mode,
+                                          stream_interval)
+        manifest = run_pipeline(get_workspace(), stage_options, resume)
         
-        # Analyze journey steps
-        journey_file = analyze_journey_steps()
+    except Exception as e:
+        print(f"Error: {str(e)}")
+    
+    finally:
+        write_report({
+            'runId': manifest.run_id if manifest else None,
+            'scheduler': get_scheduler().stats
+        }, prometheus)
 
-        # Summarize review
-        summary_file = summarize_review()
+def run_stage(name: str, stage_options: dict, brand: str = None, prometheus: bool = False):
+    """Run one stage on the latest output of the stages before it"""
+    try:
+        workspace = Workspace.for_brand(brand) if brand else get_workspace()
+        with get_metrics().stage(name):
+            output = load_stage(name)(workspace=workspace, **stage_options.get(name, {}))
+        print(f"{name} output: {output}")
+        
+    except Exception as e:
+        print(f"Error: {str(e)}")
+    
+    finally:
+        write_report({'stage': name, 'brand': brand, 'scheduler': get_scheduler().stats}, prometheus)
 
-        # Count ratings by step
-        count_ratings_by_step()
+def search_reviews(text: str = None, steps: list = None, ratings: list = None, periods: list = None,
+                   all_terms: bool = False, limit: int = None, brand: str = None):
+    """Print the reviews in the latest search index matching every given filter"""
+    from functions.search_index import DEFAULT_LIMIT, SearchIndex, get_latest_search_index
+    try:
+        workspace = Workspace.for_brand(brand) if brand else get_workspace()
+        index = SearchIndex(get_latest_search_index(workspace))
+        result = index.search(text, steps, ratings, periods, all_terms, limit or DEFAULT_LIMIT)
+        
+        print(f"{result['total']} of {len(index)} reviews match ({result['milliseconds']}ms)")
+        for name, counts in result['facets'].items():
+            print(f"{name}: " + ', '.join(f"{value} ({count})" for value, count in counts.items()))
+        for review in result['reviews']:
+            print(f"\n[{review['reviewRatingScore']}] {review['reviewTitle']} "
+                  f"({review['journeyStep']}, {review['reviewDateOfExperience']})")
+            print(review['reviewSummary'] or review['reviewDescription'])
+        
+    except Exception as e:
+        print(f"Error: {str(e)}")
 
-        # Generate graph
-        generate_graph()
+def run_brand(workspace: Workspace, stage_options: dict, resume: bool = False, journey_steps_file: str = None):
+    """Run one brand's pipeline, returning its run id or None if it failed"""
+    try:
+        return run_pipeline(workspace, stage_options, resume, journey_steps_file=journey_steps_file).run_id
+    except Exception as e:
+        print(f"Error in {workspace.name}: {str(e)}")
+        return None
+
+def discover_shared_steps(workspace: Workspace, stage_options: dict, resume: bool = False) -> str:
+    """Discover journey steps from one brand's reviews for every brand to use"""
+    manifest = run_pipeline(workspace, stage_options, resume, stage_names=STEP_DISCOVERY_STAGES)
+    return manifest.stage_output('analyze_journey_steps')
 
+def run_brands(brands: list, resume: bool = False, batch_backend: str = None, local_classifier: bool = False,
+               map_reduce_steps: bool = False, prometheus: bool = False, graph_mode: str = None,
+               stream_interval: float = None, steps_from: str = None):
+    """Run the pipeline for several brands at once and compare their step ratings.
+    
+    Each brand reads its raw exports from and writes its output to its own
+    workspace under data/brands. Summary cache, rate budget and run report
+    are shared by every brand.
+    
+    By default each brand discovers its own journey steps, so the comparison
+    only lines up steps whose titles happen to match. With steps_from, steps
+    are discovered once from that brand's reviews and every brand's reviews
+    are assigned to them.
+    """
+    run_ids = {}
+    comparison = None
+    journey_steps_file = None
+    try:
+        stage_options = stage_options_for(batch_backend, local_classifier, map_reduce_steps, graph_mode,
+                                          stream_interval)
+        workspaces = [Workspace.for_brand(brand) for brand in dict.fromkeys(brands)]
+        
+        steps_workspace = Workspace.for_brand(steps_from) if steps_from else None
+        if steps_workspace:
+            journey_steps_file = discover_shared_steps(steps_workspace, stage_options, resume)
+        
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_BRANDS) as executor:
+            # The brand steps came from resumes the run that discovered them
+            futures = [executor.submit(run_brand, workspace, stage_options,
+                                       resume or (steps_workspace is not None
+                                                  and workspace.data_dir == steps_workspace.data_dir),
+                                       journey_steps_file)
+                       for workspace in workspaces]
+            run_ids = {workspace.name: future.result() for workspace, future in zip(workspaces, futures)}
+        
+        from functions.compare_brands import compare_brands
+        comparison = compare_brands(workspaces)
+        print(f"Brand comparison saved to {comparison}")
         
     except Exception as e:
         print(f"Error: {str(e)}")
+    
+    finally:
+        write_report({
+            'runIds': run_ids,
+            'brandComparison': comparison,
+            'sharedJourneySteps': journey_steps_file,
+            'scheduler': get_scheduler().stats
+        }, prometheus)
+
+def add_stage_arguments(parser: argparse.ArgumentParser, stage: str = None):
+    """Add the options of one stage, or of every stage when stage is None"""
+    if stage in (None, 'summarize_review'):
+        parser.add_argument('--batch', nargs='?', const='openai', choices=BATCH_BACKENDS,
+                            help="summarize reviews as an offline Batch API job (default backend: openai)")
+        parser.add_argument('--local-classifier', action='store_true',
+                            help="assign journey steps locally, sending only uncertain reviews to the model")
+        parser.add_argument('--stream-interval', type=float, metavar='SECONDS',
+                            help="count summaries as they complete, refreshing partial ratings and a chart "
+                                 "every SECONDS")
+    if stage in (None, 'analyze_journey_steps'):
+        parser.add_argument('--map-reduce-steps', action='store_true',
+                            help="discover journey steps from shards of every review instead of one sample")
+    if stage in (None, 'generate_graph'):
+        parser.add_argument('--graph-mode', choices=GRAPH_MODES,
+                            help="write an interactive plotly page, a data payload page or a static SVG")
+    if stage == 'count_ratings_by_step':
+        parser.add_argument('--bucket', choices=list(BUCKET_UNITS),
+                            help="also count ratings per day, week, month or year")
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command line parser, with one subcommand per stage"""
+    parser = argparse.ArgumentParser(
+        description="Analyze Trustpilot reviews by customer journey step. "
+                    "Without a subcommand every stage runs in order."
+    )
+    parser.add_argument('--resume', action='store_true',
+                        help="continue the previous run from the first incomplete stage")
+    add_stage_arguments(parser)
+    parser.add_argument('--dry-run', action='store_true',
+                        help="estimate the tokens and cost of a run without calling the API")
+    parser.add_argument('--prometheus', action='store_true',
+                        help="also write the run report in the Prometheus text format")
+    parser.add_argument('--brands', nargs='+', metavar='BRAND',
+                        help="analyze each brand's exports in data/brands/<brand> concurrently and compare them")
+    parser.add_argument('--steps-from', metavar='BRAND',
+                        help="with --brands, discover journey steps once from BRAND's reviews and use them "
+                             "for every brand so their step ratings line up")
+    
+    subparsers = parser.add_subparsers(dest='stage', metavar='STAGE',
+                                       help="run a single stage on the latest output of the stages before it, or search reviews")
+    for spec in STAGES:
+        name = spec.name
+        stage_parser = subparsers.add_parser(name, help=f"run only {name}")
+        add_stage_arguments(stage_parser, name)
+        stage_parser.add_argument('--brand', help="use the workspace in data/brands/<brand>")
+    
+    search_parser = subparsers.add_parser('search', help="query the latest search index of summarized reviews")
+    search_parser.add_argument('text', nargs='?', help="match reviews mentioning any of these words")
+    search_parser.add_argument('--all-terms', action='store_true', help="match reviews mentioning every word")
+    search_parser.add_argument('--step', nargs='+', dest='steps', metavar='STEP', help="journey steps to match")
+    search_parser.add_argument('--rating', nargs='+', dest='ratings', type=int, choices=range(1, 6),
+                               metavar='RATING', help="star ratings to match")
+    search_parser.add_argument('--period', nargs='+', dest='periods', metavar='YYYY-MM',
+                               help="months of experience to match")
+    search_parser.add_argument('--limit', type=int, help="number of reviews to show")
+    search_parser.add_argument('--brand', help="use the workspace in data/brands/<brand>")
+    return parser
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.stage and (args.resume or args.dry_run or args.brands):
+        parser.error("--resume, --dry-run and --brands apply to full runs, not single stages")
+    if args.brands and args.dry_run:
+        parser.error("--dry-run estimates a single run and cannot be combined with --brands")
+    if args.steps_from and not args.brands:
+        parser.error("--steps-from shares journey steps between brands and requires --brands")
+    
+    if args.stage == 'search':
+        search_reviews(args.text, args.steps, args.ratings, args.periods, args.all_terms, args.limit, args.brand)
+    elif args.stage:
+        # Stage options are given after the subcommand
+        stage_options = stage_options_for(args.batch, args.local_classifier, args.map_reduce_steps, args.graph_mode,
+                                          args.stream_interval)
+        if getattr(args, 'bucket', None):
+            stage_options['count_ratings_by_step'] = {'bucket': args.bucket}
+        run_stage(args.stage, stage_options, brand=args.brand, prometheus=args.prometheus)
+    elif args.brands:
+        run_brands(args.brands, resume=args.resume, batch_backend=args.batch, local_classifier=args.local_classifier,
+                   map_reduce_steps=args.map_reduce_steps, prometheus=args.prometheus, graph_mode=args.graph_mode,
+                   stream_interval=args.stream_interval, steps_from=args.steps_from)
+    elif args.dry_run:
+        dry_run("batch_api" if args.batch else None, "map_reduce" if args.map_reduce_steps else None,
+                prometheus=args.prometheus)
+    else:
+        main(resume=args.resume, batch_backend=args.batch, local_classifier=args.local_classifier,
+             map_reduce_steps=args.map_reduce_steps, prometheus=args.prometheus, graph_mode=args.graph_mode,
+             stream_interval=args.stream_interval)
@@ -0,0 +1,55 @@
+import os
+import unittest
+
+import numpy as np
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.aggregate_ratings import (
+    bucketed_rating_matrix,
+    matrix_from_ratings,
+    rating_matrix,
+    summarize_matrix
+)
+from src.functions.review_store import MISSING_DATE, date_to_day
+
+
+class TestAggregateRatings(unittest.TestCase):
+
+    def test_rating_matrix_ignores_unknown_steps_and_ratings(self):
+        steps = np.array([0, 0, 1, 2, -1, 1], dtype=np.int16)
+        ratings = np.array([1, 5, 5, 3, 4, 0], dtype=np.uint8)
+
+        matrix = rating_matrix(steps, ratings, 2)
+
+        self.assertEqual(matrix.tolist(), [[1, 0, 0, 0, 1], [0, 0, 0, 0, 1]])
+
+    def test_summary_matches_graph_normalization(self):
+        matrix = np.array([[0, 0, 0, 0, 4], [1, 0, 0, 0, 1], [0, 0, 0, 0, 0], [2, 0, 1, 0, 0]])
+
+        summary = summarize_matrix(matrix)
+
+        self.assertEqual(summary['totals'].tolist(), [4, 2, 0, 3])
+        self.assertEqual(summary['normalized'].tolist(), [1.0, 0.0, 0.0, -0.7])
+
+    def test_monthly_buckets_include_empty_periods(self):
+        days = np.array([date_to_day("2025-01-05"), date_to_day("2025-03-20"), MISSING_DATE], dtype=np.int32)
+        steps = np.array([0, 1, 0], dtype=np.int16)
+        ratings = np.array([1, 5, 3], dtype=np.uint8)
+
+        labels, counts = bucketed_rating_matrix(steps, ratings, days, 2, 'month')
+
+        self.assertEqual(labels, ['2025-01', '2025-02', '2025-03'])
+        self.assertEqual(counts.shape, (3, 2, 5))
+        self.assertEqual(int(counts.sum()), 2)
+        self.assertEqual(counts[2, 1, 4], 1)
+
+    def test_matrix_from_saved_ratings(self):
+        steps, matrix = matrix_from_ratings({"Booking": {"1": 12, "5": 3}, "Boarding": {}})
+
+        self.assertEqual(steps, ["Booking", "Boarding"])
+        self.assertEqual(matrix.tolist(), [[12, 0, 0, 0, 3], [0, 0, 0, 0, 0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+import openai
+from openai.types.chat import ChatCompletion
+
+from src.functions import batch_api
+from src.functions.batch_api import LocalBatchClient, build_batch_request, run_batch_requests
+from src.functions.instrumentation import estimate_cost, get_metrics
+from src.functions.request_scheduler import RequestScheduler
+from src.functions.summarize_review import summarize_with_batch_api
+
+JOURNEY_STEPS = {"journeySteps": ["Booking flights", "Boarding the plane"]}
+
+
+def make_completion(content):
+    return ChatCompletion.model_validate({
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4-turbo-preview",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 1000, "completion_tokens": 100, "total_tokens": 1100}
+    })
+
+
+class FakeCompletions:
+    """Sync stand-in for client.chat.completions that fails on request"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = 0
+
+    def create(self, model, messages, **kwargs):
+        self.calls += 1
+        review_text = messages[-1]['content'].rsplit('Review: ', 1)[1]
+        if review_text in self.failing:
+            raise ValueError(f"cannot summarize {review_text}")
+        return make_completion(json.dumps({
+            "reviewSummary": f"Summary of {review_text}",
+            "journeyStep": "Booking flights"
+        }))
+
+
+def make_reviews(count):
+    return [{"reviewDescription": f"review {i}", "reviewRatingScore": 1} for i in range(count)]
+
+
+class TestLocalBatchApi(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.job_dir = temp_dir.name
+        self.completions = FakeCompletions(failing={"review 2"})
+        chat_client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+        self.client = LocalBatchClient(chat_client, root_dir=os.path.join(self.job_dir, 'local'))
+
+    def run_requests(self, requests):
+        return run_batch_requests(self.client, requests, job_dir=self.job_dir, poll_interval=0)
+
+    def test_results_map_back_by_custom_id(self):
+        requests = [
+            build_batch_request(custom_id, {"model": "m", "messages": [{"role": "user", "content": f"Review: {text}"}]})
+            for custom_id, text in [("b", "review 1"), ("a", "review 2"), ("c", "review 3")]
+        ]
+
+        results = self.run_requests(requests)
+
+        self.assertEqual(set(results), {"a", "b", "c"})
+        self.assertIn("review 1", results["b"]['choices'][0]['message']['content'])
+        self.assertIsInstance(results["a"], RuntimeError)
+        self.assertIn("cannot summarize review 2", str(results["a"]))
+
+    def test_identical_job_reuses_submitted_batch(self):
+        requests = [build_batch_request("1", {"model": "m", "messages": [{"role": "user", "content": "Review: review 1"}]})]
+
+        self.run_requests(requests)
+        self.run_requests(requests)
+
+        self.assertEqual(self.completions.calls, 1)
+        self.assertEqual(len(os.listdir(os.path.join(self.job_dir, 'local', 'batches'))), 1)
+
+    def test_local_usage_is_priced_as_batch_usage(self):
+        model = "gpt-4o-local-batch-test"
+        requests = [build_batch_request("1", {"model": model, "messages": [{"role": "user", "content": "Review: review 1"}]})]
+
+        self.run_requests(requests)
+
+        totals = get_metrics().models[model]
+        self.assertEqual((totals['calls'], totals['promptTokens']), (1, 1000))
+        self.assertAlmostEqual(totals['costUsd'], estimate_cost(model, 1000, 100, batch=True))
+
+    def test_summaries_are_returned_in_input_order(self):
+        reviews = make_reviews(4)
+        results = summarize_with_batch_api(self.client, reviews, JOURNEY_STEPS, job_dir=self.job_dir)
+
+        self.assertEqual(results[0]['reviewSummary'], "Summary of review 0")
+        self.assertEqual(results[3]['reviewSummary'], "Summary of review 3")
+        self.assertIsInstance(results[2], Exception)
+        self.assertEqual(results[3]['reviewDescription'], "review 3")
+
+    def test_summaries_are_handed_on_in_groups_as_output_is_read(self):
+        groups = []
+
+        with mock.patch.object(batch_api, 'RESULT_GROUP_SIZE', 2):
+            results = summarize_with_batch_api(self.client, make_reviews(4), JOURNEY_STEPS, job_dir=self.job_dir,
+                                               on_results=lambda indices, group: groups.append((indices, group)))
+
+        self.assertGreater(len(groups), 1)
+        self.assertTrue(all(len(indices) <= 2 for indices, _ in groups))
+        self.assertEqual(sorted(index for indices, _ in groups for index in indices), [0, 1, 2, 3])
+        for indices, group in groups:
+            self.assertEqual(group, [results[index] for index in indices])
+
+    def test_compaction_is_recorded_for_answered_requests(self):
+        before = get_metrics().compaction.get('none', {}).get('prompts', 0)
+
+        summarize_with_batch_api(self.client, make_reviews(4), JOURNEY_STEPS, job_dir=self.job_dir)
+
+        self.assertEqual(get_metrics().compaction['none']['prompts'] - before, 3)
+
+    def test_transient_poll_and_download_failures_are_retried(self):
+        failures = {
+            'retrieve': openai.APIConnectionError(request=mock.Mock()),
+            'content': openai.InternalServerError("Server error", response=mock.Mock(status_code=500, headers={}), body=None)
+        }
+
+        def fail_once(name, method):
+            def call(*args, **kwargs):
+                if name in failures:
+                    raise failures.pop(name)
+                return method(*args, **kwargs)
+            return call
+
+        self.client.batches.retrieve = fail_once('retrieve', self.client.batches.retrieve)
+        self.client.files.content = fail_once('content', self.client.files.content)
+        scheduler = RequestScheduler(base_backoff=0.01)
+        requests = [build_batch_request("1", {"model": "m", "messages": [{"role": "user", "content": "Review: review 1"}]})]
+
+        with mock.patch.object(batch_api, 'get_scheduler', lambda: scheduler):
+            results = self.run_requests(requests)
+
+        self.assertIn("review 1", results["1"]['choices'][0]['message']['content'])
+        self.assertEqual(failures, {})
+        self.assertEqual(scheduler.stats['retries'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.compare_brands import compare_brands
+from src.functions.summary_cache import get_cache_path
+from src.functions.workspace import Workspace, brand_slug
+
+RATINGS = {
+    "Acme Air": {"journeySteps": {"Booking": {"1": 1, "5": 3}, "Boarding": {"2": 2}}},
+    "Zed Rail": {"journeySteps": {"Booking": {"4": 2}, "Refunds": {"1": 4}}}
+}
+
+
+class TestCompareBrands(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Workspace(self.temp_dir.name)
+        self.workspaces = [Workspace.for_brand(brand, self.temp_dir.name) for brand in RATINGS]
+        for workspace in self.workspaces:
+            with open(os.path.join(workspace.directory('ratings-by-step'), 'ratings_by_step_1.json'), 'w') as f:
+                json.dump(RATINGS[workspace.name], f)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_brand_workspaces_are_separate_but_share_caches(self):
+        acme, zed = self.workspaces
+
+        self.assertEqual(brand_slug("Acme Air!"), "acme-air")
+        self.assertNotEqual(acme.path('journey-steps'), zed.path('journey-steps'))
+        self.assertEqual(get_cache_path(acme), get_cache_path(zed))
+        self.assertEqual(get_cache_path(acme), get_cache_path(self.root))
+
+    def test_steps_are_lined_up_across_brands(self):
+        with open(compare_brands(self.workspaces, self.root)) as f:
+            comparison = json.load(f)
+
+        self.assertEqual(comparison['brands'], ["Acme Air", "Zed Rail"])
+        self.assertEqual(list(comparison['steps']), ["Booking", "Boarding", "Refunds"])
+        self.assertEqual(comparison['steps']['Booking']['Acme Air'], {'total': 4, 'mean': 4.0, 'normalized': 0.5})
+        self.assertEqual(comparison['steps']['Booking']['Zed Rail']['mean'], 4.0)
+        self.assertIsNone(comparison['steps']['Refunds']['Acme Air'])
+
+    def test_brands_without_ratings_are_left_out(self):
+        missing = Workspace.for_brand("Nobody", self.temp_dir.name)
+
+        with open(compare_brands(self.workspaces + [missing], self.root)) as f:
+            self.assertEqual(json.load(f)['brands'], ["Acme Air", "Zed Rail"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import random
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.dedupe_reviews import (
+    HASH_PRIME,
+    MinHasher,
+    fan_out_summaries,
+    find_duplicate_clusters,
+    group_duplicates,
+    shingle_hashes,
+    summarize_clusters
+)
+
+COMPLAINT = ("The flight was delayed for three hours and nobody at the gate told us anything, "
+             "then our bags were left behind in Madrid and took four days to arrive")
+
+
+def random_text(rng, words=30):
+    return ' '.join(f"word{rng.randrange(10000)}" for _ in range(words))
+
+
+class TestFindDuplicateClusters(unittest.TestCase):
+
+    def test_exact_duplicates_ignore_case_and_punctuation(self):
+        representatives, counts = find_duplicate_clusters(["Great service!", "great   service", "Awful"])
+
+        self.assertEqual(representatives, [0, 0, 2])
+        self.assertEqual(counts, {'exactDuplicates': 1, 'nearDuplicates': 0})
+
+    def test_near_duplicates_join_the_earliest_review(self):
+        rng = random.Random(1)
+        texts = [random_text(rng), COMPLAINT, random_text(rng), COMPLAINT + " again", random_text(rng)]
+
+        representatives, counts = find_duplicate_clusters(texts)
+
+        self.assertEqual(representatives, [0, 1, 2, 1, 4])
+        self.assertEqual(counts['nearDuplicates'], 1)
+
+    def test_dissimilar_reviews_stay_apart(self):
+        rng = random.Random(2)
+        texts = [random_text(rng) for _ in range(500)]
+
+        representatives, _ = find_duplicate_clusters(texts)
+
+        self.assertEqual(representatives, list(range(500)))
+
+    def test_report_counts_savings(self):
+        representatives, counts = find_duplicate_clusters(["a b", "A b.", "c d", "a b"])
+        clusters, report = summarize_clusters(["r1", "r2", "r3", "r4"], representatives, counts)
+
+        self.assertEqual(clusters, [{'representativeId': "r1", 'size': 3, 'memberIds': ["r2", "r4"]}])
+        self.assertEqual(report['requestsSaved'], 2)
+        self.assertEqual(report['savingsRate'], 0.5)
+        self.assertEqual(report['clusterSizes'], {'3': 1})
+
+
+class TestMinHasher(unittest.TestCase):
+
+    def test_signature_matches_exact_universal_hash(self):
+        minhasher = MinHasher(num_permutations=8)
+        hashes = shingle_hashes(COMPLAINT)
+        hashes[0] = (1 << 32) - 1  # Largest crc32 value, above HASH_PRIME
+
+        expected = [
+            min((int(a) * (int(x) % HASH_PRIME) + int(b)) % HASH_PRIME for x in hashes)
+            for a, b in zip(minhasher.a, minhasher.b)
+        ]
+
+        self.assertEqual(minhasher.signature(hashes).tolist(), expected)
+
+
+class TestFanOut(unittest.TestCase):
+
+    def test_members_receive_the_representative_summary(self):
+        reviews = [
+            {"reviewId": "r2", "reviewDescription": "dup", "reviewRatingScore": 2},
+            {"reviewId": "r1", "reviewDescription": "dup", "reviewRatingScore": 1},
+            {"reviewId": "r3", "reviewDescription": "other", "reviewRatingScore": 5}
+        ]
+        # r1 represents the cluster but is not first here, so r2 stands in
+        representatives, members = group_duplicates(reviews, {"r2": "r1"})
+
+        self.assertEqual([r["reviewId"] for r in representatives], ["r2", "r3"])
+
+        summarized = dict(representatives[0], reviewSummary="Summary", journeyStep="Booking flights")
+        expanded = fan_out_summaries([summarized], members)
+
+        self.assertEqual([r["reviewId"] for r in expanded], ["r2", "r1"])
+        self.assertEqual(expanded[1]["reviewSummary"], "Summary")
+        self.assertEqual(expanded[1]["reviewRatingScore"], 1)
+        self.assertEqual(expanded[1]["reviewDescription"], "dup")
+
+
+if __name__ == '__main__':
+    unittest.main()
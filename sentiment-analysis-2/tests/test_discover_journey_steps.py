@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions import discover_journey_steps as discover_module
+from src.functions.discover_journey_steps import (
+    MAX_CONCURRENT_SHARDS,
+    build_shards,
+    discover_steps_async,
+    map_shards,
+    merge_candidates,
+    parse_reduce_response
+)
+from src.functions.request_scheduler import INITIAL_CONCURRENCY, RequestScheduler
+from src.functions.review_sampling import estimate_review_tokens
+
+SHARD_STEPS = {
+    "book": [{"step": "Booking flights", "mentions": 3}, {"step": "Boarding", "mentions": 1}],
+    "bag": [{"step": "booking a flight", "mentions": 2}, {"step": "Collecting luggage", "mentions": 4}],
+    "lost": [{"step": "Reporting lost luggage", "mentions": 1}],
+}
+
+
+class FakeCompletions:
+    """Async stand-in answering map prompts by shard content and reduce prompts by candidate id"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.map_calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, model, messages, **kwargs):
+        prompt = messages[-1]['content']
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        if 'Candidates:' in prompt:
+            candidates = json.loads(prompt.rsplit('Candidates:\n', 1)[1])
+            by_key = {}
+            for candidate in candidates:
+                key = "Booking flights" if "book" in candidate['step'].lower() else candidate['step']
+                by_key.setdefault(key, []).append(candidate['id'])
+            content = {"journeySteps": [{"step": step, "candidates": ids} for step, ids in by_key.items()]}
+        else:
+            self.map_calls += 1
+            reviews = json.loads(prompt.rsplit('Reviews:\n', 1)[1])
+            word = reviews[0].split()[0]
+            content = {"steps": SHARD_STEPS[word]}
+        message = SimpleNamespace(content=json.dumps(content))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def fake_client(latency=0.0):
+    return SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(latency)))
+
+
+class TestDiscoverJourneySteps(unittest.TestCase):
+
+    def test_shards_respect_token_budget_and_cap(self):
+        reviews = [
+            {"reviewDescription": "x" * 400, "reviewRatingScore": i % 5 + 1, "reviewDateOfExperience": "2024-01-01"}
+            for i in range(100)
+        ]
+        shards = build_shards(reviews, shard_budget=1000, max_shards=5)
+
+        self.assertEqual(len(shards), 5)
+        per_shard = 1000 // estimate_review_tokens(reviews[0])
+        self.assertTrue(all(len(shard) == per_shard for shard in shards))
+
+    def test_merge_combines_reworded_titles(self):
+        merged = merge_candidates([SHARD_STEPS["book"], SHARD_STEPS["bag"]])
+
+        booking = [candidate for candidate in merged if candidate['step'] == "Booking flights"]
+        self.assertEqual(len(merged), 3)
+        self.assertEqual(booking[0]['mentions'], 5)
+        self.assertEqual(booking[0]['shards'], {0, 1})
+
+    def test_reduce_ignores_unknown_and_repeated_ids(self):
+        candidates = merge_candidates([SHARD_STEPS["book"], SHARD_STEPS["bag"]])
+        content = json.dumps({"journeySteps": [
+            {"step": "Booking", "candidates": [1, 99]},
+            {"step": "Luggage", "candidates": [1, 2]}
+        ]})
+
+        reduced = parse_reduce_response(content, candidates)
+
+        self.assertEqual([step['mentions'] for step in reduced], [candidates[0]['mentions'], candidates[1]['mentions']])
+
+    def test_map_reduce_counts_step_frequencies(self):
+        shards = [["book a"], ["bag b"], ["lost c"]]
+
+        discovery = asyncio.run(discover_steps_async(shards, client=fake_client()))
+
+        self.assertEqual(discovery['journeySteps'][0], "Booking flights")
+        frequencies = {step['step']: (step['mentions'], step['shards']) for step in discovery['steps']}
+        self.assertEqual(frequencies["Booking flights"], (5, 2))
+        # A step proposed by a single shard survives the reduce
+        self.assertEqual(frequencies["Reporting lost luggage"], (1, 1))
+
+    def test_wall_clock_is_bounded_by_slowest_shard(self):
+        shards = [["book a"]] * 12
+        client = fake_client(latency=0.2)
+
+        start = time.perf_counter()
+        asyncio.run(discover_steps_async(shards, client=client))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(client.chat.completions.map_calls, 12)
+        # One concurrent map round plus one reduce request
+        self.assertLess(elapsed, 1.0)
+
+    def test_every_shard_slot_is_used_from_the_start(self):
+        client = fake_client(latency=0.05)
+        scheduler = RequestScheduler(concurrency=INITIAL_CONCURRENCY)
+
+        with mock.patch.object(discover_module, 'get_scheduler', lambda: scheduler):
+            asyncio.run(map_shards(client, [["book a"]] * MAX_CONCURRENT_SHARDS))
+
+        self.assertGreater(MAX_CONCURRENT_SHARDS, INITIAL_CONCURRENCY)
+        self.assertEqual(client.chat.completions.max_in_flight, MAX_CONCURRENT_SHARDS)
+
+
+if __name__ == '__main__':
+    unittest.main()
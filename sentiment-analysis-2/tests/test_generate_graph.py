@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.generate_graph import PLOTLY_BUNDLE, load_graph_data, render_svg, write_interactive, write_payload
+
+RATINGS = {"journeySteps": {"Booking <flights>": {"1": 2, "5": 6}, "Boarding": {"3": 1}, "Refunds": {}}}
+
+
+class TestGenerateGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.vis_dir = os.path.join(self.temp_dir.name, 'visualizations')
+        self.asset_dir = os.path.join(self.temp_dir.name, 'assets')
+        os.makedirs(self.vis_dir)
+        os.makedirs(self.asset_dir)
+        ratings_file = os.path.join(self.temp_dir.name, 'ratings_by_step.json')
+        with open(ratings_file, 'w') as f:
+            json.dump(RATINGS, f)
+        self.data = load_graph_data(ratings_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_graph_data(self):
+        self.assertEqual(self.data['totals'], [8, 1, 0])
+        self.assertEqual(self.data['ratings'][4], [6, 0, 0])
+        self.assertEqual(self.data['averages'], [0.5, 0.0, 0.0])
+
+    def test_svg_is_well_formed(self):
+        root = ET.fromstring(render_svg(self.data))
+
+        bars = [rect for rect in root.iter('{http://www.w3.org/2000/svg}rect') if rect.find('{http://www.w3.org/2000/svg}title') is not None]
+        # Two stacked segments and one total bar for Booking, one of each for Boarding
+        self.assertEqual(len(bars), 5)
+        self.assertEqual(len(list(root.iter('{http://www.w3.org/2000/svg}circle'))), 3)
+
+    def test_pages_share_one_bundle(self):
+        payload_page = os.path.join(self.vis_dir, 'journey_visualization_1.html')
+        interactive_page = os.path.join(self.vis_dir, 'journey_visualization_2.html')
+
+        payload_path = write_payload(self.data, payload_page, self.asset_dir)
+        write_interactive(self.data, interactive_page, self.asset_dir)
+
+        self.assertEqual(os.listdir(self.asset_dir), [PLOTLY_BUNDLE])
+        for page in (payload_page, interactive_page):
+            with open(page, encoding='utf-8') as f:
+                html = f.read()
+            self.assertIn(f'src="../assets/{PLOTLY_BUNDLE}"', html)
+            self.assertLess(len(html), 100_000)
+        with open(payload_path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['steps'][0], "Booking <flights>")
+
+    def test_plotly_is_imported_lazily(self):
+        code = "import sys; import src.functions.generate_graph; print('plotly' in sys.modules)"
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                env={**os.environ, 'OPENAI_API_KEY': 'test-key'})
+
+        self.assertEqual(result.stdout.strip().splitlines()[-1], 'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.discover_journey_steps import estimate_shard_usage
+from src.functions.instrumentation import (
+    RunMetrics,
+    estimate_cost,
+    get_metrics,
+    model_prices,
+    write_run_report
+)
+from src.functions.request_scheduler import RequestScheduler
+
+
+def completion(prompt_tokens, completion_tokens):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                            total_tokens=prompt_tokens + completion_tokens)
+    return SimpleNamespace(usage=usage, choices=[])
+
+
+class TestCosts(unittest.TestCase):
+
+    def test_cost_uses_prompt_and_completion_prices(self):
+        self.assertAlmostEqual(estimate_cost("gpt-4o", 1_000_000, 100_000), 2.50 + 1.00)
+
+    def test_batch_requests_are_discounted(self):
+        self.assertAlmostEqual(estimate_cost("gpt-4o", 1_000_000, 0, batch=True), 1.25)
+
+    def test_dated_snapshots_match_the_longest_prefix(self):
+        self.assertEqual(model_prices("gpt-4o-mini-2024-07-18"), model_prices("gpt-4o-mini"))
+        self.assertEqual(model_prices("gpt-4o-2024-08-06"), model_prices("gpt-4o"))
+
+    def test_discovery_estimate_counts_every_shard_and_the_reduce(self):
+        estimate = estimate_shard_usage([["review one"], ["review two"], ["review three"]])
+
+        self.assertEqual(estimate['requests'], 4)
+        self.assertGreater(estimate['costUsd'], 0)
+
+
+class TestRunMetrics(unittest.TestCase):
+
+    def test_calls_are_attributed_to_the_running_stage(self):
+        metrics = RunMetrics()
+        with metrics.stage('summarize_review'):
+            metrics.record_response("gpt-4o", 0.3, completion(100, 20))
+            metrics.record_call("gpt-4o", error=True)
+        metrics.record_call("gpt-4o", prompt_tokens=5)
+
+        report = metrics.report({'runId': 'run-1'})
+
+        stage = report['stages'][0]
+        self.assertEqual((stage['name'], stage['status']), ('summarize_review', 'complete'))
+        self.assertEqual((stage['calls'], stage['errors'], stage['promptTokens']), (2, 1, 100))
+        self.assertEqual(report['totals']['calls'], 3)
+        self.assertEqual(report['models']['gpt-4o']['latency']['count'], 1)
+        self.assertEqual(report['runId'], 'run-1')
+
+    def test_failed_stages_are_reported(self):
+        metrics = RunMetrics()
+        with self.assertRaises(ValueError):
+            with metrics.stage('analyze_journey_steps'):
+                raise ValueError("no steps")
+
+        self.assertEqual(metrics.report()['stages'][0]['status'], 'failed')
+
+    def test_prometheus_histogram_is_cumulative(self):
+        metrics = RunMetrics()
+        for latency in (0.05, 0.3, 4.0):
+            metrics.record_response("gpt-4o", latency, completion(10, 1))
+
+        text = metrics.to_prometheus()
+
+        self.assertIn('openai_requests_total{model="gpt-4o"} 3', text)
+        self.assertIn('openai_request_latency_seconds_bucket{model="gpt-4o",le="0.5"} 2', text)
+        self.assertIn('openai_request_latency_seconds_bucket{model="gpt-4o",le="+Inf"} 3', text)
+
+    def test_report_files(self):
+        metrics = RunMetrics()
+        report = metrics.report()
+        with tempfile.TemporaryDirectory() as report_dir:
+            path = write_run_report(report, metrics.to_prometheus(report), report_dir=report_dir)
+
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(json.load(f)['totals']['calls'], 0)
+            self.assertTrue(os.path.exists(path[:-len('.json')] + '.prom'))
+
+
+class TestSchedulerUsage(unittest.TestCase):
+
+    def test_scheduler_records_response_usage(self):
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+            create=lambda **kwargs: completion(40, 10)
+        )))
+        model = "gpt-4o-mini-instrumentation-test"
+
+        RequestScheduler().create_chat_completion(client, model=model, messages=[{"role": "user", "content": "hi"}])
+
+        totals = get_metrics().report()['models'][model]
+        self.assertEqual((totals['calls'], totals['promptTokens'], totals['completionTokens']), (1, 40, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import asyncio
+import os
+import subprocess
+import sys
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.openai_clients import get_async_client, get_client
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+class TestOpenAIClients(unittest.TestCase):
+
+    def test_entry_point_does_not_load_openai_or_plotly(self):
+        output = subprocess.run(
+            [sys.executable, '-c', "import sys, main, functions; functions.generate_graph; "
+                                   "print(sorted(name for name in ('openai', 'plotly', 'dotenv') if name in sys.modules))"],
+            cwd=SRC_DIR, capture_output=True, text=True, check=True
+        ).stdout
+
+        self.assertEqual(output.strip(), '[]')
+
+    def test_client_is_created_once(self):
+        self.assertIs(get_client(), get_client())
+
+    def test_async_clients_are_kept_per_event_loop(self):
+        async def two_clients():
+            return get_async_client(), get_async_client()
+
+        first, again = asyncio.run(two_clients())
+        other, _ = asyncio.run(two_clients())
+
+        self.assertIs(first, again)
+        self.assertIsNot(first, other)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import json
+import os
+import tempfile
+import unittest
+from collections import defaultdict
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.pre_process_raw_data import (
+    make_review_id,
+    normalize_dates,
+    parse_experience_date,
+    pre_process_raw_data,
+    process_raw_file,
+    summarize_period_counts,
+    update_date_stats
+)
+from src.functions.review_io import iter_reviews
+from src.functions.workspace import Workspace
+
+
+def raw_review(number, title=None, date="January 17, 2025", rating=5):
+    return {
+        "reviewUrl": f"https://example.com/reviews/{number}",
+        "reviewDateOfExperience": date,
+        "reviewTitle": title or f"Review {number}",
+        "reviewDescription": f"Description of review {number}",
+        "reviewRatingScore": rating,
+        "reviewer": "ignored"
+    }
+
+
+class TestPreProcessRawData(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.workspace = Workspace(self.temp_dir.name)
+        self.raw_dir = self.workspace.directory('raw-trustpilot-data')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_export(self, name, reviews):
+        path = os.path.join(self.raw_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(reviews, f)
+        return path
+
+    def test_review_ids_come_from_the_url_or_the_content(self):
+        self.assertEqual(make_review_id(raw_review(1)), make_review_id(raw_review(1, title="Edited")))
+
+        without_url = {key: value for key, value in raw_review(1).items() if key != 'reviewUrl'}
+        self.assertNotEqual(make_review_id(without_url), make_review_id({**without_url, 'reviewRatingScore': 4}))
+
+    def test_overlapping_exports_merge_keeping_the_first_copy(self):
+        self.write_export('a_export.json', [raw_review(1), raw_review(2), raw_review(3)])
+        self.write_export('b_export.json', [raw_review(3, title="Later copy"), raw_review(4), raw_review(1), raw_review(5)])
+
+        output_path = pre_process_raw_data(self.workspace)
+
+        reviews = list(iter_reviews(output_path))
+        self.assertEqual(len(reviews), 5)
+        self.assertEqual([review['reviewTitle'] for review in reviews],
+                         ["Review 1", "Review 2", "Review 3", "Review 4", "Review 5"])
+        self.assertEqual(set(reviews[0]), {'reviewId', 'reviewDateOfExperience', 'reviewTitle',
+                                           'reviewDescription', 'reviewRatingScore'})
+        self.assertEqual(reviews[0]['reviewDateOfExperience'], "2025-01-17")
+
+    def test_per_file_stats_count_each_export(self):
+        input_path = self.write_export('a_export.json', [raw_review(1), raw_review(2, date="sometime")])
+        output_path = os.path.join(self.temp_dir.name, 'part.jsonl')
+
+        stats = process_raw_file(input_path, output_path)
+
+        self.assertEqual(stats['file'], 'a_export.json')
+        self.assertEqual(stats['reviews'], 2)
+        self.assertEqual(stats['dateFailures'], 1)
+        self.assertEqual(stats['dateFailureExamples'], ["sometime"])
+        self.assertGreaterEqual(stats['seconds'], 0)
+        self.assertEqual(len(list(iter_reviews(output_path))), 2)
+
+    def test_date_stats_dedupe_failure_examples_across_files(self):
+        self.write_export('a_export.json', [raw_review(1, date="garbage"), raw_review(2, date="garbage")])
+        self.write_export('b_export.json', [raw_review(3, date="garbage"), raw_review(4, date="March 2, 2024", rating=2)])
+
+        pre_process_raw_data(self.workspace)
+
+        stats_path = self.workspace.latest('pre-processed-raw-data', 'date_stats_*.json')
+        with open(stats_path, encoding='utf-8') as f:
+            date_stats = json.load(f)
+        self.assertEqual(date_stats['parseFailures'], 3)
+        self.assertEqual(date_stats['failedExamples'], ["garbage"])
+        self.assertEqual(date_stats['firstMonth'], "2024-03")
+
+
+class TestDates(unittest.TestCase):
+
+    def test_long_and_iso_dates_are_parsed(self):
+        self.assertEqual(parse_experience_date("January 17, 2025"), "2025-01-17")
+        self.assertEqual(parse_experience_date("Sept. 3 2024"), "2024-09-03")
+        self.assertEqual(parse_experience_date(" 2025-02-28 "), "2025-02-28")
+
+    def test_unparseable_dates_are_rejected(self):
+        for value in ("garbage", "February 30, 2025", "2025-13-01", "Smarch 1, 2025", "", None):
+            self.assertIsNone(parse_experience_date(value))
+
+    def test_repeated_dates_are_parsed_once_and_cached(self):
+        parse_experience_date.cache_clear()
+        values = ["January 17, 2025"] * 3 + ["garbage"] * 2 + ["2025-01-18"]
+
+        normalized, failures = normalize_dates(values)
+
+        self.assertEqual(normalized, ["2025-01-17"] * 3 + ["garbage"] * 2 + ["2025-01-18"])
+        self.assertEqual(failures, ["garbage", "garbage"])
+        self.assertEqual(parse_experience_date.cache_info().misses, 3)
+
+        normalize_dates(["January 17, 2025"])
+        self.assertEqual(parse_experience_date.cache_info().misses, 3)
+
+    def test_period_summary_averages_by_month_and_year(self):
+        period_counts = defaultdict(lambda: defaultdict(int))
+        for date, rating in (("2024-12-01", 1), ("2025-01-05", 5), ("2025-01-20", 4), ("garbage", 3)):
+            update_date_stats(period_counts, {'reviewDateOfExperience': date, 'reviewRatingScore': rating})
+
+        summary = summarize_period_counts(period_counts)
+
+        self.assertEqual((summary['firstMonth'], summary['lastMonth']), ("2024-12", "2025-01"))
+        self.assertEqual(summary['byMonth']['2025-01'], {'reviews': 2, 'averageRating': 4.5, 'ratings': {'4': 1, '5': 1}})
+        self.assertEqual(summary['byYear']['2024']['averageRating'], 1.0)
+        self.assertEqual(summarize_period_counts({})['firstMonth'], None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.instrumentation import RunMetrics
+from src.functions.prompt_compaction import (
+    OMISSION_MARKER,
+    count_tokens,
+    fit_review,
+    fit_reviews,
+    number_steps,
+    step_for_number
+)
+
+STEPS = ["Booking flights", "Boarding the plane", "Collecting baggage"]
+LONG_REVIEW = " ".join(
+    ["We booked a family trip months ahead.", "Our baggage was checked in early."]
+    + [f"Aside{i} remark{i} noted{i}." for i in range(60)]
+    + ["The baggage never arrived and the baggage desk lost our baggage claim twice."]
+)
+
+
+class TestFitReview(unittest.TestCase):
+
+    def test_short_reviews_are_untouched(self):
+        text = "Great flight.\nFriendly crew."
+        self.assertEqual(fit_review(text, 100), text)
+
+    def test_long_reviews_fit_the_budget_and_keep_key_sentences(self):
+        fitted = fit_review(LONG_REVIEW, 60)
+
+        self.assertLessEqual(count_tokens(fitted), 60)
+        self.assertTrue(fitted.startswith("We booked a family trip months ahead."))
+        self.assertIn("baggage claim", fitted)
+        self.assertIn(OMISSION_MARKER, fitted)
+
+    def test_one_long_sentence_is_cut_on_a_word(self):
+        fitted = fit_review("word " * 500, 40)
+
+        self.assertLessEqual(count_tokens(fitted), 40)
+        self.assertTrue(fitted.endswith(OMISSION_MARKER))
+        self.assertNotIn("wor ", fitted)
+
+    def test_reviews_stop_at_the_total_budget(self):
+        fitted = fit_reviews([LONG_REVIEW] * 10, 60, 150)
+
+        self.assertEqual(len(fitted), 150 // (count_tokens(fit_review(LONG_REVIEW, 60)) + 1))
+        self.assertLessEqual(sum(count_tokens(text) for text in fitted), 150)
+
+
+class TestNumberedSteps(unittest.TestCase):
+
+    def test_steps_are_numbered_from_one(self):
+        self.assertEqual(number_steps(STEPS[:2]), "1. Booking flights\n2. Boarding the plane")
+
+    def test_answers_map_back_to_step_titles(self):
+        self.assertEqual(step_for_number(3, STEPS), "Collecting baggage")
+        self.assertEqual(step_for_number("2", STEPS), "Boarding the plane")
+        self.assertEqual(step_for_number("Booking flights", STEPS), "Booking flights")
+
+    def test_unknown_answers_are_rejected(self):
+        for answer in (0, 4, True, "Lounge access", None, 1.5):
+            self.assertIsNone(step_for_number(answer, STEPS))
+
+
+class TestCompactionReport(unittest.TestCase):
+
+    def test_savings_are_reported_per_stage(self):
+        metrics = RunMetrics()
+        with metrics.stage('summarize_review'):
+            metrics.record_compaction(1000, 400, truncated_reviews=2)
+            metrics.record_compaction(200, 200)
+
+        compaction = metrics.report()['promptCompaction']
+
+        self.assertEqual(compaction['stages']['summarize_review']['prompts'], 2)
+        self.assertEqual(compaction['totals']['savedTokens'], 600)
+        self.assertEqual(compaction['totals']['savedPercent'], 50.0)
+        self.assertEqual(compaction['totals']['truncatedReviews'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.ratings_stream import RatingsStream
+from src.functions.workspace import Workspace
+
+STEPS = ["Booking", "Boarding"]
+
+
+def summarized(step, rating):
+    return {'journeyStep': step, 'reviewRatingScore': rating}
+
+
+class TestRatingsStream(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.workspace = Workspace(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read(self, path):
+        with open(path) as f:
+            return json.load(f)
+
+    def test_close_counts_every_queued_review(self):
+        stream = RatingsStream(STEPS, self.workspace, refresh_interval=3600, chart=False)
+        stream.put([summarized("Booking", 5), summarized("Booking", 5)])
+        stream.put([summarized("Boarding", 1), summarized("Unknown step", 3), summarized("Booking", "4")])
+
+        ratings = self.read(stream.close())
+
+        self.assertTrue(ratings['partial'])
+        self.assertEqual(ratings['reviews'], 5)
+        self.assertEqual(ratings['journeySteps'], {"Booking": {"4": 1, "5": 2}, "Boarding": {"1": 1}})
+
+    def test_partial_results_are_refreshed_while_running(self):
+        stream = RatingsStream(STEPS, self.workspace, refresh_interval=0.05)
+        stream.put([summarized("Boarding", 2)])
+
+        deadline = time.monotonic() + 5
+        while stream.refreshes == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(self.read(stream.ratings_path)['journeySteps'], {"Booking": {}, "Boarding": {"2": 1}})
+        live_payload = os.path.join(self.temp_dir.name, 'visualizations', 'journey_visualization_live.json')
+        self.assertEqual(self.read(live_payload)['totals'], [0, 1])
+        stream.close()
+
+    def test_partial_results_do_not_shadow_final_ratings(self):
+        stream = RatingsStream(STEPS, self.workspace, refresh_interval=3600, chart=False)
+        stream.close()
+
+        self.assertIsNone(self.workspace.latest('ratings-by-step', 'ratings_by_step_*.json'))
+
+    def test_full_queue_blocks_producers(self):
+        stream = RatingsStream(STEPS, self.workspace, refresh_interval=3600, queue_size=1, chart=False)
+        stream.add = lambda reviews: time.sleep(0.2)
+
+        start = time.monotonic()
+        for _ in range(3):
+            stream.put([summarized("Booking", 5)])
+
+        # The third group waits for the counter to finish the first
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+        stream.close()
+
+    def test_reviews_are_dropped_after_the_counter_fails(self):
+        stream = RatingsStream(STEPS, self.workspace, refresh_interval=3600, chart=False)
+
+        def fail(reviews):
+            raise ValueError("bad counts")
+        stream.add = fail
+        stream.put([summarized("Booking", 5)])
+        while stream.error is None:
+            time.sleep(0.01)
+
+        stream.put([summarized("Booking", 4), summarized("Boarding", 1)])
+
+        self.assertEqual(stream.dropped, 2)
+        with self.assertRaises(RuntimeError):
+            stream.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
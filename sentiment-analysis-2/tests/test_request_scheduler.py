@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+import openai
+
+from src.functions.request_scheduler import RequestScheduler, TokenBucket, parse_duration
+
+COMPLETION = {
+    "id": "chatcmpl-test",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4-turbo-preview",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "stop",
+        "message": {"role": "assistant", "content": "{\"reviewSummary\": \"ok\", \"journeyStep\": \"Booking flights\"}"}
+    }],
+    "usage": {"prompt_tokens": 40, "completion_tokens": 10, "total_tokens": 50}
+}
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Chat completions endpoint that rate limits the first requests it sees"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.idempotency_keys.append(self.headers.get('Idempotency-Key'))
+            rate_limited = server.requests <= server.rate_limited_requests
+
+        if rate_limited:
+            body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}})
+            self.send_response(429)
+            self.send_header('retry-after-ms', server.retry_after_ms)
+        else:
+            body = json.dumps(COMPLETION)
+            self.send_response(200)
+            self.send_header('x-ratelimit-limit-requests', '600')
+            self.send_header('x-ratelimit-remaining-requests', '599')
+            self.send_header('x-ratelimit-reset-requests', '100ms')
+            self.send_header('x-ratelimit-limit-tokens', '150000')
+            self.send_header('x-ratelimit-remaining-tokens', '149950')
+            self.send_header('x-ratelimit-reset-tokens', '20ms')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestRequestScheduler(unittest.TestCase):
+
+    def start_server(self, rate_limited_requests, retry_after_ms='20'):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), MockOpenAIHandler)
+        server.lock = threading.Lock()
+        server.requests = 0
+        server.rate_limited_requests = rate_limited_requests
+        server.retry_after_ms = retry_after_ms
+        server.idempotency_keys = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def client_for(self, server, client_class=openai.OpenAI):
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        return client_class(api_key='test-key', base_url=base_url, max_retries=0)
+
+    def create(self, scheduler, client):
+        return scheduler.create_chat_completion(
+            client, model="gpt-4-turbo-preview", messages=[{"role": "user", "content": "hi"}]
+        )
+
+    def test_retries_429s_then_succeeds(self):
+        server = self.start_server(rate_limited_requests=2)
+        scheduler = RequestScheduler(base_backoff=0.01)
+
+        response = self.create(scheduler, self.client_for(server))
+
+        self.assertEqual(response.usage.total_tokens, 50)
+        self.assertEqual(server.requests, 3)
+        self.assertEqual(scheduler.stats['retries'], 2)
+        self.assertEqual(scheduler.stats['rateLimited'], 2)
+        # Every attempt of one logical request shares an idempotency key
+        self.assertEqual(len(set(server.idempotency_keys)), 1)
+
+    def test_rate_limits_shrink_concurrency(self):
+        server = self.start_server(rate_limited_requests=3)
+        scheduler = RequestScheduler(base_backoff=0.01, concurrency=16)
+
+        self.create(scheduler, self.client_for(server))
+
+        self.assertLess(scheduler.concurrency, 4)
+
+    def test_concurrency_is_only_raised_before_rate_limits(self):
+        scheduler = RequestScheduler(concurrency=8)
+        scheduler.raise_concurrency(16)
+        self.assertEqual(scheduler.concurrency, 16)
+
+        scheduler.stats['rateLimited'] = 1
+        scheduler.concurrency = 4
+        scheduler.raise_concurrency(16)
+        self.assertEqual(scheduler.concurrency, 4)
+
+    def test_gives_up_after_max_retries(self):
+        server = self.start_server(rate_limited_requests=100)
+        scheduler = RequestScheduler(base_backoff=0.01, max_retries=2)
+
+        with self.assertRaises(openai.RateLimitError):
+            self.create(scheduler, self.client_for(server))
+        self.assertEqual(server.requests, 3)
+        self.assertEqual(scheduler.stats['failures'], 1)
+
+    def test_budgets_follow_response_headers(self):
+        server = self.start_server(rate_limited_requests=0)
+        scheduler = RequestScheduler()
+
+        self.create(scheduler, self.client_for(server))
+
+        self.assertEqual(scheduler.request_bucket.capacity, 600)
+        self.assertEqual(scheduler.token_bucket.capacity, 150000)
+
+    def test_async_client_is_scheduled(self):
+        server = self.start_server(rate_limited_requests=1)
+        scheduler = RequestScheduler(base_backoff=0.01)
+        client = self.client_for(server, openai.AsyncOpenAI)
+
+        async def run():
+            return await asyncio.gather(*(
+                scheduler.acreate_chat_completion(
+                    client, model="gpt-4-turbo-preview", messages=[{"role": "user", "content": "hi"}]
+                )
+                for _ in range(5)
+            ))
+
+        responses = asyncio.run(run())
+
+        self.assertEqual(len(responses), 5)
+        self.assertEqual(server.requests, 6)
+        self.assertEqual(scheduler.in_flight, 0)
+
+    def test_timeout_applies_to_each_attempt_not_backoff(self):
+        server = self.start_server(rate_limited_requests=1, retry_after_ms='300')
+        scheduler = RequestScheduler()
+        client = self.client_for(server, openai.AsyncOpenAI)
+
+        response = asyncio.run(scheduler.acreate_chat_completion(
+            client, timeout=0.2, model="gpt-4-turbo-preview", messages=[{"role": "user", "content": "hi"}]
+        ))
+
+        self.assertEqual(response.usage.total_tokens, 50)
+        self.assertEqual(server.requests, 2)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_wait_time_reflects_refill_rate(self):
+        now = [0.0]
+        bucket = TokenBucket(capacity=60, refill_per_second=1, clock=lambda: now[0])
+        bucket.consume(60)
+
+        self.assertAlmostEqual(bucket.wait_time(10), 10)
+        now[0] = 4.0
+        self.assertAlmostEqual(bucket.wait_time(10), 6)
+        # Requests larger than the bucket wait for a full bucket, not forever
+        self.assertAlmostEqual(bucket.wait_time(1000), 56)
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration('6m0s'), 360)
+        self.assertAlmostEqual(parse_duration('250ms'), 0.25)
+        self.assertEqual(parse_duration('2'), 2)
+        self.assertIsNone(parse_duration('soon'))
+
+
+if __name__ == '__main__':
+    unittest.main()
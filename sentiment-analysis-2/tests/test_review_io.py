@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.review_io import (
+    JsonLinesWriter,
+    iter_json_array,
+    iter_reviews,
+    repair_json_lines,
+    write_json_lines
+)
+
+REVIEWS = [
+    {"reviewTitle": "Great", "reviewDescription": "Lovely crew, éclair on board", "reviewRatingScore": 5},
+    {"reviewTitle": "Awful [delayed]", "reviewDescription": "Lost my bag, \"again\"", "reviewRatingScore": 1},
+    {"reviewTitle": "Fine", "reviewDescription": "", "reviewRatingScore": 3},
+]
+
+
+class TestReviewIO(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_array_elements_split_across_chunks(self):
+        path = self.write('raw.json', json.dumps(REVIEWS, indent=2, ensure_ascii=False))
+
+        for chunk_size in (1, 7, 64, 1 << 16):
+            self.assertEqual(list(iter_json_array(path, chunk_size=chunk_size)), REVIEWS)
+
+    def test_scalars_are_not_cut_at_chunk_boundaries(self):
+        path = self.write('numbers.json', '[12345, 678, -9.5e3]')
+
+        self.assertEqual(list(iter_json_array(path, chunk_size=3)), [12345, 678, -9.5e3])
+
+    def test_empty_array(self):
+        path = self.write('empty.json', ' [ ] ')
+
+        self.assertEqual(list(iter_json_array(path, chunk_size=2)), [])
+
+    def test_truncated_array_raises(self):
+        path = self.write('truncated.json', json.dumps(REVIEWS)[:-20])
+
+        with self.assertRaises(ValueError):
+            list(iter_json_array(path, chunk_size=8))
+
+    def test_json_lines_round_trip(self):
+        path = os.path.join(self.tmp.name, 'reviews.jsonl')
+
+        self.assertEqual(write_json_lines(path, iter(REVIEWS)), 3)
+        self.assertEqual(list(iter_reviews(path)), REVIEWS)
+
+    def test_partially_written_last_line_is_skipped(self):
+        path = self.write('partial.jsonl', json.dumps(REVIEWS[0]) + '\n' + json.dumps(REVIEWS[1])[:15])
+
+        self.assertEqual(list(iter_reviews(path)), [REVIEWS[0]])
+
+    def test_writer_appends_after_repairing_torn_line(self):
+        path = self.write('summaries.jsonl', json.dumps(REVIEWS[0]) + '\n{"reviewTitle": "tor')
+
+        with JsonLinesWriter(path) as writer:
+            self.assertEqual(writer.write_many(REVIEWS[1:]), 2)
+            # Readers see every flushed batch before the writer closes
+            self.assertEqual(list(iter_reviews(path)), REVIEWS)
+
+        self.assertEqual(repair_json_lines(path), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import unittest
+from collections import Counter
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.review_sampling import (
+    StratifiedSampler,
+    estimate_review_tokens,
+    review_period
+)
+
+
+def make_reviews(count, rating, date='2024-02-10', length=40):
+    return [
+        {"reviewDescription": f"{rating}-{i} " + "x" * length, "reviewRatingScore": rating, "reviewDateOfExperience": date}
+        for i in range(count)
+    ]
+
+
+class TestStratifiedSampler(unittest.TestCase):
+
+    def test_ratings_are_balanced_despite_skew(self):
+        reviews = make_reviews(5000, 1) + make_reviews(50, 3) + make_reviews(50, 5)
+        sample = StratifiedSampler().add_all(reviews).sample(token_budget=10 ** 6, max_reviews=90)
+
+        self.assertEqual(Counter(r['reviewRatingScore'] for r in sample), {1: 30, 3: 30, 5: 30})
+
+    def test_periods_follow_their_share_within_a_rating(self):
+        reviews = make_reviews(300, 1, '2024-01-05') + make_reviews(100, 1, '2024-11-05')
+        sample = StratifiedSampler().add_all(reviews).sample(token_budget=10 ** 6, max_reviews=40)
+
+        periods = Counter(review_period(r) for r in sample)
+        self.assertEqual(periods, {'2024-Q1': 30, '2024-Q4': 10})
+
+    def test_same_seed_gives_same_sample(self):
+        reviews = make_reviews(1000, 1) + make_reviews(1000, 2, '2023-06-01')
+
+        first = StratifiedSampler(seed=7).add_all(reviews).sample(10 ** 6, 50)
+        second = StratifiedSampler(seed=7).add_all(reviews).sample(10 ** 6, 50)
+        other = StratifiedSampler(seed=8).add_all(reviews).sample(10 ** 6, 50)
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_sample_fits_token_budget(self):
+        reviews = make_reviews(100, 1, length=400) + make_reviews(100, 2, length=4)
+        budget = 1000
+        sample = StratifiedSampler().add_all(reviews).sample(token_budget=budget)
+
+        self.assertLessEqual(sum(estimate_review_tokens(r) for r in sample), budget)
+        # Short reviews keep filling the budget once long ones stop fitting
+        self.assertGreater(sum(estimate_review_tokens(r) for r in sample), budget * 0.9)
+
+    def test_memory_is_bounded_per_stratum(self):
+        sampler = StratifiedSampler(per_stratum=10).add_all(make_reviews(10000, 4))
+
+        self.assertEqual(len(sampler.reservoirs[('4', '2024-Q1')]), 10)
+        self.assertEqual(sampler.counts[('4', '2024-Q1')], 10000)
+
+    def test_missing_dates_form_their_own_period(self):
+        self.assertEqual(review_period({"reviewDateOfExperience": "January 1, 2025"}), 'unknown')
+        self.assertEqual(review_period({"reviewDateOfExperience": "2025-07-01"}), '2025-Q3')
+
+
+if __name__ == '__main__':
+    unittest.main()
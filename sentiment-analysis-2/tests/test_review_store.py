@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.review_store import ReviewStore, write_review_store
+
+STEPS = ["Booking flights", "Boarding the plane"]
+REVIEWS = [
+    {"reviewId": "a1", "reviewTitle": "Late", "reviewSummary": "Delayed twice.", "reviewDateOfExperience": "2025-01-17",
+     "reviewRatingScore": 1, "journeyStep": "Boarding the plane"},
+    {"reviewId": "b2", "reviewTitle": "Café ☕", "reviewSummary": "", "reviewDateOfExperience": "not a date",
+     "reviewRatingScore": 5, "journeyStep": "Lounge access"},
+]
+
+
+class TestReviewStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        self.assertEqual(write_review_store(iter(REVIEWS), STEPS, self.tmp.name), 2)
+        store = ReviewStore(self.tmp.name)
+
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.ratings.dtype.name, 'uint8')
+        self.assertEqual(store.dates.dtype.name, 'int32')
+        self.assertEqual(store.steps.dtype.name, 'int16')
+        self.assertEqual(store.get_review(0)['reviewSummary'], "Delayed twice.")
+        self.assertEqual(store.get_review(0)['reviewDateOfExperience'], "2025-01-17")
+        self.assertEqual(store.get_text(1, 'reviewTitle'), "Café ☕")
+        self.assertIsNone(store.get_review(1)['reviewDateOfExperience'])
+
+    def test_unknown_steps_are_interned_after_journey_steps(self):
+        write_review_store(iter(REVIEWS), STEPS, self.tmp.name)
+        store = ReviewStore(self.tmp.name)
+
+        self.assertEqual(store.journey_steps, STEPS)
+        self.assertEqual(list(store.steps), [1, 2])
+        self.assertEqual(store.get_review(1)['journeyStep'], "Lounge access")
+
+
+if __name__ == '__main__':
+    unittest.main()
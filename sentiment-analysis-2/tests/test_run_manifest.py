@@ -0,0 +1,212 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions import summarize_review as summarize_module
+from src.functions.ratings_stream import RatingsStream
+from src.functions.review_io import iter_reviews, write_json_lines
+from src.functions.run_manifest import REVIEW_LOG_FILENAME, RunManifest
+from src.functions.step_classifier import StepClassifier
+from src.functions.summarize_review import (EXTRACTIVE_SUMMARY, MAX_REVIEW_ATTEMPTS, MODEL_SUMMARY,
+                                            PROMPT_VERSION, SUMMARY_MODEL, summarize_review)
+from src.functions.summary_cache import SummaryCache, get_cache_path, make_cache_key
+from src.functions.workspace import Workspace
+
+JOURNEY_STEPS = {"journeySteps": ["Booking flights", "Boarding the plane"]}
+
+
+class TestRunManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manifest_dir = os.path.join(self.temp_dir.name, 'run-manifest')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_review_log_is_replayed_ignoring_a_torn_last_line(self):
+        manifest = RunManifest.start(self.manifest_dir)
+        manifest.complete_stage('pre_process_raw_data', 'processed.jsonl')
+        manifest.record_reviews(['r1', 'r2'], ['r3'])
+        manifest.record_reviews(['r2'], ['r3'])
+        with open(os.path.join(self.manifest_dir, REVIEW_LOG_FILENAME), 'a', encoding='utf-8') as f:
+            f.write('{"id": "r4", "sta')
+
+        loaded = RunManifest.load(self.manifest_dir)
+
+        self.assertEqual(loaded.run_id, manifest.run_id)
+        self.assertEqual(loaded.completed_reviews, {'r1', 'r2'})
+        self.assertEqual(loaded.failed_reviews, {'r3': 2})
+        self.assertEqual(loaded.stage_output('pre_process_raw_data'), 'processed.jsonl')
+
+    def test_a_review_done_later_is_no_longer_failed(self):
+        manifest = RunManifest.start(self.manifest_dir)
+        manifest.record_reviews(failed_ids=['r1'])
+        manifest.record_reviews(completed_ids=['r1'])
+
+        self.assertEqual(RunManifest.load(self.manifest_dir).failed_reviews, {})
+
+    def test_there_is_nothing_to_load_before_a_run(self):
+        self.assertIsNone(RunManifest.load(self.manifest_dir))
+
+
+class FlakyCompletions:
+    """Sync stand-in for client.chat.completions failing chosen reviews a number of times"""
+
+    def __init__(self, failures, latency=0.0):
+        self.failures = dict(failures)
+        self.latency = latency
+        self.sent = []
+
+    def create(self, model, messages, **kwargs):
+        review_text = messages[-1]['content'].rsplit('Review: ', 1)[1]
+        self.sent.append(review_text)
+        time.sleep(self.latency)
+        if self.failures.get(review_text, 0) > 0:
+            self.failures[review_text] -= 1
+            raise ValueError(f"failed {review_text}")
+        content = json.dumps({"reviewSummary": f"Summary of {review_text}", "journeyStep": 1})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class InterruptedCompletions:
+    """Async stand-in for client.chat.completions interrupted while one review is in flight"""
+
+    def __init__(self, interrupt_on=None):
+        self.interrupt_on = interrupt_on
+        self.sent = []
+
+    async def create(self, model, messages, **kwargs):
+        review_text = messages[-1]['content'].rsplit('Review: ', 1)[1]
+        self.sent.append(review_text)
+        if review_text == self.interrupt_on:
+            # Let the other requests finish first
+            await asyncio.sleep(0.1)
+            raise KeyboardInterrupt
+        content = json.dumps({"reviewSummary": f"Summary of {review_text}", "journeyStep": 1})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class TestSummarizeReviewProgress(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.workspace = Workspace(self.temp_dir.name)
+        self.input_file = self.workspace.path('reviews.jsonl')
+        write_json_lines(self.input_file, [
+            {"reviewId": f"r{i}", "reviewDescription": f"review {i}", "reviewRatingScore": 3} for i in range(1, 5)
+        ])
+        self.journey_steps_file = self.workspace.path('steps.json')
+        with open(self.journey_steps_file, 'w') as f:
+            json.dump(JOURNEY_STEPS, f)
+        self.clusters_file = self.workspace.path('clusters.jsonl')
+        write_json_lines(self.clusters_file, [])
+        self.manifest = RunManifest.start(self.workspace.path('run-manifest'))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def summarize(self, failures=(), latency=0.0, **options):
+        completions = FlakyCompletions(failures, latency)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        with mock.patch.object(summarize_module, 'get_client', lambda: client):
+            output_path = summarize_review(manifest=self.manifest, workspace=self.workspace,
+                                           input_file=self.input_file, journey_steps_file=self.journey_steps_file,
+                                           clusters_file=self.clusters_file, **options)
+        return completions.sent, [review['reviewId'] for review in iter_reviews(output_path)]
+
+    def test_reviews_marked_done_are_skipped(self):
+        self.manifest.record_reviews(['r1', 'r3'])
+
+        sent, summarized = self.summarize()
+
+        self.assertEqual(sent, ["review 2", "review 4"])
+        self.assertEqual(summarized, ['r2', 'r4'])
+
+    def test_failed_reviews_are_requeued_until_they_succeed(self):
+        sent, summarized = self.summarize({"review 2": 1})
+
+        self.assertEqual(sent.count("review 2"), 2)
+        self.assertEqual(sorted(summarized), ['r1', 'r2', 'r3', 'r4'])
+        self.assertEqual(self.manifest.failed_reviews, {})
+        self.assertIn('r2', self.manifest.completed_reviews)
+
+    def test_reviews_failing_every_attempt_stay_failed_for_resume(self):
+        sent, summarized = self.summarize({"review 2": MAX_REVIEW_ATTEMPTS})
+
+        self.assertEqual(sent.count("review 2"), MAX_REVIEW_ATTEMPTS)
+        self.assertNotIn('r2', summarized)
+        self.assertEqual(self.manifest.failed_reviews, {'r2': MAX_REVIEW_ATTEMPTS})
+
+        # A resumed run sends only the review that failed
+        self.manifest = RunManifest.load(self.manifest.manifest_dir)
+        sent, summarized = self.summarize()
+
+        self.assertEqual(sent, ["review 2"])
+        self.assertEqual(sorted(summarized), ['r1', 'r2', 'r3', 'r4'])
+        self.assertEqual(self.manifest.failed_reviews, {})
+
+    def summarize_async(self, interrupt_on=None):
+        completions = InterruptedCompletions(interrupt_on)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        with mock.patch.object(summarize_module, 'get_client', lambda: client), \
+                mock.patch.object(summarize_module, 'get_async_client', lambda: client):
+            summarize_review(mode="async", manifest=self.manifest, workspace=self.workspace,
+                             input_file=self.input_file, journey_steps_file=self.journey_steps_file,
+                             clusters_file=self.clusters_file)
+        return completions.sent
+
+    def test_an_interrupted_async_run_resumes_from_its_finished_requests(self):
+        with self.assertRaises(KeyboardInterrupt):
+            self.summarize_async(interrupt_on="review 3")
+
+        output_path = self.manifest.stage_output('summarize_review')
+        self.assertEqual(sorted(review['reviewId'] for review in iter_reviews(output_path)), ['r1', 'r2', 'r4'])
+
+        self.manifest = RunManifest.load(self.manifest.manifest_dir)
+        self.assertEqual(self.manifest.completed_reviews, {'r1', 'r2', 'r4'})
+        sent = self.summarize_async()
+
+        self.assertEqual(sent, ["review 3"])
+        self.assertEqual(sorted(review['reviewId'] for review in iter_reviews(output_path)), ['r1', 'r2', 'r3', 'r4'])
+
+    def test_a_failed_ratings_stream_does_not_stop_summarization(self):
+        def fail(stream, reviews):
+            raise ValueError("bad counts")
+
+        with mock.patch.object(RatingsStream, 'add', fail), mock.patch.object(summarize_module, 'BATCH_SIZE', 1):
+            # Slow requests let the counter fail before the next summaries are put
+            sent, summarized = self.summarize(latency=0.05, stream_interval=3600)
+
+        self.assertEqual(len(sent), 4)
+        self.assertEqual(sorted(summarized), ['r1', 'r2', 'r3', 'r4'])
+        self.assertEqual(self.manifest.failed_reviews, {})
+
+    def test_extractive_summaries_are_marked_and_not_cached(self):
+        with mock.patch.object(summarize_module, 'LOCAL_SEED_REVIEWS', 2), \
+                mock.patch.object(StepClassifier, 'is_confident', lambda classifier, confidences: confidences >= 0):
+            sent, _ = self.summarize(local_classifier=True)
+
+        self.assertEqual(sent, ["review 1", "review 2"])
+        output_path = self.manifest.stage_output('summarize_review')
+        sources = {review['reviewId']: review['summarySource'] for review in iter_reviews(output_path)}
+        self.assertEqual(sources, {'r1': MODEL_SUMMARY, 'r2': MODEL_SUMMARY,
+                                   'r3': EXTRACTIVE_SUMMARY, 'r4': EXTRACTIVE_SUMMARY})
+
+        cache = SummaryCache(get_cache_path(self.workspace))
+        cached = {description: cache.get(make_cache_key(SUMMARY_MODEL, PROMPT_VERSION, JOURNEY_STEPS, description))
+                  for description in ("review 1", "review 3")}
+        cache.close()
+        self.assertIsNotNone(cached["review 1"])
+        self.assertIsNone(cached["review 3"])
+
+
+if __name__ == '__main__':
+    unittest.main()
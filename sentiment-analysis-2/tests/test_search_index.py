@@ -0,0 +1,118 @@
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.review_store import ReviewStore, write_review_store
+from src.functions.search_index import SearchIndex, build_postings, write_search_index
+from src.functions.summarize_review import apply_summary
+
+STEPS = ["Check-in", "Refunds"]
+REVIEWS = [
+    {"reviewId": "r1", "reviewTitle": "Lost baggage", "reviewSummary": "Bags went missing.",
+     "reviewDescription": "My baggage was lost at check-in.", "reviewDateOfExperience": "2025-01-17",
+     "reviewRatingScore": 1, "journeyStep": "Check-in"},
+    {"reviewId": "r2", "reviewTitle": "Still waiting", "reviewSummary": "Refund never arrived.",
+     "reviewDescription": "Asked for a refund in January, refunds team silent.", "reviewDateOfExperience": "2025-02-03",
+     "reviewRatingScore": 2, "journeyStep": "Refunds"},
+    {"reviewId": "r3", "reviewTitle": "Quick refund", "reviewSummary": "Refunded in two days.",
+     "reviewDescription": "Great service, refunded quickly.", "reviewDateOfExperience": "2025-02-20",
+     "reviewRatingScore": 5, "journeyStep": "Refunds"},
+    {"reviewId": "r4", "reviewTitle": "Smooth", "reviewSummary": "Easy check-in.",
+     "reviewDescription": "No queue.", "reviewDateOfExperience": None,
+     "reviewRatingScore": 4, "journeyStep": None},
+]
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        store_dir = os.path.join(self.temp_dir.name, 'store')
+        index_dir = os.path.join(self.temp_dir.name, 'index')
+        write_review_store(iter(REVIEWS), STEPS, store_dir)
+        write_search_index(ReviewStore(store_dir), index_dir)
+        self.index = SearchIndex(index_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def ids(self, result):
+        return [review['reviewId'] for review in result['reviews']]
+
+    def test_postings_are_sorted_per_term(self):
+        terms, postings, offsets = build_postings([["b", "a"], ["a"], ["c", "a"]])
+
+        a = terms.index("a")
+        self.assertEqual(postings[offsets[a]:offsets[a + 1]].tolist(), [0, 1, 2])
+        self.assertEqual(offsets[-1], len(postings))
+
+    def test_text_matches_any_term_after_stemming(self):
+        result = self.index.search("refunds baggage")
+
+        self.assertEqual(self.ids(result), ["r1", "r2", "r3"])
+        self.assertEqual(self.ids(self.index.search("refund great", all_terms=True)), ["r3"])
+
+    def test_description_terms_of_summarized_reviews_are_indexed(self):
+        review = {"reviewId": "r5", "reviewTitle": "Delayed", "reviewDescription": "The gate agent lost our stroller.",
+                  "reviewDateOfExperience": "2025-03-01", "reviewRatingScore": 2}
+        summarized = apply_summary(review, {"reviewSummary": "Flight was delayed.", "journeyStep": "Check-in"})
+        store_dir = os.path.join(self.temp_dir.name, 'summarized_store')
+        index_dir = os.path.join(self.temp_dir.name, 'summarized_index')
+        write_review_store(iter(REVIEWS + [summarized]), STEPS, store_dir)
+        write_search_index(ReviewStore(store_dir), index_dir)
+
+        result = SearchIndex(index_dir).search("stroller")
+
+        self.assertEqual(self.ids(result), ["r5"])
+        self.assertEqual(result['reviews'][0]['reviewDescription'], "The gate agent lost our stroller.")
+
+    def test_text_and_facets_combine(self):
+        result = self.index.search("refund baggage", ratings=[1, 2], steps=["Refunds"])
+
+        self.assertEqual(result['total'], 1)
+        self.assertEqual(self.ids(result), ["r2"])
+        self.assertEqual(self.ids(self.index.search(periods=["2025-02"])), ["r2", "r3"])
+
+    def test_facet_counts_cover_all_matches(self):
+        result = self.index.search("refund", limit=1)
+
+        self.assertEqual(len(result['reviews']), 1)
+        self.assertEqual(result['facets']['journeyStep'], {"Refunds": 2})
+        self.assertEqual(result['facets']['reviewRatingScore'], {2: 1, 5: 1})
+        self.assertEqual(result['facets']['period'], {"2025-02": 2})
+
+    def test_unknown_terms_and_values_match_nothing(self):
+        self.assertEqual(self.index.search("xylophone")['total'], 0)
+        self.assertEqual(self.index.search(steps=["Lounge"])['total'], 0)
+        self.assertEqual(self.index.search()['total'], 4)
+
+    def test_combined_filters_on_a_million_reviews_take_milliseconds(self):
+        rng = np.random.default_rng(0)
+        count = 1_000_000
+        index = SearchIndex.__new__(SearchIndex)
+        index.count = count
+        index.facet_values = {'journeyStep': STEPS, 'reviewRatingScore': [1, 2, 3, 4, 5], 'period': []}
+        index.facets = {
+            'journeyStep': np.packbits(rng.random((2, count)) < 0.5, axis=1),
+            'reviewRatingScore': np.packbits(rng.random((5, count)) < 0.2, axis=1),
+            'period': np.zeros((0, (count + 7) // 8), dtype=np.uint8)
+        }
+        index.term_ids = {"refund": 0, "baggag": 1}
+        index.postings = np.concatenate([np.sort(rng.choice(count, 20_000, replace=False)) for _ in range(2)])
+        index.offsets = np.array([0, 20_000, 40_000])
+        index.store = ReviewStore(os.path.join(self.temp_dir.name, 'store'))
+
+        started = time.perf_counter()
+        result = index.search("refund baggage", steps=["Refunds"], ratings=[1, 2], limit=0)
+
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertGreater(result['total'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
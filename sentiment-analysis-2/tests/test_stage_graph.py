@@ -0,0 +1,78 @@
+import os
+import threading
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.stage_graph import StageSpec, check_stage_graph, run_stage_graph
+
+STAGES = [
+    StageSpec('load', 'loader'),
+    StageSpec('dedupe', 'deduper', {'input_file': 'load'}),
+    StageSpec('steps', 'steps', {'input_file': 'load'}),
+    StageSpec('summarize', 'summarizer', {'input_file': 'load', 'clusters_file': 'dedupe', 'steps_file': 'steps'})
+]
+
+
+class TestStageGraph(unittest.TestCase):
+
+    def test_outputs_are_passed_to_dependent_stages(self):
+        calls = {}
+
+        def run(spec, inputs):
+            calls[spec.name] = inputs
+            return f"{spec.name}.out"
+
+        outputs = run_stage_graph(STAGES, run)
+
+        self.assertEqual(outputs['summarize'], "summarize.out")
+        self.assertEqual(calls['summarize'],
+                         {'input_file': "load.out", 'clusters_file': "dedupe.out", 'steps_file': "steps.out"})
+
+    def test_independent_stages_overlap(self):
+        both_started = threading.Barrier(2, timeout=5)
+
+        def run(spec, inputs):
+            if spec.name in ('dedupe', 'steps'):
+                # Fails with BrokenBarrierError unless both stages run at once
+                both_started.wait()
+            return spec.name
+
+        run_stage_graph(STAGES, run)
+
+    def test_completed_stages_are_skipped_unless_an_input_reran(self):
+        ran = []
+
+        def run(spec, inputs):
+            ran.append(spec.name)
+            return f"{spec.name}.new"
+
+        outputs = run_stage_graph(STAGES, run, completed={'load': "load.old", 'dedupe': "dedupe.old"})
+
+        self.assertEqual(sorted(ran), ['steps', 'summarize'])
+        self.assertEqual(outputs['dedupe'], "dedupe.old")
+
+        ran.clear()
+        run_stage_graph(STAGES, run, completed={'dedupe': "dedupe.old", 'steps': "steps.old"})
+        self.assertEqual(sorted(ran), ['dedupe', 'load', 'steps', 'summarize'])
+
+    def test_failure_stops_later_stages(self):
+        ran = []
+
+        def run(spec, inputs):
+            ran.append(spec.name)
+            if spec.name == 'steps':
+                raise RuntimeError("no journey steps")
+            return spec.name
+
+        with self.assertRaisesRegex(RuntimeError, "no journey steps"):
+            run_stage_graph(STAGES, run)
+        self.assertNotIn('summarize', ran)
+
+    def test_stages_must_follow_their_dependencies(self):
+        with self.assertRaises(ValueError):
+            check_stage_graph([STAGES[1], STAGES[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import unittest
+
+import numpy as np
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.step_classifier import StepClassifier, tokenize
+
+JOURNEY_STEPS = ["Booking flights", "Collecting luggage", "Experiencing the in-flight service"]
+
+LABELLED = [
+    ("The website crashed while I was booking my flight and charged me twice", "Booking flights"),
+    ("Booked tickets online, the booking page kept timing out", "Booking flights"),
+    ("My suitcase never arrived at the baggage carousel", "Collecting luggage"),
+    ("Waited two hours at baggage reclaim for our bags", "Collecting luggage"),
+    ("The cabin crew were rude and the meal was cold", "Experiencing the in-flight service"),
+    ("Lovely crew, decent snacks and a comfortable seat", "Experiencing the in-flight service"),
+]
+
+
+class TestStepClassifier(unittest.TestCase):
+
+    def fit(self, unlabelled=()):
+        texts = [text for text, _ in LABELLED] + list(unlabelled)
+        labels = [label for _, label in LABELLED] + [None] * len(unlabelled)
+        return StepClassifier(JOURNEY_STEPS).fit(texts, labels)
+
+    def test_tokenize_stems_and_drops_stop_words(self):
+        self.assertEqual(tokenize("I booked the flights"), ["book", "flight"])
+
+    def test_predicts_nearest_step(self):
+        unlabelled = [
+            "Booking on the website failed twice",
+            "The baggage carousel lost my bags",
+            "Crew served a cold meal"
+        ]
+        classifier = self.fit(unlabelled)
+        steps, confidences = classifier.predict(unlabelled)
+
+        self.assertEqual(steps, JOURNEY_STEPS)
+        self.assertTrue(classifier.is_confident(confidences).all())
+
+    def test_unrelated_text_has_no_confidence(self):
+        classifier = self.fit()
+        _, confidences = classifier.predict(["Absolutely nothing in common here"])
+
+        self.assertEqual(confidences[0], 0)
+        self.assertFalse(classifier.is_confident(confidences)[0])
+
+    def test_titles_alone_give_centroids(self):
+        classifier = StepClassifier(JOURNEY_STEPS).fit(["They lost my luggage"])
+        steps, _ = classifier.predict(["They lost my luggage"])
+
+        self.assertEqual(steps, ["Collecting luggage"])
+        self.assertTrue(np.allclose(np.linalg.norm(classifier.centroids, axis=1), 1))
+
+    def test_summary_keeps_informative_sentences_in_order(self):
+        classifier = self.fit()
+        text = "Hi. The crew were rude. It was fine. The meal was cold and late. Bye."
+
+        summary = classifier.summarize(text, max_sentences=2)
+
+        self.assertEqual(summary, "The crew were rude. The meal was cold and late.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.count_ratings_by_step import count_ratings_by_step
+from src.functions.review_store import MISSING_DATE, ReviewStore, build_review_store, date_to_day, write_review_store
+from src.functions.step_rollups import RollupStore, store_rows
+from src.functions.workspace import Workspace
+
+STEPS = ["Booking", "Boarding"]
+
+
+def row(review_id, step, date, rating):
+    return review_id, step, date_to_day(date) if date else MISSING_DATE, rating
+
+
+class TestRollupStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.rollups = RollupStore(os.path.join(self.temp_dir.name, 'rollups.sqlite3'))
+
+    def tearDown(self):
+        self.rollups.close()
+        self.temp_dir.cleanup()
+
+    def test_merging_a_repeated_snapshot_only_counts_new_reviews(self):
+        first = [row("r1", "Booking", "2025-01-01", 5), row("r2", "Boarding", "2025-01-02", 1)]
+        self.rollups.merge(first)
+
+        merged = self.rollups.merge(first + [row("r3", "Booking", "2025-01-03", 5)])
+
+        self.assertEqual(merged, {'added': 1, 'updated': 0, 'unchanged': 2})
+        self.assertEqual(self.rollups.matrix(STEPS).tolist(), [[0, 0, 0, 0, 2], [1, 0, 0, 0, 0]])
+
+    def test_changed_reviews_move_between_counters(self):
+        self.rollups.merge([row("r1", "Booking", "2025-01-01", 5)])
+
+        merged = self.rollups.merge([row("r1", "Boarding", "2025-01-01", 2)])
+
+        self.assertEqual(merged['updated'], 1)
+        self.assertEqual(self.rollups.matrix(STEPS).tolist(), [[0, 0, 0, 0, 0], [0, 1, 0, 0, 0]])
+        self.assertEqual(self.rollups.conn.execute("SELECT COUNT(*) FROM daily_counts").fetchone()[0], 1)
+
+    def test_rolling_windows_end_at_the_latest_review(self):
+        self.rollups.merge([
+            row("r1", "Booking", "2025-03-31", 5),
+            row("r2", "Booking", "2025-03-20", 4),
+            row("r3", "Boarding", "2025-01-15", 1),
+            row("r4", "Boarding", None, 3),
+            row("r5", None, "2025-03-31", 2)
+        ])
+
+        rolling = self.rollups.rolling_windows(STEPS, windows=(7, 30, 90))
+
+        self.assertEqual(rolling['end'], "2025-03-31")
+        self.assertEqual(int(rolling['windows'][7].sum()), 1)
+        self.assertEqual(int(rolling['windows'][30].sum()), 2)
+        self.assertEqual(int(rolling['windows'][90].sum()), 3)
+        # Undated reviews still count towards the all-time totals
+        self.assertEqual(int(self.rollups.matrix(STEPS).sum()), 4)
+
+    def test_buckets_match_the_review_store_aggregation(self):
+        self.rollups.merge([
+            row("r1", "Booking", "2025-01-05", 1),
+            row("r2", "Boarding", "2025-03-20", 5),
+            row("r3", "Other step", "2025-02-01", 3)
+        ])
+
+        labels, counts = self.rollups.bucketed_matrix(STEPS, 'month')
+
+        self.assertEqual(labels, ['2025-01', '2025-02', '2025-03'])
+        self.assertEqual(counts.shape, (3, 2, 5))
+        self.assertEqual((counts[0, 0, 0], counts[2, 1, 4], int(counts.sum())), (1, 1, 2))
+
+    def test_rows_from_review_store(self):
+        reviews = [
+            {"reviewId": "r1", "reviewRatingScore": 4, "reviewDateOfExperience": "2025-01-01", "journeyStep": "Boarding"},
+            {"reviewId": "r2", "reviewRatingScore": 2, "reviewDateOfExperience": None, "journeyStep": None}
+        ]
+        store_dir = os.path.join(self.temp_dir.name, 'store')
+        write_review_store(reviews, STEPS, store_dir)
+
+        rows = list(store_rows(ReviewStore(store_dir)))
+
+        self.assertEqual(rows, [row("r1", "Boarding", "2025-01-01", 4), ("r2", None, MISSING_DATE, 2)])
+
+
+class TestLegacyStores(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.workspace = Workspace(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def counts(self, store_dir, incremental):
+        with open(count_ratings_by_step(incremental=incremental, workspace=self.workspace, store_dir=store_dir)) as f:
+            return json.load(f)['journeySteps']
+
+    def test_reviews_without_ids_are_all_counted_incrementally(self):
+        # Summaries saved before pre-processing added ids, as a JSON array, repeating every sixth review
+        reviews = [
+            {"reviewTitle": f"Review {i % 2}", "reviewSummary": "Fine.", "reviewDateOfExperience": "2025-01-01",
+             "reviewRatingScore": i % 3 + 1, "journeyStep": STEPS[i % 2]}
+            for i in range(12)
+        ]
+        summary_file = os.path.join(self.workspace.directory('summarized-reviews'), 'summarized_reviews_1.json')
+        steps_file = os.path.join(self.temp_dir.name, 'steps.json')
+        with open(summary_file, 'w') as f:
+            json.dump(reviews, f)
+        with open(steps_file, 'w') as f:
+            json.dump({"journeySteps": STEPS}, f)
+        store_dir = build_review_store(self.workspace, summary_file, steps_file)
+
+        full = self.counts(store_dir, incremental=False)
+
+        self.assertEqual(sum(sum(counts.values()) for counts in full.values()), 12)
+        self.assertEqual(self.counts(store_dir, incremental=True), full)
+        # Merging the same reviews again counts none of them twice
+        self.assertEqual(self.counts(store_dir, incremental=True), full)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+import asyncio
+import json
+import os
+import time
+import unittest
+from types import SimpleNamespace
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.instrumentation import get_metrics
+from src.functions.prompt_compaction import count_tokens
+from src.functions.summarize_review import (
+    build_batch_summary_messages,
+    build_summary_messages,
+    parse_batch_summaries,
+    parse_summary,
+    summarize_review_batch,
+    summarize_reviews_async
+)
+
+JOURNEY_STEPS = {"journeySteps": ["Booking flights", "Boarding the plane"]}
+
+
+class FakeCompletions:
+    """Async stand-in for client.chat.completions that injects latency"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, model, messages, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            review_text = messages[-1]['content'].rsplit('Review: ', 1)[1]
+            await asyncio.sleep(self.latency(review_text))
+        finally:
+            self.in_flight -= 1
+        content = json.dumps({
+            "reviewSummary": f"Summary of {review_text}",
+            "journeyStep": "Booking flights"
+        })
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeAsyncClient:
+
+    def __init__(self, latency):
+        self.chat = SimpleNamespace(completions=FakeCompletions(latency))
+
+
+def make_reviews(count):
+    return [{"reviewDescription": f"review {i}", "reviewRatingScore": 1} for i in range(count)]
+
+
+class TestSummarizeReviewsAsync(unittest.TestCase):
+
+    def test_results_are_returned_in_input_order(self):
+        # Later reviews finish first
+        client = FakeAsyncClient(lambda text: 0.05 - int(text.split()[-1]) * 0.005)
+        results = asyncio.run(summarize_reviews_async(make_reviews(10), {}, client=client))
+
+        self.assertEqual(
+            [r['reviewSummary'] for r in results],
+            [f"Summary of review {i}" for i in range(10)]
+        )
+        self.assertEqual([r['reviewDescription'] for r in results], [f"review {i}" for i in range(10)])
+
+    def test_concurrency_is_bounded(self):
+        client = FakeAsyncClient(lambda text: 0.02)
+        asyncio.run(summarize_reviews_async(make_reviews(20), {}, client=client, max_concurrency=4))
+
+        self.assertEqual(client.chat.completions.max_in_flight, 4)
+
+    def test_throughput_scales_with_concurrency(self):
+        client = FakeAsyncClient(lambda text: 0.1)
+        start = time.perf_counter()
+        results = asyncio.run(summarize_reviews_async(make_reviews(20), {}, client=client, max_concurrency=20))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(results), 20)
+        self.assertLess(elapsed, 1.0)
+
+    def test_each_result_is_handed_on_as_it_finishes(self):
+        # Later reviews finish first
+        client = FakeAsyncClient(lambda text: 0.05 - int(text.split()[-1]) * 0.005)
+        finished = []
+
+        results = asyncio.run(summarize_reviews_async(
+            make_reviews(5), {}, client=client, on_result=lambda index, result: finished.append((index, result))
+        ))
+
+        self.assertEqual([index for index, _ in finished], [4, 3, 2, 1, 0])
+        self.assertIs(finished[0][1], results[4])
+
+    def test_timeout_is_reported_per_review(self):
+        client = FakeAsyncClient(lambda text: 1.0 if text == "review 1" else 0.01)
+        results = asyncio.run(summarize_reviews_async(make_reviews(3), {}, client=client, timeout=0.1))
+
+        self.assertIsInstance(results[1], asyncio.TimeoutError)
+        self.assertEqual(results[0]['reviewSummary'], "Summary of review 0")
+        self.assertEqual(results[2]['reviewSummary'], "Summary of review 2")
+
+
+class FakeBatchCompletions:
+    """Sync stand-in for client.chat.completions answering batch and single prompts"""
+
+    def __init__(self, batch_reply):
+        self.batch_reply = batch_reply
+        self.calls = []
+
+    def create(self, model, messages, **kwargs):
+        prompt = messages[-1]['content']
+        if '"reviews"' in prompt:
+            self.calls.append('batch')
+            content = json.dumps(self.batch_reply)
+        else:
+            self.calls.append('single')
+            content = json.dumps({
+                "reviewSummary": "Single " + prompt.rsplit('Review: ', 1)[1],
+                "journeyStep": "Boarding the plane"
+            })
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def sent_prompts():
+    return get_metrics().compaction.get('none', {}).get('prompts', 0)
+
+
+class TestSummarizeReviewBatch(unittest.TestCase):
+
+    def test_one_request_covers_whole_batch(self):
+        reply = {"reviews": {
+            str(i): {"reviewSummary": f"Batch {i}", "journeyStep": "Booking flights"}
+            for i in range(1, 4)
+        }}
+        completions = FakeBatchCompletions(reply)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+        results = summarize_review_batch(client, make_reviews(3), JOURNEY_STEPS)
+
+        self.assertEqual(completions.calls, ['batch'])
+        self.assertEqual([r['reviewSummary'] for r in results], ["Batch 1", "Batch 2", "Batch 3"])
+
+    def test_missing_and_malformed_reviews_are_retried_alone(self):
+        reply = {"reviews": {
+            "1": {"reviewSummary": "Batch 1", "journeyStep": "Booking flights"},
+            "2": {"reviewSummary": "Batch 2", "journeyStep": "Not a real step"}
+        }}
+        completions = FakeBatchCompletions(reply)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+        results = summarize_review_batch(client, make_reviews(3), JOURNEY_STEPS)
+
+        self.assertEqual(completions.calls, ['batch', 'single', 'single'])
+        self.assertEqual(
+            [r['reviewSummary'] for r in results],
+            ["Batch 1", "Single review 1", "Single review 2"]
+        )
+
+    def test_compaction_is_recorded_only_for_answered_prompts(self):
+        completions = FakeBatchCompletions({})
+
+        def create(model, messages, **kwargs):
+            if '"reviews"' in messages[-1]['content']:
+                raise ValueError("batch request failed")
+            return FakeBatchCompletions.create(completions, model, messages, **kwargs)
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        before = sent_prompts()
+
+        summarize_review_batch(client, make_reviews(3), JOURNEY_STEPS)
+
+        self.assertEqual(sent_prompts() - before, 3)
+
+    def test_parse_rejects_non_json_content(self):
+        self.assertEqual(parse_batch_summaries("not json", ["1"], JOURNEY_STEPS), {})
+
+    def test_parse_maps_step_numbers_to_titles(self):
+        content = json.dumps({"reviews": {
+            "1": {"reviewSummary": "Batch 1", "journeyStep": 2},
+            "2": {"reviewSummary": "Batch 2", "journeyStep": 3}
+        }})
+
+        parsed = parse_batch_summaries(content, ["1", "2"], JOURNEY_STEPS)
+
+        self.assertEqual(parsed, {"1": {"reviewSummary": "Batch 1", "journeyStep": "Boarding the plane"}})
+
+
+class TestCompactPrompts(unittest.TestCase):
+
+    def test_steps_are_sent_as_numbered_lines(self):
+        messages, _ = build_summary_messages({"reviewDescription": "Lost my bag."}, JOURNEY_STEPS)
+        content = messages[-1]['content']
+
+        self.assertIn("1. Booking flights\n2. Boarding the plane", content)
+        self.assertNotIn('"journeySteps"', content)
+        self.assertTrue(content.endswith("Review: Lost my bag."))
+
+    def test_long_reviews_are_shortened(self):
+        review = {"reviewDescription": "The flight was late. " * 2000}
+
+        messages, stats = build_summary_messages(review, JOURNEY_STEPS)
+
+        self.assertLess(len(messages[-1]['content']), len(review['reviewDescription']) // 10)
+        self.assertEqual(stats['truncatedReviews'], 1)
+        self.assertLess(stats['sentTokens'], stats['originalTokens'])
+
+    def test_savings_are_measured_against_what_each_mode_sent_before(self):
+        reviews = [{"reviewDescription": "Lost my bag."}, {"reviewDescription": "Great crew."}]
+
+        _, single = build_summary_messages(reviews[0], JOURNEY_STEPS)
+        _, batched = build_batch_summary_messages(reviews, JOURNEY_STEPS)
+
+        self.assertEqual(single['originalTokens'],
+                         count_tokens(json.dumps(JOURNEY_STEPS, indent=2)) + count_tokens("Lost my bag."))
+        self.assertEqual(batched['originalTokens'],
+                         count_tokens(json.dumps(JOURNEY_STEPS)) + count_tokens("Lost my bag.") + count_tokens("Great crew."))
+
+    def test_single_answers_must_name_a_listed_step(self):
+        self.assertEqual(parse_summary('{"reviewSummary": "Ok", "journeyStep": "1"}', JOURNEY_STEPS),
+                         {"reviewSummary": "Ok", "journeyStep": "Booking flights"})
+        with self.assertRaises(ValueError):
+            parse_summary('{"reviewSummary": "Ok", "journeyStep": 7}', JOURNEY_STEPS)
+
+
+if __name__ == '__main__':
+    unittest.main()
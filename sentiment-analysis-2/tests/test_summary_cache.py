@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+from src.functions.summary_cache import SummaryCache, make_cache_key
+
+STEPS = {"journeySteps": ["Booking flights", "Boarding the plane"]}
+RESULT = {"reviewSummary": "Late flight.", "journeyStep": "Boarding the plane"}
+
+
+class TestSummaryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cache.sqlite3')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_all_inputs(self):
+        base = make_cache_key("model", "1", STEPS, "text")
+
+        self.assertEqual(base, make_cache_key("model", "1", STEPS, "text"))
+        self.assertNotEqual(base, make_cache_key("other-model", "1", STEPS, "text"))
+        self.assertNotEqual(base, make_cache_key("model", "2", STEPS, "text"))
+        self.assertNotEqual(base, make_cache_key("model", "1", {"journeySteps": []}, "text"))
+        self.assertNotEqual(base, make_cache_key("model", "1", STEPS, "other text"))
+
+    def test_hits_and_misses_persist_across_runs(self):
+        cache = SummaryCache(self.path)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", RESULT)
+        cache.close()
+
+        cache = SummaryCache(self.path)
+        self.assertEqual(cache.get("a"), RESULT)
+        self.assertIsNone(cache.get("b"))
+        stats = cache.stats()
+        cache.close()
+
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = SummaryCache(self.path, max_bytes=3 * len(str(RESULT)) + 10)
+        cache.put("a", RESULT)
+        cache.put("b", RESULT)
+        cache.put("c", RESULT)
+        cache.get("a")
+        cache.put("d", RESULT)
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertLessEqual(cache.stats()["bytes"], cache.max_bytes)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()